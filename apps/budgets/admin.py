@@ -4,7 +4,7 @@ Admin configuration for budgets app.
 
 from django.contrib import admin
 from simple_history.admin import SimpleHistoryAdmin
-from .models import Budget, BudgetItem, BudgetSection, ItemDescription, PaymentInfoTemplate
+from .models import Budget, BudgetExtraCharge, BudgetItem, BudgetSection, BudgetTemplate, ItemDescription, PaymentInfoTemplate
 
 
 class BudgetSectionInline(admin.TabularInline):
@@ -23,6 +23,14 @@ class BudgetItemInline(admin.TabularInline):
     readonly_fields = ('total_price',)
 
 
+class BudgetExtraChargeInline(admin.TabularInline):
+    """Inline admin for budget extra charges."""
+
+    model = BudgetExtraCharge
+    extra = 0
+    fields = ('group', 'label', 'value', 'fiscal', 'order')
+
+
 @admin.register(Budget)
 class BudgetAdmin(SimpleHistoryAdmin):
     """Admin interface for Budget model."""
@@ -31,7 +39,7 @@ class BudgetAdmin(SimpleHistoryAdmin):
     list_filter = ('status', 'is_selected', 'created_at')
     search_fields = ('name', 'proposal__title')
     ordering = ('-created_at',)
-    inlines = [BudgetSectionInline, BudgetItemInline]
+    inlines = [BudgetSectionInline, BudgetItemInline, BudgetExtraChargeInline]
     
     fieldsets = (
         ('Informações Básicas', {
@@ -94,3 +102,13 @@ class PaymentInfoTemplateAdmin(admin.ModelAdmin):
     def body_preview(self, obj):
         return obj.body[:80] + '…' if len(obj.body) > 80 else obj.body
 
+
+@admin.register(BudgetTemplate)
+class BudgetTemplateAdmin(admin.ModelAdmin):
+    """Admin interface for proposal templates."""
+
+    list_display = ('name', 'items_count', 'source_budget', 'created_by', 'created_at')
+    search_fields = ('name', 'description')
+    ordering = ('name',)
+    exclude = ('data',)
+    readonly_fields = ('items_count', 'source_budget', 'created_by', 'created_at')
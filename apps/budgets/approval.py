@@ -0,0 +1,108 @@
+"""
+Client approval / rejection of a budget from the public approval page, and
+the reset of an approval when the approved proposal is edited afterwards.
+
+Each action runs in one transaction: the item flags, the budget status, the
+linked Service Order transition, the Service Order item sync and the
+internal notification are written together or not at all.  Item flags are
+set with a single UPDATE, so approving a proposal costs the same number of
+queries whatever its size.
+"""
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.utils import timezone
+
+from .models import BudgetItem
+from .notifications import notify
+from .signals import sync_service_order_items
+
+
+def _service_order(budget):
+    from apps.service_orders.models import ServiceOrder
+
+    try:
+        return budget.service_order
+    except ServiceOrder.DoesNotExist:
+        return None
+
+
+@transaction.atomic
+def approve_budget(budget, approved_item_ids, include_freight=False, notes=''):
+    """
+    Approve *budget*, keeping only the items whose pk is in
+    *approved_item_ids* (every other item is marked as not approved).
+    """
+    BudgetItem.objects.filter(budget=budget).update(
+        is_approved=Case(
+            When(pk__in=list(approved_item_ids), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        refresh_totals=False,
+    )
+    budget.refresh_item_totals()
+
+    # Freight opt-in
+    budget.freight_included = include_freight
+
+    budget.approval_status = 'approved'
+    budget.approved_at = timezone.now()
+    budget.client_notes = notes
+    budget.status = 'approved'
+    budget.save()
+
+    # Advance linked Service Order to "approved"
+    service_order = _service_order(budget)
+    if service_order is not None and service_order.status == 'pending':
+        service_order.status = 'approved'
+        service_order.save(update_fields=['status'])
+
+    # Sync SO items to reflect only the client-selected items
+    sync_service_order_items(budget)
+
+    notify(budget, 'approved')
+
+
+@transaction.atomic
+def reject_budget(budget, notes=''):
+    """Reject *budget* and move its Service Order back to pending."""
+    budget.approval_status = 'rejected'
+    budget.approved_at = timezone.now()
+    budget.client_notes = notes
+    budget.status = 'rejected'
+    budget.save()
+
+    # Reset linked Service Order back to pending
+    service_order = _service_order(budget)
+    if service_order is not None and service_order.status == 'approved':
+        service_order.status = 'pending'
+        service_order.save(update_fields=['status'])
+
+    notify(budget, 'rejected')
+
+
+def reset_approval(budget):
+    """
+    Reopen an approved *budget* after an internal edit, so the client
+    reviews and approves the new content.  Returns False (and writes
+    nothing) when *budget* is not approved.
+    """
+    if budget.approval_status != 'approved':
+        return False
+    budget.approval_status = 'pending'
+    budget.approved_at = None
+    budget.client_notes = ''
+    if budget.status == 'confirmed':
+        budget.status = 'sent'
+    budget.save(update_fields=['approval_status', 'approved_at', 'client_notes', 'status'])
+    # Reset per-item approval so the selection panel reopens for the client
+    BudgetItem.objects.filter(budget=budget).update(is_approved=False, refresh_totals=False)
+    budget.refresh_item_totals()
+
+    # Reset linked Service Order back to pending
+    service_order = _service_order(budget)
+    if service_order is not None and service_order.status == 'approved':
+        service_order.status = 'pending'
+        service_order.save(update_fields=['status'])
+    return True
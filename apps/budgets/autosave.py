@@ -0,0 +1,166 @@
+"""
+Small, frequent writes from the budget form's autosave.
+
+The full form POST re-processes every section, snapshots a BudgetVersion and
+re-syncs the Service Order.  The item/section API (views.BudgetItemApiView and
+friends) instead writes one row at a time and goes through this module for
+the per-budget bookkeeping:
+
+claim_revision(budget, expected)
+    Optimistic concurrency.  Budget.revision is advanced with a conditional
+    UPDATE; a client holding a stale revision gets RevisionConflict (HTTP 409)
+    instead of overwriting someone else's edit.
+
+begin_edit(budget, user)
+    Version coalescing.  The first write of an editing session snapshots the
+    pre-edit state as one BudgetVersion; later writes of the same user on the
+    same budget only extend the session (sliding BUDGET_AUTOSAVE_SESSION_IDLE
+    seconds), so a burst of autosaves yields a single history entry.
+
+schedule_service_order_sync(budget)
+    Debounced Service Order sync.  With Celery and BUDGET_SERVICE_ORDER_SYNC_ASYNC
+    a worker syncs once, BUDGET_SERVICE_ORDER_SYNC_DELAY seconds after the first
+    write of a burst.  Without a worker the first write of a burst syncs inline
+    and the rest are left pending; Budget.service_order_revision records what
+    the OS mirrors, so flush_service_order_sync() (called when the editor
+    leaves the page, and by the full form save) catches up.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Budget
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE = 900
+SYNC_DELAY = 30
+
+
+class RevisionConflict(Exception):
+    """The client edited an outdated revision of the budget."""
+
+    def __init__(self, current):
+        super().__init__(f'Budget revision is {current}')
+        self.current = current
+
+
+def session_idle():
+    return max(int(getattr(settings, 'BUDGET_AUTOSAVE_SESSION_IDLE', SESSION_IDLE) or 0), 1)
+
+
+def sync_delay():
+    return max(int(getattr(settings, 'BUDGET_SERVICE_ORDER_SYNC_DELAY', SYNC_DELAY) or 0), 1)
+
+
+def _session_key(budget_id, user_id):
+    return f'budgets:autosave:session:{budget_id}:{user_id}'
+
+
+def _sync_key(budget_id):
+    return f'budgets:autosave:so-sync:{budget_id}'
+
+
+def parse_revision(value):
+    """Revision sent by the client (``If-Match: "12"`` or a JSON number), or None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    value = value.strip('"')
+    return int(value) if value.isdigit() else None
+
+
+def claim_revision(budget, expected=None):
+    """
+    Advance *budget*'s revision by one and return the new value.
+
+    With *expected* set, the UPDATE only matches while the stored revision
+    still equals it; otherwise RevisionConflict carries the current one.
+    Must run inside the transaction that performs the write.
+    """
+    rows = Budget.all_objects.filter(pk=budget.pk)
+    if expected is not None:
+        rows = rows.filter(revision=expected)
+    if not rows.update(revision=F('revision') + 1):
+        current = Budget.all_objects.filter(pk=budget.pk).values_list('revision', flat=True).first()
+        raise RevisionConflict(current or 0)
+    budget.revision = Budget.all_objects.filter(pk=budget.pk).values_list('revision', flat=True).get()
+    return budget.revision
+
+
+def begin_edit(budget, user, label='Edição automática'):
+    """
+    Record an autosave write of *user* on *budget*; on the first write of a
+    session, snapshot the state before it.  Returns True when a version was
+    created.  Call before applying the change.
+    """
+    from .views import _create_budget_version
+
+    key = _session_key(budget.pk, user.pk)
+    if cache.add(key, budget.revision, session_idle()):
+        _create_budget_version(budget, user=user, label=label)
+        return True
+    cache.touch(key, session_idle())
+    return False
+
+
+def end_edit(budget, user):
+    """Close *user*'s editing session on *budget* (next write starts a new version)."""
+    cache.delete(_session_key(budget.pk, user.pk))
+
+
+def mark_saved(budget):
+    """
+    Bump the revision after a full form save, which already re-synced the
+    Service Order, so open autosave clients see the conflict.
+    """
+    Budget.all_objects.filter(pk=budget.pk).update(
+        revision=F('revision') + 1,
+        service_order_revision=F('revision') + 1,
+    )
+    budget.revision = budget.service_order_revision = (
+        Budget.all_objects.filter(pk=budget.pk).values_list('revision', flat=True).get()
+    )
+    cache.delete(_sync_key(budget.pk))
+
+
+def flush_service_order_sync(budget):
+    """Sync the Service Order now if it is behind the budget's revision; True when it ran."""
+    from .signals import sync_service_order_items
+
+    current = Budget.all_objects.filter(pk=budget.pk).values_list(
+        'revision', 'service_order_revision',
+    ).first()
+    if current is None or current[1] >= current[0]:
+        return False
+    with transaction.atomic():
+        sync_service_order_items(budget)
+        Budget.all_objects.filter(
+            pk=budget.pk, service_order_revision__lt=current[0],
+        ).update(service_order_revision=current[0])
+    budget.service_order_revision = current[0]
+    return True
+
+
+def schedule_service_order_sync(budget):
+    """Debounced Service Order sync after an autosave write (see module docstring)."""
+    from .tasks import sync_service_order_task
+
+    def _schedule():
+        if not cache.add(_sync_key(budget.pk), True, sync_delay()):
+            return
+        if getattr(settings, 'BUDGET_SERVICE_ORDER_SYNC_ASYNC', False) and hasattr(sync_service_order_task, 'apply_async'):
+            try:
+                sync_service_order_task.apply_async((budget.pk,), countdown=sync_delay())
+                return
+            except Exception:
+                logger.exception('Could not queue Service Order sync for budget %s', budget.pk)
+        flush_service_order_sync(budget)
+
+    transaction.on_commit(_schedule)
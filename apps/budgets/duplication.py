@@ -0,0 +1,189 @@
+"""
+Copying proposals: duplicate a budget, save it as a BudgetTemplate and start
+a new budget from a template.
+
+The source is read with one query per table and the copy is written with a
+fixed number of statements, whatever its size:
+
+    Budget row         one INSERT (its post_save creates the Service Order
+                       and the history record, once)
+    sections           one bulk_create
+    items              bulk_create in BATCH_SIZE batches, no per-row saves,
+                       so no per-item total deltas
+    stored totals      one refresh (aggregate + UPDATE)
+    Service Order      one sync_service_order_items() call (bulk writes)
+
+Approval state, tokens, status, revisions and audit fields are never copied:
+the new budget starts as a fresh proposal with every item selected.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+
+from .models import Budget, BudgetItem, BudgetSection, BudgetTemplate, ItemDescription
+
+BATCH_SIZE = 500
+
+# Commercial settings carried over to the copy
+BUDGET_FIELDS = (
+    'payment_info',
+    'freight_cost',
+    'freight_calculated',
+    'freight_urgency_id',
+    'freight_distance_km',
+    'include_fiscal_charges',
+    'extra_charges',
+    'discount_type',
+    'discount_value',
+)
+
+# Item columns carried over (the section is remapped to its copy)
+ITEM_FIELDS = (
+    'name',
+    'description',
+    'description_ref_id',
+    'quantity',
+    'dim_length',
+    'dim_width',
+    'dim_height',
+    'measurement',
+    'measurement_unit',
+    'weight',
+    'unit_price',
+    'total_price',
+    'billing_type',
+    'subitems_data',
+    'include_fiscal',
+    'observations',
+)
+
+
+def _to_python(model, row):
+    """
+    Field values of *row* as *model* holds them (templates store JSON
+    strings); accessors such as Budget.extra_charges take the value as is.
+    """
+    fields = {}
+    for name, value in row.items():
+        try:
+            fields[name] = model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            fields[name] = value
+    return fields
+
+
+def budget_rows(budget):
+    """
+    The copyable content of *budget* as plain rows (two queries)::
+
+        {'budget': {field: value},
+         'sections': [{'title': …, 'items': [{field: value}, …]}, …],
+         'unsectioned_items': [{field: value}, …]}
+    """
+    sections = {
+        pk: {'title': title, 'items': []}
+        for pk, title in BudgetSection.objects.filter(budget=budget)
+        .order_by('order', 'id').values_list('pk', 'title')
+    }
+    unsectioned = []
+    items = (
+        BudgetItem.objects.filter(budget=budget).order_by('pk')
+        .values('section_id', *ITEM_FIELDS).iterator(chunk_size=2000)
+    )
+    for row in items:
+        section = sections.get(row.pop('section_id'))
+        (section['items'] if section else unsectioned).append(row)
+    return {
+        'budget': {name: getattr(budget, name) for name in BUDGET_FIELDS},
+        'sections': list(sections.values()),
+        'unsectioned_items': unsectioned,
+    }
+
+
+def rows_items_count(rows):
+    return sum(len(section['items']) for section in rows['sections']) + len(rows['unsectioned_items'])
+
+
+@transaction.atomic
+def create_budget_from_rows(rows, name, proposal_id=None, user=None):
+    """Create a new budget holding *rows* (see budget_rows) and return it."""
+    from .signals import sync_service_order_items
+
+    budget_fields = _to_python(Budget, {
+        name: value for name, value in rows.get('budget', {}).items() if name in BUDGET_FIELDS
+    })
+    if budget_fields.get('freight_urgency_id'):
+        from apps.logistics.models import UrgencyMultiplier
+        if not UrgencyMultiplier.objects.filter(pk=budget_fields['freight_urgency_id']).exists():
+            budget_fields['freight_urgency_id'] = None
+
+    budget = Budget(name=name, proposal_id=proposal_id, created_by=user, updated_by=user, **budget_fields)
+    budget.save()
+
+    sections_data = rows.get('sections', [])
+    sections = BudgetSection.objects.bulk_create([
+        BudgetSection(budget=budget, title=data.get('title') or f'Seção {index + 1}', order=index)
+        for index, data in enumerate(sections_data)
+    ])
+
+    # Library entries deleted since the rows were taken are dropped
+    referenced = {
+        item.get('description_ref_id')
+        for items in [data.get('items', []) for data in sections_data] + [rows.get('unsectioned_items', [])]
+        for item in items
+    }
+    referenced.discard(None)
+    existing_refs = set(
+        ItemDescription.objects.filter(pk__in=referenced).values_list('pk', flat=True)
+    ) if referenced else set()
+
+    def _item(section, row):
+        fields = _to_python(BudgetItem, {name: row.get(name) for name in ITEM_FIELDS if name in row})
+        if fields.get('description_ref_id') not in existing_refs:
+            fields['description_ref_id'] = None
+        return BudgetItem(budget=budget, section=section, is_approved=True, **fields)
+
+    items = [
+        _item(section, row)
+        for section, data in zip(sections, sections_data)
+        for row in data.get('items', [])
+    ]
+    items += [_item(None, row) for row in rows.get('unsectioned_items', [])]
+    BudgetItem.objects.bulk_create(items, batch_size=BATCH_SIZE, refresh_totals=False)
+
+    budget.refresh_item_totals()
+    sync_service_order_items(budget)
+    return budget
+
+
+def duplicate_budget(budget, name=None, user=None):
+    """Copy *budget* (same project) into a new pending proposal."""
+    return create_budget_from_rows(
+        budget_rows(budget),
+        name=name or f'{budget.name} (cópia)',
+        proposal_id=budget.proposal_id,
+        user=user,
+    )
+
+
+def save_as_template(budget, name=None, description='', user=None):
+    """Store the content of *budget* as a reusable BudgetTemplate."""
+    rows = budget_rows(budget)
+    return BudgetTemplate.objects.create(
+        name=name or budget.name,
+        description=description,
+        data=rows,
+        items_count=rows_items_count(rows),
+        source_budget=budget,
+        created_by=user,
+    )
+
+
+def instantiate_template(template, name=None, proposal_id=None, user=None):
+    """Start a new budget from *template*."""
+    return create_budget_from_rows(
+        template.data or {},
+        name=name or template.name,
+        proposal_id=proposal_id,
+        user=user,
+    )
@@ -0,0 +1,249 @@
+"""
+Streaming CSV / XLSX export of budgets and their line items.
+
+Rows come from ``values_list(...).iterator(chunk_size=...)`` so only one
+chunk of rows is in memory at a time, and both writers yield their output
+as they go: the CSV writer line by line, the XLSX writer as deflated zip
+chunks (a minimal SpreadsheetML package written with zipfile, no
+third-party dependency).  Used by BudgetExportView and the
+``export_budgets`` management command.
+
+Scopes:
+    budgets  one row per budget, with the money figures from with_totals()
+    items    one row per item, with its budget and section
+"""
+
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import Budget, BudgetItem
+
+CHUNK_SIZE = 2000
+
+FORMATS = ('csv', 'xlsx')
+SCOPES = ('items', 'budgets')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+STATUS_LABELS = dict(Budget.STATUS_CHOICES)
+APPROVAL_LABELS = dict(Budget._meta.get_field('approval_status').choices)
+BILLING_LABELS = dict(BudgetItem._meta.get_field('billing_type').choices)
+
+# (header, lookup, kind)
+BUDGET_COLUMNS = (
+    ('ID', 'pk', 'number'),
+    ('Proposta', 'name', 'text'),
+    ('Projeto', 'proposal__title', 'text'),
+    ('Evento', 'proposal__event__name', 'text'),
+    ('Status', 'status', STATUS_LABELS),
+    ('Aprovação', 'approval_status', APPROVAL_LABELS),
+    ('Itens', 'items_count', 'number'),
+    ('Total dos itens', 'items_total', 'money'),
+    ('Encargos fiscais', 'annotated_fiscal_charges', 'money'),
+    ('Encargos extras', 'extra_charges_base', 'money'),
+    ('Frete', 'freight_cost', 'money'),
+    ('Desconto', 'annotated_discount', 'money'),
+    ('Total', 'annotated_total_with_freight', 'money'),
+    ('Valor aprovado', 'annotated_approved_value', 'money'),
+    ('Criado em', 'created_at', 'datetime'),
+)
+
+ITEM_COLUMNS = (
+    ('ID da proposta', 'budget_id', 'number'),
+    ('Proposta', 'budget__name', 'text'),
+    ('Status', 'budget__status', STATUS_LABELS),
+    ('Seção', 'section__title', 'text'),
+    ('Item', 'name', 'text'),
+    ('Descrição', 'description', 'text'),
+    ('Quantidade', 'quantity', 'number'),
+    ('Comprimento (m)', 'dim_length', 'number'),
+    ('Largura (m)', 'dim_width', 'number'),
+    ('Altura (m)', 'dim_height', 'number'),
+    ('Medida', 'measurement', 'number'),
+    ('Unidade', 'measurement_unit', 'text'),
+    ('Peso (kg)', 'weight', 'number'),
+    ('Valor unitário', 'unit_price', 'money'),
+    ('Total', 'total_price', 'money'),
+    ('Cobrança', 'billing_type', BILLING_LABELS),
+    ('Encargo fiscal', 'include_fiscal', 'bool'),
+    ('Aprovado', 'is_approved', 'bool'),
+)
+
+CENT = Decimal('0.01')
+
+
+def _convert(value, kind):
+    """Python value for one cell: numbers stay numeric, the rest becomes text."""
+    if value is None:
+        return None
+    if isinstance(kind, dict):
+        return kind.get(value, value)
+    if kind == 'money':
+        return Decimal(value).quantize(CENT)
+    if kind == 'bool':
+        return 'Sim' if value else 'Não'
+    if kind == 'datetime':
+        return timezone.localtime(value).strftime('%d/%m/%Y %H:%M')
+    return value
+
+
+def export_rows(budgets, scope='items', chunk_size=CHUNK_SIZE):
+    """
+    Return ``(headers, rows)`` for the *budgets* queryset; *rows* is a lazy
+    iterator of converted tuples.
+    """
+    if scope == 'budgets':
+        columns = BUDGET_COLUMNS
+        queryset = budgets.with_totals().order_by('-created_at', 'pk')
+    else:
+        columns = ITEM_COLUMNS
+        queryset = BudgetItem.objects.filter(
+            budget__in=budgets.order_by().values('pk'),
+        ).order_by('-budget__created_at', 'budget_id', 'section__order', 'section_id', 'pk')
+
+    kinds = [kind for _header, _lookup, kind in columns]
+    values = queryset.values_list(*(lookup for _header, lookup, _kind in columns))
+
+    def rows():
+        for row in values.iterator(chunk_size=chunk_size):
+            yield tuple(_convert(value, kind) for value, kind in zip(row, kinds))
+
+    return [header for header, _lookup, _kind in columns], rows()
+
+
+# ── CSV ─────────────────────────────────────────────────────────────────────
+
+class _Echo:
+    """File-like object whose write() just returns the line (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(headers, rows):
+    """Yield the CSV export as encoded chunks (UTF-8 with BOM, for Excel)."""
+    writer = csv.writer(_Echo())
+    yield '﻿'.encode('utf-8') + writer.writerow(headers).encode('utf-8')
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row]).encode('utf-8')
+
+
+# ── XLSX ────────────────────────────────────────────────────────────────────
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_STATIC_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+
+
+class _ChunkSink:
+    """Write-only, non-seekable buffer that zipfile writes into and we drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        value = 'Sim' if value else 'Não'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ('<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>').encode('utf-8')
+
+
+def stream_xlsx(headers, rows, sheet_name='Exportação', flush_every=500):
+    """Yield the XLSX export as zip chunks, flushing every *flush_every* rows."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        for name, content in _XLSX_STATIC_PARTS:
+            package.writestr(name, content)
+        package.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>',
+        )
+        yield sink.drain()
+
+        with package.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            sheet.write(_xlsx_row(headers))
+            for index, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row))
+                if index % flush_every == 0:
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def stream_export(budgets, export_format='csv', scope='items', chunk_size=CHUNK_SIZE):
+    """Encoded chunks of the *budgets* export in *export_format* ('csv' or 'xlsx')."""
+    headers, rows = export_rows(budgets, scope, chunk_size)
+    if export_format == 'xlsx':
+        return stream_xlsx(headers, rows, sheet_name='Propostas' if scope == 'budgets' else 'Itens')
+    return stream_csv(headers, rows)
+
+
+def export_filename(export_format='csv', scope='items'):
+    stamp = timezone.localtime().strftime('%Y%m%d_%H%M')
+    name = 'propostas' if scope == 'budgets' else 'propostas_itens'
+    return f'{name}_{stamp}.{export_format}'
@@ -0,0 +1,368 @@
+"""
+Bulk import of budget items from a supplier spreadsheet (CSV or XLSX).
+
+    report = import_items(budget, uploaded_file)
+
+The file is read as a stream of rows (csv.reader, or iterparse over the
+worksheet XML for XLSX, no third-party dependency), the first non-empty row
+being the header.  Headers are matched by name, accents and case ignored;
+the columns written by the export (budgets.export.ITEM_COLUMNS) are all
+recognised, so an exported file can be edited and imported back.
+
+Every row is validated in one pass before anything is written: numbers
+accept both ``1234.5`` and the Brazilian ``1.234,50`` notation and must fit
+their column.  With errors the whole file is rejected (unless *partial*),
+and the report lists them per line.  Valid rows become BudgetItem objects
+priced in memory by BudgetItem.calculate_totals() — the rules save() uses —
+and are written with bulk_create; sections are matched by title or created.
+"""
+
+import codecs
+import csv
+import re
+import zipfile
+from itertools import chain
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+from xml.etree.ElementTree import fromstring, iterparse
+
+from django.db import transaction
+from django.db.models import Max
+
+from apps.common.search import normalize
+
+from .models import BudgetItem, BudgetSection
+
+MAX_ROWS = 20000
+BATCH_SIZE = 500
+DEFAULT_SECTION = 'Itens importados'
+
+# Normalized header → item field
+HEADERS = {
+    'secao': 'section',
+    'section': 'section',
+    'item': 'name',
+    'nome': 'name',
+    'name': 'name',
+    'descricao': 'description',
+    'description': 'description',
+    'quantidade': 'quantity',
+    'qtd': 'quantity',
+    'qtde': 'quantity',
+    'quantity': 'quantity',
+    'comprimento': 'dim_length',
+    'comprimento (m)': 'dim_length',
+    'largura': 'dim_width',
+    'largura (m)': 'dim_width',
+    'altura': 'dim_height',
+    'altura (m)': 'dim_height',
+    'medida': 'measurement',
+    'metragem': 'measurement',
+    'unidade': 'measurement_unit',
+    'peso': 'weight',
+    'peso (kg)': 'weight',
+    'valor unitario': 'unit_price',
+    'preco unitario': 'unit_price',
+    'unit price': 'unit_price',
+    'total': 'total_price',
+    'valor total': 'total_price',
+    'cobranca': 'billing_type',
+    'encargo fiscal': 'include_fiscal',
+    'observacoes': 'observations',
+    'obs': 'observations',
+}
+
+DECIMAL_FIELDS = ('dim_length', 'dim_width', 'dim_height', 'measurement', 'weight', 'unit_price', 'total_price')
+
+BILLING_VALUES = {
+    'qty': 'qty', 'por quantidade': 'qty', 'quantidade': 'qty',
+    'meter': 'meter', 'por metro': 'meter', 'metro': 'meter', 'metragem': 'meter',
+}
+
+# Normalized unit (normalize() folds ² and ³ into 2 and 3) → measurement_unit
+UNIT_VALUES = {
+    'm': 'm', 'metros (m)': 'm',
+    'm2': 'm2', 'metros2 (m2)': 'm2',
+    'm3': 'm3', 'metros3 (m3)': 'm3',
+}
+
+TRUE_VALUES = {'sim', 's', 'x', 'yes', 'true', '1'}
+
+
+class SpreadsheetError(Exception):
+    """The file cannot be read as a spreadsheet at all."""
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportReport(NamedTuple):
+    created: int
+    sections_created: int
+    errors: list
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'sections_created': self.sections_created,
+            'errors': [{'line': error.line, 'message': error.message} for error in self.errors],
+        }
+
+
+# ── Readers ─────────────────────────────────────────────────────────────────
+
+def _csv_rows(stream):
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    try:
+        first = next(lines, '')
+        delimiter = ';' if first.count(';') > first.count(',') else ','
+        yield from csv.reader(chain([first], lines), delimiter=delimiter)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise SpreadsheetError(f'CSV inválido: {exc}')
+
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_CELL_REF = re.compile(r'([A-Z]+)')
+
+
+def _column_index(ref):
+    letters = _CELL_REF.match(ref or '')
+    if not letters:
+        return None
+    index = 0
+    for letter in letters.group(1):
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _first_sheet_path(package):
+    workbook = package.read('xl/workbook.xml')
+    sheet = fromstring(workbook).find(f'{_NS}sheets/{_NS}sheet')
+    rel_id = sheet.get(f'{_REL_NS}id') if sheet is not None else None
+    if rel_id and 'xl/_rels/workbook.xml.rels' in package.namelist():
+        for rel in fromstring(package.read('xl/_rels/workbook.xml.rels')):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target', '').lstrip('/')
+                return target if target.startswith('xl/') else f'xl/{target}'
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _shared_strings(package):
+    if 'xl/sharedStrings.xml' not in package.namelist():
+        return []
+    strings = []
+    with package.open('xl/sharedStrings.xml') as source:
+        for _event, element in iterparse(source):
+            if element.tag == f'{_NS}si':
+                strings.append(''.join(text.text or '' for text in element.iter(f'{_NS}t')))
+                element.clear()
+    return strings
+
+
+def _xlsx_rows(stream):
+    try:
+        package = zipfile.ZipFile(stream)
+        strings = _shared_strings(package)
+        sheet_path = _first_sheet_path(package)
+        source = package.open(sheet_path)
+    except (zipfile.BadZipFile, KeyError, SyntaxError) as exc:
+        raise SpreadsheetError(f'Planilha XLSX inválida: {exc}')
+
+    with package, source:
+        for _event, row in iterparse(source):
+            if row.tag != f'{_NS}row':
+                continue
+            values = []
+            for cell in row.iter(f'{_NS}c'):
+                index = _column_index(cell.get('r'))
+                if index is not None:
+                    values.extend([None] * (index - len(values)))
+                kind = cell.get('t')
+                if kind == 'inlineStr':
+                    value = ''.join(text.text or '' for text in cell.iter(f'{_NS}t'))
+                else:
+                    raw = cell.findtext(f'{_NS}v')
+                    if raw is not None and kind == 's':
+                        value = strings[int(raw)] if raw.isdigit() and int(raw) < len(strings) else ''
+                    elif raw is not None and kind == 'b':
+                        value = 'Sim' if raw == '1' else 'Não'
+                    else:
+                        value = raw
+                values.append(value)
+            row.clear()
+            yield values
+
+
+def read_rows(stream, filename=''):
+    """Rows of the uploaded file as lists of strings (None for empty cells)."""
+    if filename.lower().endswith('.xlsx'):
+        return _xlsx_rows(stream)
+    return _csv_rows(stream)
+
+
+# ── Validation ──────────────────────────────────────────────────────────────
+
+def parse_decimal(value):
+    """Decimal from ``1234.5``, ``1.234,50`` or ``R$ 12,00``; None when blank; ValueError otherwise."""
+    if value is None:
+        return None
+    text = str(value).strip().replace('R$', '').replace(' ', '').replace('\xa0', '')
+    if not text:
+        return None
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError
+    if not number.is_finite():
+        raise ValueError
+    return number
+
+
+def _fits(field_name, value):
+    """*value* rounded to the column's precision, or ValueError when it overflows it."""
+    field = BudgetItem._meta.get_field(field_name)
+    value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    if abs(value) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+        raise ValueError
+    return value
+
+
+def _header_map(header):
+    columns = {}
+    for index, title in enumerate(header):
+        key = normalize(title or '').strip()
+        field = HEADERS.get(key) or HEADERS.get(re.sub(r'\s*\(.*\)$', '', key))
+        if field and field not in columns:
+            columns[field] = index
+    return columns
+
+
+def _row_fields(values, columns):
+    """``(section title, item fields, explicit total?)`` for one data row; ValueError on bad data."""
+    def cell(field):
+        index = columns.get(field)
+        value = values[index] if index is not None and index < len(values) else None
+        return str(value).strip() if value is not None else ''
+
+    fields = {'name': cell('name')[:255]}
+    if not fields['name']:
+        raise ValueError('Nome do item é obrigatório.')
+
+    for name in DECIMAL_FIELDS:
+        try:
+            number = parse_decimal(cell(name))
+            fields[name] = _fits(name, number) if number is not None else None
+        except ValueError:
+            label = BudgetItem._meta.get_field(name).verbose_name
+            raise ValueError(f'{label}: valor inválido "{cell(name)}".')
+        if fields[name] is not None and fields[name] < 0:
+            label = BudgetItem._meta.get_field(name).verbose_name
+            raise ValueError(f'{label} não pode ser negativo.')
+
+    dimensions = [fields['dim_length'], fields['dim_width'], fields['dim_height']]
+    if any(value == 0 for value in dimensions if value is not None):
+        raise ValueError('As dimensões devem ser maiores que zero.')
+
+    quantity = cell('quantity')
+    try:
+        number = parse_decimal(quantity) if quantity else Decimal(1)
+        if number != number.to_integral_value() or number < 1:
+            raise ValueError
+        fields['quantity'] = int(number)
+    except ValueError:
+        raise ValueError(f'Quantidade inválida "{quantity}".')
+
+    unit = cell('measurement_unit')
+    if unit and normalize(unit) not in UNIT_VALUES:
+        raise ValueError(f'Unidade inválida "{unit}" (use m, m2 ou m3).')
+    fields['measurement_unit'] = UNIT_VALUES.get(normalize(unit)) or None
+
+    billing = cell('billing_type')
+    if billing and normalize(billing) not in BILLING_VALUES:
+        raise ValueError(f'Tipo de cobrança inválido "{billing}".')
+    fields['billing_type'] = BILLING_VALUES.get(normalize(billing), 'qty')
+    if fields['billing_type'] == 'meter' and not fields['measurement'] and not all(dimensions):
+        raise ValueError('Itens cobrados por metro precisam de medida ou das três dimensões.')
+
+    fields['unit_price'] = fields['unit_price'] or Decimal('0')
+    fields['description'] = cell('description')
+    fields['observations'] = cell('observations')
+    fields['include_fiscal'] = normalize(cell('include_fiscal')) in TRUE_VALUES
+
+    total = fields.pop('total_price')
+    keep_total = total is not None and total > 0
+    fields['total_price'] = total if keep_total else Decimal('0')
+    return cell('section')[:255], fields, keep_total
+
+
+def parse_items(rows, default_section=DEFAULT_SECTION):
+    """
+    Validate every row of *rows* (header first).  Returns
+    ``(parsed, errors)``: *parsed* is a list of ``(section title, fields,
+    keep_total)`` and *errors* a list of RowError (1-based line numbers).
+    """
+    parsed, errors = [], []
+    columns = None
+    for line, values in enumerate(rows, 1):
+        if not any(str(value).strip() for value in values if value is not None):
+            continue
+        if columns is None:
+            columns = _header_map(values)
+            if 'name' not in columns:
+                return [], [RowError(line, 'Cabeçalho sem a coluna do nome do item ("Item" ou "Nome").')]
+            continue
+        if len(parsed) + len(errors) >= MAX_ROWS:
+            errors.append(RowError(line, f'A planilha excede o limite de {MAX_ROWS} itens.'))
+            break
+        try:
+            section, fields, keep_total = _row_fields(values, columns)
+        except ValueError as exc:
+            errors.append(RowError(line, str(exc)))
+            continue
+        parsed.append((section or default_section, fields, keep_total))
+    if columns is None:
+        errors.append(RowError(1, 'A planilha está vazia.'))
+    return parsed, errors
+
+
+# ── Import ──────────────────────────────────────────────────────────────────
+
+@transaction.atomic
+def import_items(budget, stream, filename='', default_section=DEFAULT_SECTION, partial=False, dry_run=False):
+    """
+    Import the items of the spreadsheet *stream* into *budget*.
+
+    Nothing is written when a row has errors (unless *partial*, which skips
+    them) or with *dry_run*.  Raises SpreadsheetError for unreadable files.
+    """
+    parsed, errors = parse_items(read_rows(stream, filename), default_section)
+    if dry_run or not parsed or (errors and not partial):
+        return ImportReport(0, 0, errors)
+
+    sections = {}
+    for section in BudgetSection.objects.filter(budget=budget).order_by('order', 'id'):
+        sections.setdefault(normalize(section.title).strip(), section)
+    next_order = (budget.sections.aggregate(last=Max('order'))['last'] or 0) + 1
+
+    new_sections = []
+    for title, _fields, _keep_total in parsed:
+        key = normalize(title).strip()
+        if key not in sections:
+            sections[key] = BudgetSection(budget=budget, title=title, order=next_order + len(new_sections))
+            new_sections.append(sections[key])
+    BudgetSection.objects.bulk_create(new_sections)
+
+    items = []
+    for title, fields, keep_total in parsed:
+        item = BudgetItem(budget=budget, section=sections[normalize(title).strip()], **fields)
+        item.calculate_totals(keep_total=keep_total)
+        items.append(item)
+    BudgetItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+    return ImportReport(len(items), len(new_sections), errors)
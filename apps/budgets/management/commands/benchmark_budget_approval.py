@@ -0,0 +1,83 @@
+"""
+Mede o tempo e o número de queries da aprovação pública de uma proposta.
+
+    python manage.py benchmark_budget_approval
+    python manage.py benchmark_budget_approval --sizes 10,100,1000,2000 --repeat 5
+
+Para cada tamanho cria uma proposta temporária com N itens (e a OS com os
+itens já sincronizados), executa approve_budget() aprovando metade dos itens
+e desfaz tudo ao final: nada é gravado no banco.
+"""
+
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.budgets.approval import approve_budget
+from apps.budgets.models import Budget, BudgetItem
+from apps.budgets.signals import sync_service_order_items
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mede a latência da aprovação de propostas com diferentes quantidades de itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10,100,500,2000',
+            help='Quantidades de itens separadas por vírgula (padrão: 10,100,500,2000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Execuções por tamanho; é exibida a melhor (padrão: 3)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes deve conter números inteiros separados por vírgula')
+        repeat = max(options['repeat'], 1)
+
+        self.stdout.write(f'{"Itens":>8}  {"Melhor (ms)":>12}  {"Queries":>8}')
+        for size in sizes:
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                elapsed, queries = self._run(size)
+                timings.append(elapsed)
+            self.stdout.write(f'{size:>8}  {min(timings) * 1000:>12.1f}  {queries:>8}')
+
+    def _run(self, size):
+        try:
+            with transaction.atomic():
+                budget = Budget.objects.create(name=f'Benchmark aprovação ({size} itens)')
+                BudgetItem.objects.bulk_create([
+                    BudgetItem(
+                        budget=budget,
+                        name=f'Item {index}',
+                        quantity=1 + index % 5,
+                        unit_price=Decimal('10.00'),
+                        total_price=Decimal('10.00') * (1 + index % 5),
+                    )
+                    for index in range(size)
+                ])
+                sync_service_order_items(budget)
+                approved_ids = list(budget.items.values_list('pk', flat=True)[::2])
+
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    approve_budget(budget, approved_ids)
+                    elapsed = time.perf_counter() - started
+                raise _Rollback(elapsed, len(ctx.captured_queries))
+        except _Rollback as result:
+            return result.args
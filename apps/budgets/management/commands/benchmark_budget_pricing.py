@@ -0,0 +1,64 @@
+"""
+Micro-benchmark do núcleo de precificação (apps/budgets/pricing.py).
+
+    python manage.py benchmark_budget_pricing
+    python manage.py benchmark_budget_pricing --sizes 100,10000,100000 --repeat 10
+
+Gera itens sintéticos em memória e mede price_budget(); não acessa o banco.
+"""
+
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.budgets import pricing
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo de precificação de propostas com muitos itens, sem acessar o banco'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,1000,10000',
+            help='Quantidades de itens separadas por vírgula (padrão: 100,1000,10000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Execuções por tamanho; é exibida a melhor (padrão: 5)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes deve conter números inteiros separados por vírgula')
+        repeat = max(options['repeat'], 1)
+        rng = random.Random(0)
+        extra_charges = {'apoio': [{'label': 'Apoio', 'value': '350.00', 'fiscal': True}]}
+
+        self.stdout.write(f'{"Itens":>8}  {"Melhor (ms)":>12}  {"µs/item":>8}')
+        for size in sizes:
+            lines = [
+                pricing.ItemLine(
+                    Decimal(rng.randint(100, 500000)) / 100,
+                    rng.randint(1, 20),
+                    Decimal(rng.randint(0, 5000)) / 10,
+                    Decimal(rng.randint(0, 9000)) / 1000,
+                    'm3',
+                    rng.random() < 0.4,
+                    rng.random() < 0.8,
+                )
+                for _ in range(size)
+            ]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                pricing.price_budget(lines, extra_charges, 'percent', Decimal('5'), Decimal('800'), True)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            self.stdout.write(f'{size:>8}  {best * 1000:>12.2f}  {best * 1e6 / max(size, 1):>8.2f}')
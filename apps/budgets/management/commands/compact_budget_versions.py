@@ -0,0 +1,112 @@
+"""
+Re-encode o histórico de versões das propostas e aplica a política de retenção.
+
+    python manage.py compact_budget_versions                  # dry-run
+    python manage.py compact_budget_versions --commit         # aplica
+    python manage.py compact_budget_versions --keep-last 20 --keep-days 90 --commit
+
+O que faz, proposta por proposta (uma transação cada):
+  1. Decodifica todas as versões (JSON completo antigo, quadros-chave e deltas).
+  2. Remove as versões fora da retenção. São sempre mantidas: as --keep-last
+     mais recentes, as criadas nos últimos --keep-days dias e as que têm rótulo.
+  3. Regrava as restantes como uma nova cadeia de quadros-chave + deltas
+     comprimidos (ver apps/budgets/versioning.py).
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.budgets.models import BudgetVersion
+from apps.budgets.versioning import iter_snapshots, reencode
+
+
+class Command(BaseCommand):
+    help = 'Comprime o histórico de versões das propostas e remove versões fora da retenção'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--commit',
+            action='store_true',
+            help='Persiste as alterações no banco (sem esta flag roda em dry-run)',
+        )
+        parser.add_argument(
+            '--keep-last',
+            type=int,
+            default=None,
+            help='Mantém as N versões mais recentes de cada proposta (padrão: todas)',
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=None,
+            help='Mantém as versões criadas nos últimos N dias',
+        )
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=None,
+            help='Processa apenas a proposta com este ID',
+        )
+
+    def handle(self, *args, **options):
+        commit = options['commit']
+        keep_last = options['keep_last']
+        keep_days = options['keep_days']
+        cutoff = timezone.now() - timedelta(days=keep_days) if keep_days is not None else None
+
+        budget_ids = BudgetVersion.objects.order_by('budget_id').values_list('budget_id', flat=True).distinct()
+        if options['budget']:
+            budget_ids = budget_ids.filter(budget_id=options['budget'])
+
+        total_pruned = total_reencoded = 0
+        for budget_id in list(budget_ids):
+            with transaction.atomic():
+                pruned, reencoded = self._process_budget(budget_id, keep_last, cutoff, commit)
+            total_pruned += pruned
+            total_reencoded += reencoded
+            if pruned or reencoded:
+                self.stdout.write(
+                    f'  Proposta #{budget_id}: {pruned} versão(ões) removida(s), '
+                    f'{reencoded} regravada(s)'
+                )
+
+        summary = f'{total_pruned} versão(ões) removida(s), {total_reencoded} regravada(s).'
+        if commit:
+            self.stdout.write(self.style.SUCCESS(f'✔ {summary}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Dry-run: {summary} Use --commit para aplicar.'))
+
+    def _process_budget(self, budget_id, keep_last, cutoff, commit):
+        versions = list(
+            BudgetVersion.objects.select_for_update()
+            .filter(budget_id=budget_id)
+            .order_by('version_number')
+        )
+        for version, snapshot in iter_snapshots(versions):
+            version.decoded = snapshot
+
+        retention = keep_last is not None or cutoff is not None
+        recent = {v.pk for v in versions[-keep_last:]} if keep_last else set()
+        kept = []
+        pruned = []
+        for version in versions:
+            if (
+                not retention
+                or version.pk in recent
+                or version.label
+                or (cutoff is not None and version.created_at >= cutoff)
+            ):
+                kept.append(version)
+            else:
+                pruned.append(version)
+
+        changed = reencode(kept)
+        if commit:
+            if pruned:
+                BudgetVersion.objects.filter(pk__in=[v.pk for v in pruned]).delete()
+            if changed:
+                BudgetVersion.objects.bulk_update(changed, ['encoding', 'payload', 'snapshot'])
+        return len(pruned), len(changed)
@@ -0,0 +1,55 @@
+"""
+Exporta propostas (ou os itens das propostas) em CSV ou XLSX.
+
+    python manage.py export_budgets --output itens.csv
+    python manage.py export_budgets --format xlsx --scope budgets --status approved --output propostas.xlsx
+
+Os filtros são os mesmos da listagem de propostas. O arquivo é gravado em
+blocos, sem carregar todas as linhas em memória.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apps.budgets.export import FORMATS, SCOPES, stream_export
+from apps.budgets.models import Budget
+
+
+class Command(BaseCommand):
+    help = 'Exporta propostas ou itens de propostas em CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='Formato do arquivo (padrão: csv)')
+        parser.add_argument(
+            '--scope',
+            choices=SCOPES,
+            default='items',
+            help='items: uma linha por item; budgets: uma linha por proposta (padrão: items)',
+        )
+        parser.add_argument('--output', default='-', help='Arquivo de saída; "-" para a saída padrão (padrão: -)')
+        parser.add_argument('--search', default='', help='Busca por nome, projeto ou evento')
+        parser.add_argument('--status', default='', help='Filtra pelo status da proposta')
+        parser.add_argument('--proposal', default='', help='Filtra pelo ID do projeto')
+
+    def handle(self, *args, **options):
+        budgets = Budget.objects.filter_listing(
+            search=options['search'],
+            status=options['status'],
+            proposal=options['proposal'],
+        )
+        chunks = stream_export(budgets, options['format'], options['scope'])
+
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        size = 0
+        with open(options['output'], 'wb') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                size += len(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exportação gravada em {options["output"]} ({size} bytes).'))
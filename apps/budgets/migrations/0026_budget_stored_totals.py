@@ -0,0 +1,114 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:24
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0025_alter_budget_approval_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='approved_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Base Fiscal dos Itens Confirmados'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='approved_items_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Itens Confirmados'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='extra_charges_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Encargos Adicionais'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='extra_charges_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Base Fiscal dos Encargos Adicionais'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='fiscal_items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Itens com Encargos Fiscais'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Quantidade de Itens'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='items_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, help_text='Soma dos itens com encargos fiscais (antes dos 17%)', max_digits=18, verbose_name='Base Fiscal dos Itens'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='items_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Itens'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='items_volume',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Volume Total (m³)'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='items_weight',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Peso Total (kg)'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='approved_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Base Fiscal dos Itens Confirmados'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='approved_items_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Itens Confirmados'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='extra_charges_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Encargos Adicionais'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='extra_charges_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Base Fiscal dos Encargos Adicionais'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='fiscal_items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Itens com Encargos Fiscais'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Quantidade de Itens'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='items_fiscal_base',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, help_text='Soma dos itens com encargos fiscais (antes dos 17%)', max_digits=18, verbose_name='Base Fiscal dos Itens'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='items_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Total dos Itens'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='items_volume',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Volume Total (m³)'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='items_weight',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0'), editable=False, max_digits=18, verbose_name='Peso Total (kg)'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """Populate the stored totals on every existing budget (including soft-deleted ones)."""
+    Budget = apps.get_model('budgets', 'Budget')
+    BudgetItem = apps.get_model('budgets', 'BudgetItem')
+
+    zero = Value(Decimal('0'))
+    fiscal = Q(include_fiscal=True)
+    approved = Q(is_approved=True)
+    rows = BudgetItem.objects.values('budget_id').annotate(
+        items_total=Coalesce(Sum('total_price'), zero),
+        items_fiscal_base=Coalesce(Sum('total_price', filter=fiscal), zero),
+        approved_items_total=Coalesce(Sum('total_price', filter=approved), zero),
+        approved_fiscal_base=Coalesce(Sum('total_price', filter=approved & fiscal), zero),
+        items_weight=Coalesce(Sum(F('weight') * F('quantity'), filter=Q(weight__isnull=False)), zero),
+        items_volume=Coalesce(
+            Sum(F('measurement') * F('quantity'),
+                filter=Q(measurement__isnull=False, measurement_unit='m3')),
+            zero,
+        ),
+        items_count=Count('id'),
+        fiscal_items_count=Count('id', filter=fiscal),
+    ).order_by()
+    for row in rows:
+        budget_id = row.pop('budget_id')
+        Budget.objects.filter(pk=budget_id).update(**row)
+
+    for budget in Budget.objects.exclude(extra_charges={}).only('pk', 'extra_charges'):
+        base = Decimal('0')
+        fiscal_base = Decimal('0')
+        for group in (budget.extra_charges or {}).values():
+            if not isinstance(group, list):
+                continue
+            for row in group:
+                try:
+                    value = Decimal(str(row.get('value') or 0))
+                except Exception:
+                    continue
+                base += value
+                if row.get('fiscal'):
+                    fiscal_base += value
+        Budget.objects.filter(pk=budget.pk).update(
+            extra_charges_base=base,
+            extra_charges_fiscal_base=fiscal_base,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0026_budget_stored_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
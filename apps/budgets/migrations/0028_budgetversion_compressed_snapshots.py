@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0027_backfill_budget_stored_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetversion',
+            name='encoding',
+            field=models.CharField(choices=[('full', 'JSON completo'), ('keyframe', 'Quadro-chave comprimido'), ('delta', 'Delta comprimido')], default='full', max_length=10, verbose_name='Codificação'),
+        ),
+        migrations.AddField(
+            model_name='budgetversion',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Dados comprimidos'),
+        ),
+        migrations.AlterField(
+            model_name='budgetversion',
+            name='snapshot',
+            field=models.JSONField(blank=True, help_text='Cópia completa dos dados da proposta (versões antigas, não comprimidas)', null=True, verbose_name='Snapshot'),
+        ),
+    ]
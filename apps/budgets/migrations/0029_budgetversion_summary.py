@@ -0,0 +1,116 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:36
+
+import json
+import zlib
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# Frozen copies of the snapshot decoding and summary of apps.budgets.versioning
+# as of this migration, so later changes there don't alter what it does.
+def _decompress(payload):
+    return json.loads(zlib.decompress(bytes(payload)).decode('utf-8'))
+
+
+def _apply_delta(old, node):
+    if node is None:
+        return old
+    tag = node[0]
+    if tag == '=':
+        return node[1]
+    if tag == 'd':
+        _, changed, removed = node
+        result = dict(old or {})
+        for key, sub in changed.items():
+            result[key] = _apply_delta(result.get(key), sub)
+        for key in removed:
+            result.pop(key, None)
+        return result
+    if tag == 'l':
+        _, order, changed, added = node
+        old_rows = {str(row['id']): row for row in old or []}
+        result = []
+        for row_id in order:
+            key = str(row_id)
+            if key in added:
+                result.append(added[key])
+            else:
+                result.append(_apply_delta(old_rows[key], changed.get(key)))
+        return result
+    raise ValueError(f'Unknown snapshot delta node: {tag!r}')
+
+
+def _decode(version, previous_snapshot):
+    if version.encoding == 'keyframe':
+        return _decompress(version.payload)
+    if version.encoding == 'delta':
+        return _apply_delta(previous_snapshot, _decompress(version.payload))
+    return version.snapshot or {}
+
+
+def _summary_fields(snapshot):
+    sections = snapshot.get('sections') or []
+    try:
+        total = Decimal(str(snapshot['total_with_freight'])).quantize(Decimal('0.01'))
+    except (KeyError, InvalidOperation, ValueError, TypeError):
+        total = None
+    return {
+        'total_with_freight': total,
+        'status': snapshot.get('status') or '',
+        'items_count': (
+            sum(len(section.get('items') or []) for section in sections)
+            + len(snapshot.get('unsectioned_items') or [])
+        ),
+        'sections_count': len(sections),
+    }
+
+
+def backfill_summary(apps, schema_editor):
+    """Write the summary columns of existing versions, decoding each budget's chain once."""
+    BudgetVersion = apps.get_model('budgets', 'BudgetVersion')
+
+    budget_ids = BudgetVersion.objects.order_by().values_list('budget_id', flat=True).distinct()
+    for budget_id in list(budget_ids):
+        versions = BudgetVersion.objects.filter(budget_id=budget_id).order_by('version_number')
+        changed = []
+        snapshot = None
+        for version in versions:
+            snapshot = _decode(version, snapshot)
+            for name, value in _summary_fields(snapshot).items():
+                setattr(version, name, value)
+            changed.append(version)
+        BudgetVersion.objects.bulk_update(
+            changed, ['total_with_freight', 'status', 'items_count', 'sections_count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0028_budgetversion_compressed_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetversion',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Itens'),
+        ),
+        migrations.AddField(
+            model_name='budgetversion',
+            name='sections_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Seções'),
+        ),
+        migrations.AddField(
+            model_name='budgetversion',
+            name='status',
+            field=models.CharField(blank=True, max_length=10, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='budgetversion',
+            name='total_with_freight',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True, verbose_name='Total com Frete'),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
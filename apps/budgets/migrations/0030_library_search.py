@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+TRIGRAM_INDEXES = (
+    ('budgets_itemdescription', 'title'),
+    ('budgets_itemdescription', 'body'),
+    ('budgets_paymentinfotemplate', 'title'),
+    ('budgets_paymentinfotemplate', 'body'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    GIN trigram indexes for the typeahead search (PostgreSQL only).
+
+    Django compiles ``icontains`` to ``UPPER(col::text) LIKE UPPER(...)``, so
+    the indexes are built on that expression.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+            f'ON {table} USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0029_budgetversion_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemdescription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Atualizado em'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='paymentinfotemplate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Atualizado em'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
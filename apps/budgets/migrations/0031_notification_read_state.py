@@ -0,0 +1,57 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_read_state(apps, schema_editor):
+    """
+    Start the watermark of every user present at migrate time (active or
+    not) just below the oldest notification still unread under the old
+    global flag, so nothing unread disappears.  Users created afterwards are
+    seeded by budgets.signals.seed_notification_read_state.
+    """
+    BudgetNotification = apps.get_model('budgets', 'BudgetNotification')
+    NotificationReadState = apps.get_model('budgets', 'NotificationReadState')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    oldest_unread = BudgetNotification.objects.filter(is_read=False).aggregate(models.Min('id'))['id__min']
+    if oldest_unread is not None:
+        last_read_id = oldest_unread - 1
+    else:
+        last_read_id = BudgetNotification.objects.aggregate(models.Max('id'))['id__max'] or 0
+
+    NotificationReadState.objects.bulk_create([
+        NotificationReadState(user_id=user_id, last_read_id=last_read_id)
+        for user_id in User.objects.values_list('pk', flat=True)
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0030_library_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.PositiveBigIntegerField(default=0, verbose_name='Última notificação lida')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_state', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Leitura de Notificações',
+                'verbose_name_plural': 'Leituras de Notificações',
+            },
+        ),
+        migrations.RunPython(seed_read_state, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='budgetnotification',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0031_notification_read_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Revisão'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='service_order_revision',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Revisão sincronizada com a OS'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Revisão'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='service_order_revision',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Revisão sincronizada com a OS'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:02
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0032_budget_revision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Nome')),
+                ('description', models.TextField(blank=True, default='', verbose_name='Descrição')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Campos da proposta, seções e itens copiados do orçamento de origem', verbose_name='Conteúdo')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='Itens')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='budget_templates_created', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('source_budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='templates', to='budgets.budget', verbose_name='Proposta de origem')),
+            ],
+            options={
+                'verbose_name': 'Modelo de Proposta',
+                'verbose_name_plural': 'Modelos de Proposta',
+                'ordering': ['name', 'id'],
+            },
+        ),
+    ]
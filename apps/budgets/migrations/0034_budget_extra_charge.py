@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0033_budget_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetExtraCharge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(choices=[('logistica', 'Logística'), ('apoio', 'Apoio'), ('mao_de_obra', 'Mão de obra'), ('documentacao', 'Documentação'), ('taxa_feira', 'Taxa da feira'), ('outros', 'Outros')], max_length=30, verbose_name='Grupo')),
+                ('label', models.CharField(blank=True, max_length=255, verbose_name='Descrição')),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=15, verbose_name='Valor')),
+                ('fiscal', models.BooleanField(default=False, verbose_name='Encargos Fiscais (17%)')),
+                ('order', models.PositiveIntegerField(default=0, verbose_name='Ordem')),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_charge_rows', to='budgets.budget', verbose_name='Orçamento')),
+            ],
+            options={
+                'verbose_name': 'Encargo Adicional',
+                'verbose_name_plural': 'Encargos Adicionais',
+                'ordering': ['budget', 'order', 'id'],
+                'indexes': [models.Index(fields=['budget', 'fiscal', 'value'], name='budgets_extra_charge_sum_idx'), models.Index(fields=['group'], name='budgets_extra_charge_group_idx')],
+            },
+        ),
+    ]
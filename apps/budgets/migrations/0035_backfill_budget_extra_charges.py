@@ -0,0 +1,63 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+CENT = Decimal('0.01')
+
+
+def copy_to_rows(apps, schema_editor):
+    """Copy Budget.extra_charges (JSON) into BudgetExtraCharge rows, for every budget including soft-deleted ones."""
+    Budget = apps.get_model('budgets', 'Budget')
+    BudgetExtraCharge = apps.get_model('budgets', 'BudgetExtraCharge')
+
+    rows = []
+    for budget_id, charges in Budget.objects.exclude(extra_charges={}).values_list('pk', 'extra_charges').iterator():
+        order = 0
+        for group, entries in (charges or {}).items():
+            if not isinstance(entries, list):
+                continue
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    value = Decimal(str(entry.get('value') or 0)).quantize(CENT)
+                except (InvalidOperation, ValueError):
+                    value = Decimal('0')
+                rows.append(BudgetExtraCharge(
+                    budget_id=budget_id,
+                    group=str(group)[:30],
+                    label=str(entry.get('label') or '')[:255],
+                    value=value,
+                    fiscal=bool(entry.get('fiscal')),
+                    order=order,
+                ))
+                order += 1
+        if len(rows) >= 1000:
+            BudgetExtraCharge.objects.bulk_create(rows)
+            rows = []
+    BudgetExtraCharge.objects.bulk_create(rows)
+
+
+def copy_to_json(apps, schema_editor):
+    """Rebuild Budget.extra_charges from the rows."""
+    Budget = apps.get_model('budgets', 'Budget')
+    BudgetExtraCharge = apps.get_model('budgets', 'BudgetExtraCharge')
+
+    charges = {}
+    for row in BudgetExtraCharge.objects.order_by('budget_id', 'order', 'id').iterator():
+        charges.setdefault(row.budget_id, {}).setdefault(row.group, []).append(
+            {'label': row.label, 'value': str(row.value), 'fiscal': row.fiscal}
+        )
+    for budget_id, value in charges.items():
+        Budget.objects.filter(pk=budget_id).update(extra_charges=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0034_budget_extra_charge'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_rows, copy_to_json),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0035_backfill_budget_extra_charges'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='budget',
+            name='extra_charges',
+        ),
+        migrations.RemoveField(
+            model_name='historicalbudget',
+            name='extra_charges',
+        ),
+    ]
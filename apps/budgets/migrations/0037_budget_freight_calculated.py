@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+def mark_calculated(apps, schema_editor):
+    """
+    Freights saved by the calculator carry an urgency level (the budget form
+    never sets one), so those are the ones known to come from the tariff.
+    """
+    Budget = apps.get_model('budgets', 'Budget')
+    Budget.objects.filter(freight_urgency__isnull=False, freight_cost__gt=0).update(freight_calculated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0036_remove_budget_extra_charges'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='freight_calculated',
+            field=models.BooleanField(default=False, help_text='O frete veio da calculadora de frete; só estes são recalculados quando a tabela muda', verbose_name='Frete Calculado'),
+        ),
+        migrations.AddField(
+            model_name='historicalbudget',
+            name='freight_calculated',
+            field=models.BooleanField(default=False, help_text='O frete veio da calculadora de frete; só estes são recalculados quando a tabela muda', verbose_name='Frete Calculado'),
+        ),
+        migrations.RunPython(mark_calculated, migrations.RunPython.noop),
+    ]
@@ -2,13 +2,119 @@
 Budget models for event cost estimation.
 """
 
+import hashlib
 import uuid
 from decimal import Decimal
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.dispatch import Signal
 from django.utils import timezone
+from safedelete.managers import SafeDeleteAllManager, SafeDeleteDeletedManager, SafeDeleteManager
+from safedelete.queryset import SafeDeleteQueryset
 from apps.common.models import BaseModel
+from . import pricing
+from .pricing import FISCAL_RATE
+
+
+# Sent with ``budget_ids`` after set-based item writes, which fire no
+# per-row signals (see Budget.refresh_item_totals_for).
+items_changed = Signal()
+
+
+def _money(expression):
+    return ExpressionWrapper(expression, output_field=DecimalField(max_digits=20, decimal_places=4))
+
+
+def _discount_expression(base, base_alias):
+    """
+    SQL mirror of Budget.calculate_discount() over the expression *base*.
+
+    *base_alias* names an annotation holding the same expression, used in
+    the When() conditions.
+    """
+    value = F('discount_value')
+    positive_base = Q(**{f'{base_alias}__gt': 0})
+    return Case(
+        When(
+            Q(discount_type='percent', discount_value__gt=0) & positive_base,
+            then=_money(Least(base * value / Value(Decimal('100')), base)),
+        ),
+        When(
+            Q(discount_type='value', discount_value__gt=0) & positive_base,
+            then=_money(Least(value, base)),
+        ),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+
+
+class BudgetQuerySet(SafeDeleteQueryset):
+    """QuerySet for Budget with SQL-computed totals for listings and reports."""
+
+    def filter_listing(self, search='', status='', proposal=''):
+        """
+        Apply the budget list filters: full-text search (annotates
+        ``search_rank``, see apps.common.search), status and project.
+        """
+        from apps.common.search import search as full_text_search
+
+        queryset = self
+        search = (search or '').strip()
+        if search:
+            queryset = full_text_search(queryset, 'budget', search)
+        status = (status or '').strip()
+        if status:
+            queryset = queryset.filter(status=status)
+        proposal = (proposal or '').strip()
+        if proposal:
+            queryset = queryset.filter(proposal_id=proposal)
+        return queryset
+
+    def with_totals(self):
+        """
+        Annotate every row with the money figures the templates display,
+        computed in SQL from the stored aggregates:
+
+        - annotated_fiscal_charges     → Budget.fiscal_charges_value
+        - annotated_discount           → Budget.discount_amount
+        - annotated_total_with_freight → Budget.total_with_freight
+        - annotated_approved_value     → Budget.approved_value
+
+        The Budget properties return these annotations when present, so
+        templates keep using ``budget.total_with_freight`` etc. and a listing
+        costs one query no matter how many rows it renders.
+        """
+        zero = Value(Decimal('0'))
+        rate = Value(FISCAL_RATE)
+        extra_fiscal = F('extra_charges_fiscal_base') * rate
+        fiscal = _money(F('items_fiscal_base') * rate + extra_fiscal)
+        base_total = _money(
+            F('items_total') + fiscal + Coalesce(F('freight_cost'), zero) + F('extra_charges_base')
+        )
+        approved_total = _money(
+            F('approved_items_total')
+            + F('approved_fiscal_base') * rate
+            + extra_fiscal
+            + Case(
+                When(freight_included=True, freight_cost__isnull=False, then=F('freight_cost')),
+                default=zero,
+            )
+            + F('extra_charges_base')
+        )
+        return self.annotate(
+            annotated_fiscal_charges=fiscal,
+            annotated_base_total=base_total,
+            annotated_approved_base=approved_total,
+        ).annotate(
+            annotated_discount=_discount_expression(base_total, 'annotated_base_total'),
+            annotated_approved_discount=_discount_expression(approved_total, 'annotated_approved_base'),
+        ).annotate(
+            annotated_total_with_freight=_money(base_total - F('annotated_discount')),
+            annotated_approved_value=_money(approved_total - F('annotated_approved_discount')),
+        )
 
 
 class Budget(BaseModel):
@@ -101,6 +207,11 @@ class Budget(BaseModel):
         null=True,
         help_text='Calculado automaticamente ou informado manualmente'
     )
+    freight_calculated = models.BooleanField(
+        'Frete Calculado',
+        default=False,
+        help_text='O frete veio da calculadora de frete; só estes são recalculados quando a tabela muda'
+    )
     freight_urgency = models.ForeignKey(
         'logistics.UrgencyMultiplier',
         on_delete=models.SET_NULL,
@@ -131,13 +242,6 @@ class Budget(BaseModel):
         help_text='Aplica 17% de encargos fiscais sobre os itens do orçamento'
     )
 
-    extra_charges = models.JSONField(
-        'Encargos Adicionais',
-        default=dict,
-        blank=True,
-        help_text='Apoio, mão de obra extra, documentação e taxas da feira'
-    )
-
     DISCOUNT_TYPE_CHOICES = [
         ('none', 'Sem desconto'),
         ('percent', 'Percentual (%)'),
@@ -160,6 +264,111 @@ class Budget(BaseModel):
         help_text='Percentual (%) ou valor fixo (R$), conforme o tipo selecionado',
     )
 
+    # ── Denormalised totals (kept in sync by BudgetItem writes) ─────────
+    items_total = models.DecimalField(
+        'Total dos Itens',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+    )
+    items_fiscal_base = models.DecimalField(
+        'Base Fiscal dos Itens',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+        help_text='Soma dos itens com encargos fiscais (antes dos 17%)'
+    )
+    approved_items_total = models.DecimalField(
+        'Total dos Itens Confirmados',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+    )
+    approved_fiscal_base = models.DecimalField(
+        'Base Fiscal dos Itens Confirmados',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+    )
+    items_weight = models.DecimalField(
+        'Peso Total (kg)',
+        max_digits=18,
+        decimal_places=3,
+        default=Decimal('0'),
+        editable=False,
+    )
+    items_volume = models.DecimalField(
+        'Volume Total (m³)',
+        max_digits=18,
+        decimal_places=3,
+        default=Decimal('0'),
+        editable=False,
+    )
+    items_count = models.PositiveIntegerField(
+        'Quantidade de Itens',
+        default=0,
+        editable=False,
+    )
+    fiscal_items_count = models.PositiveIntegerField(
+        'Itens com Encargos Fiscais',
+        default=0,
+        editable=False,
+    )
+    extra_charges_base = models.DecimalField(
+        'Total dos Encargos Adicionais',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+    )
+    extra_charges_fiscal_base = models.DecimalField(
+        'Base Fiscal dos Encargos Adicionais',
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        editable=False,
+    )
+
+    # Optimistic concurrency for the autosave API (budgets.autosave): every
+    # write bumps revision; service_order_revision is the revision the
+    # Service Order items were last synchronised from.
+    revision = models.PositiveIntegerField(
+        'Revisão',
+        default=0,
+        editable=False,
+    )
+    service_order_revision = models.PositiveIntegerField(
+        'Revisão sincronizada com a OS',
+        default=0,
+        editable=False,
+    )
+
+    objects = SafeDeleteManager.from_queryset(BudgetQuerySet)()
+    all_objects = SafeDeleteAllManager.from_queryset(BudgetQuerySet)()
+    deleted_objects = SafeDeleteDeletedManager.from_queryset(BudgetQuerySet)()
+
+    # Stored item aggregates, in the same order as BudgetItem.totals_contribution()
+    ITEM_TOTAL_FIELDS = (
+        'items_total',
+        'items_fiscal_base',
+        'approved_items_total',
+        'approved_fiscal_base',
+        'items_weight',
+        'items_volume',
+        'items_count',
+        'fiscal_items_count',
+    )
+
+    # Counters owned by budgets.autosave, advanced with conditional UPDATEs
+    REVISION_FIELDS = ('revision', 'service_order_revision')
+
+    # Stored sums of the BudgetExtraCharge rows, ordered like BudgetExtraChargeQuerySet.sums()
+    EXTRA_CHARGE_TOTAL_FIELDS = ('extra_charges_base', 'extra_charges_fiscal_base')
+
     class Meta:
         verbose_name = 'Orçamento'
         verbose_name_plural = 'Orçamentos'
@@ -174,54 +383,264 @@ class Budget(BaseModel):
         """Generate public approval URL."""
         from django.urls import reverse
         return reverse('budgets:public_approval', kwargs={'token': str(self.approval_token)})
-    
+
+    def save(self, *args, **kwargs):
+        """
+        Write the extra charges assigned through the ``extra_charges``
+        accessor (a pseudo-field: it may appear in update_fields).
+
+        The stored item aggregates are owned by BudgetItem writes, the
+        extra-charge sums by BudgetExtraCharge writes and the revision
+        counters by budgets.autosave, so a full save of an existing budget
+        never writes them back (a stale instance would otherwise clobber them).
+        """
+        update_fields = kwargs.get('update_fields')
+        dirty = self.__dict__.get('_extra_charges_dirty', False) and (
+            update_fields is None or 'extra_charges' in update_fields
+        )
+        # Assigned charges were summed in memory: their sums go out with the row
+        charge_sums = set(self.EXTRA_CHARGE_TOTAL_FIELDS) if dirty else set()
+        if update_fields is None and not self._state.adding and self.pk is not None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key
+                and f.name not in self.ITEM_TOTAL_FIELDS
+                and (f.name not in self.EXTRA_CHARGE_TOTAL_FIELDS or f.name in charge_sums)
+                and f.name not in self.REVISION_FIELDS
+            ]
+        elif update_fields is not None and 'extra_charges' in update_fields:
+            kwargs['update_fields'] = (set(update_fields) - {'extra_charges'}) | charge_sums
+        super().save(*args, **kwargs)
+        self.__dict__.pop('_priced', None)
+        if dirty:
+            self._write_extra_charges()
+
+    # ── Extra charges ───────────────────────────────────────────────────────
+
+    @property
+    def extra_charges(self):
+        """
+        The BudgetExtraCharge rows grouped the way the form, the templates
+        and the version snapshots use them::
+
+            {'apoio': [{'label': 'Transporte', 'value': '150.00', 'fiscal': True}, ...], ...}
+
+        Read once per instance (or from ``prefetch_related('extra_charge_rows')``).
+        Assigning a dict of that shape replaces the rows on the next save().
+        """
+        if '_extra_charges' not in self.__dict__:
+            charges = {}
+            if self.pk is not None:
+                for row in self.extra_charge_rows.all():
+                    charges.setdefault(row.group, []).append(row.as_dict())
+            self.__dict__['_extra_charges'] = charges
+        return self.__dict__['_extra_charges']
+
+    @extra_charges.setter
+    def extra_charges(self, value):
+        rows = BudgetExtraCharge.rows_from_dict(value)
+        self.__dict__['_extra_charges'] = grouped = {}
+        for row in rows:
+            grouped.setdefault(row.group, []).append(row.as_dict())
+        self.__dict__['_extra_charges_rows'] = rows
+        self.__dict__['_extra_charges_dirty'] = True
+        self.extra_charges_base, self.extra_charges_fiscal_base = pricing.extra_charges_sums(grouped)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """Also drop the memoized pricing and the extra charges read (or assigned) through the accessor."""
+        reload_charges = fields is None or 'extra_charges' in fields
+        if fields is not None:
+            fields = [name for name in fields if name != 'extra_charges']
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.__dict__.pop('_priced', None)
+        if reload_charges:
+            for name in ('_extra_charges', '_extra_charges_rows', '_extra_charges_dirty'):
+                self.__dict__.pop(name, None)
+
+    def _write_extra_charges(self):
+        """Replace the stored extra charge rows with the assigned ones (their sums were saved by save())."""
+        del self.__dict__['_extra_charges_dirty']
+        rows = self.__dict__.pop('_extra_charges_rows', [])
+        BudgetExtraCharge.objects.filter(budget_id=self.pk).delete(refresh_totals=False)
+        for row in rows:
+            row.budget_id = self.pk
+        BudgetExtraCharge.objects.bulk_create(rows, refresh_totals=False)
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        prefetched.pop('extra_charge_rows', None)
+
+    def refresh_extra_charges_totals(self):
+        """Recompute the stored extra-charge sums from the rows (one aggregate + one UPDATE)."""
+        Budget.refresh_extra_charges_totals_for([self.pk])
+        values = Budget.all_objects.filter(pk=self.pk).values(*self.EXTRA_CHARGE_TOTAL_FIELDS).first()
+        for name, value in (values or {}).items():
+            setattr(self, name, value)
+
+    @classmethod
+    def refresh_extra_charges_totals_for(cls, budget_ids):
+        """Recompute the stored extra-charge sums for every budget in *budget_ids*."""
+        budget_ids = {pk for pk in budget_ids if pk is not None}
+        if not budget_ids:
+            return
+        rows = BudgetExtraCharge.objects.filter(budget_id__in=budget_ids).totals_by('budget_id')
+        found = set()
+        for row in rows:
+            budget_id = row.pop('budget_id')
+            found.add(budget_id)
+            cls.all_objects.filter(pk=budget_id).update(**row)
+        empty = budget_ids - found
+        if empty:
+            cls.all_objects.filter(pk__in=empty).update(**{
+                name: 0 for name in cls.EXTRA_CHARGE_TOTAL_FIELDS
+            })
+
+    def apply_item_totals_delta(self, delta):
+        """
+        Add *delta* (a tuple ordered like ITEM_TOTAL_FIELDS) to the stored
+        item aggregates with a single UPDATE, and mirror it on this instance.
+
+        updated_at is bumped even for a zero delta, since any item change
+        makes cached renderings of the budget stale.
+        """
+        now = timezone.now()
+        Budget.all_objects.filter(pk=self.pk).update(updated_at=now, **{
+            name: F(name) + value
+            for name, value in zip(self.ITEM_TOTAL_FIELDS, delta)
+            if value
+        })
+        for name, value in zip(self.ITEM_TOTAL_FIELDS, delta):
+            setattr(self, name, getattr(self, name) + value)
+        self.updated_at = now
+
+    def refresh_item_totals(self):
+        """Recompute the stored item aggregates from scratch (one aggregate + one UPDATE)."""
+        Budget.refresh_item_totals_for([self.pk])
+        values = Budget.all_objects.filter(pk=self.pk).values(*self.ITEM_TOTAL_FIELDS, 'updated_at').first()
+        for name, value in (values or {}).items():
+            setattr(self, name, value)
+
+    @classmethod
+    def refresh_item_totals_for(cls, budget_ids):
+        """
+        Recompute the stored item aggregates for every budget in *budget_ids*.
+
+        Used after bulk writes (bulk_create, bulk_update, queryset.update) where
+        per-row deltas are not available; also sends items_changed.
+        """
+        budget_ids = {pk for pk in budget_ids if pk is not None}
+        if not budget_ids:
+            return
+        items_changed.send(sender=cls, budget_ids=budget_ids)
+        rows = BudgetItem.objects.filter(budget_id__in=budget_ids).totals_by('budget_id')
+        now = timezone.now()
+        found = set()
+        for row in rows:
+            budget_id = row.pop('budget_id')
+            found.add(budget_id)
+            cls.all_objects.filter(pk=budget_id).update(updated_at=now, **row)
+        empty = budget_ids - found
+        if empty:
+            cls.all_objects.filter(pk__in=empty).update(updated_at=now, **{
+                name: 0 for name in cls.ITEM_TOTAL_FIELDS
+            })
+
+    def _pricing_inputs(self):
+        """Everything priced() depends on, as a comparable tuple."""
+        return (
+            tuple(getattr(self, name) for name in self.ITEM_TOTAL_FIELDS),
+            self.extra_charges_base,
+            self.extra_charges_fiscal_base,
+            self.discount_type,
+            self.discount_value,
+            self.freight_cost,
+            self.freight_included,
+        )
+
+    def priced(self):
+        """
+        All money figures from the stored aggregates (see budgets.pricing).
+
+        Memoized on the instance, so a page reading total_with_freight,
+        discount_amount, fiscal_charges_value... prices the budget once.  The
+        memo is keyed by the pricing inputs, so assigning a field (or an item
+        write updating the aggregates in memory) reprices on the next read;
+        save() and refresh_from_db() drop it.
+        """
+        inputs = self._pricing_inputs()
+        memo = self.__dict__.get('_priced')
+        if memo is None or memo[0] != inputs:
+            items, *rest = inputs
+            memo = self.__dict__['_priced'] = (
+                inputs, pricing.price_totals(pricing.ItemAggregates(*items), *rest),
+            )
+        return memo[1]
+
     @property
     def total_value(self):
-        """Calculate total value from all budget items."""
-        total = self.items.aggregate(total=Sum('total_price'))['total']
-        return total or 0
+        """Total value of all budget items (stored aggregate)."""
+        return self.items_total
 
     @property
     def extra_charges_total(self):
-        """Sum all extra charge entries from the JSON field (base values, no fiscal)."""
-        total = Decimal('0')
-        charges = self.extra_charges or {}
-        for rows in charges.values():
-            if isinstance(rows, list):
-                for row in rows:
-                    try:
-                        total += Decimal(str(row.get('value') or 0))
-                    except Exception:
-                        pass
-        return total
+        """Sum of all extra charge entries (base values, no fiscal)."""
+        return self.extra_charges_base
 
     @property
     def extra_charges_fiscal_total(self):
         """17% fiscal charges from extra charge rows with fiscal=True."""
-        total = Decimal('0')
-        charges = self.extra_charges or {}
-        for rows in charges.values():
-            if isinstance(rows, list):
-                for row in rows:
-                    if row.get('fiscal'):
-                        try:
-                            total += Decimal(str(row.get('value') or 0)) * Decimal('0.17')
-                        except Exception:
-                            pass
-        return total
+        return self.extra_charges_fiscal_base * FISCAL_RATE
 
     @property
     def approved_value(self):
         """Calculate total value from approved items only (+ per-item fiscal + encargos + freight)."""
-        approved_qs = self.items.filter(is_approved=True)
-        total = approved_qs.aggregate(total=Sum('total_price'))['total'] or Decimal('0')
-        # Per-item fiscal for approved items
-        fiscal_base = approved_qs.filter(include_fiscal=True).aggregate(total=Sum('total_price'))['total'] or Decimal('0')
-        total += fiscal_base * Decimal('0.17') + self.extra_charges_fiscal_total
-        if self.freight_included and self.freight_cost:
-            total += self.freight_cost
-        total += self.extra_charges_total
-        return total - self.calculate_discount(total)
+        if 'annotated_approved_value' in self.__dict__:
+            return self.annotated_approved_value
+        return self.priced().approved_value
+
+    @property
+    def current_version_number(self):
+        """
+        Number of the live version shown to clients.
+
+        Version rows are snapshots of the state *before* each edit, so the
+        live state is always one ahead of the latest snapshot (0 snapshots
+        -> v1, 1 snapshot -> v2, ...).
+        """
+        if 'latest_version_number' in self.__dict__:
+            latest = self.__dict__['latest_version_number']
+        else:
+            latest = self.versions.order_by('-version_number').values_list('version_number', flat=True).first()
+        return (latest or 0) + 1
+
+    def public_related(self):
+        """
+        The project, event and client whose details the public page and the
+        PDF show (None where the link is missing).  Load budgets with
+        ``select_related('proposal__event__client')`` to avoid the queries.
+        """
+        project = self.proposal if self.proposal_id else None
+        event = project.event if project is not None and project.event_id else None
+        client = event.client if event is not None and event.client_id else None
+        return project, event, client
+
+    def public_updated_at(self):
+        """Latest updated_at of the budget and of the related rows clients see."""
+        stamps = [obj.updated_at for obj in (self, *self.public_related()) if obj is not None and obj.updated_at]
+        return max(stamps) if stamps else None
+
+    def public_cache_key(self):
+        """
+        Key identifying what clients see of this budget: id, live version
+        number, approval state and a digest of the updated_at of the budget
+        (bumped by every budget or item write) and of its project, event and
+        client, whose details are shown too.  Keys the cached public page
+        and PDF.
+        """
+        stamp = '|'.join(
+            f'{obj.pk}:{obj.updated_at.isoformat() if obj.updated_at else ""}' if obj is not None else '-'
+            for obj in (self, *self.public_related())
+        )
+        digest = hashlib.sha1(stamp.encode()).hexdigest()[:12]
+        return f'{self.pk}-v{self.current_version_number}-{self.approval_status}-{digest}'
 
     @property
     def is_editable(self):
@@ -231,73 +650,57 @@ class Budget(BaseModel):
     @property
     def has_item_fiscal(self):
         """True if at least one item or extra charge row has fiscal charges."""
-        if self.items.filter(include_fiscal=True).exists():
-            return True
-        charges = self.extra_charges or {}
-        for rows in charges.values():
-            if isinstance(rows, list):
-                for row in rows:
-                    if row.get('fiscal'):
-                        return True
-        return False
+        return bool(self.fiscal_items_count or self.extra_charges_fiscal_base)
 
     @property
     def fiscal_charges_value(self):
         """17% fiscal charges — summed per-item and per-extra-row."""
-        item_base = self.items.filter(include_fiscal=True).aggregate(total=Sum('total_price'))['total'] or Decimal('0')
-        return item_base * Decimal('0.17') + self.extra_charges_fiscal_total
+        if 'annotated_fiscal_charges' in self.__dict__:
+            return self.annotated_fiscal_charges
+        return self.priced().fiscal_charges
 
     def calculate_discount(self, base_total):
         """Calculate discount amount over a given base total."""
-        base = Decimal(str(base_total or 0))
-        if base <= 0:
-            return Decimal('0')
-
-        raw = Decimal(str(self.discount_value or 0))
-        if raw <= 0 or self.discount_type == 'none':
-            return Decimal('0')
-
-        if self.discount_type == 'percent':
-            discount = (base * raw) / Decimal('100')
-        else:  # 'value'
-            discount = raw
-
-        if discount < 0:
-            return Decimal('0')
-        return min(discount, base)
+        return pricing.calculate_discount(base_total, self.discount_type, self.discount_value)
 
     @property
     def discount_amount(self):
         """Discount amount over the full budget total (before discount)."""
-        base_total = self.total_value + self.fiscal_charges_value + (self.freight_cost or 0) + self.extra_charges_total
-        return self.calculate_discount(base_total)
+        if 'annotated_discount' in self.__dict__:
+            return self.annotated_discount
+        return self.priced().discount
 
     @property
     def total_with_freight(self):
         """Budget total value plus per-item/per-row fiscal charges, freight and extra charges."""
-        freight = self.freight_cost or 0
-        base_total = self.total_value + self.fiscal_charges_value + freight + self.extra_charges_total
-        return base_total - self.calculate_discount(base_total)
+        if 'annotated_total_with_freight' in self.__dict__:
+            return self.annotated_total_with_freight
+        return self.priced().total_with_freight
 
     @property
     def total_weight(self):
         """Sum of (weight × quantity) across all items that have weight."""
-        from decimal import Decimal
-        total = Decimal('0')
-        for item in self.items.all():
-            if item.weight:
-                total += item.weight * item.quantity
-        return total
+        return self.items_weight
 
     @property
     def total_volume(self):
         """Sum of (measurement × quantity) for items with measurement_unit == 'm3'."""
-        from decimal import Decimal
-        total = Decimal('0')
-        for item in self.items.all():
-            if item.measurement and item.measurement_unit == 'm3':
-                total += item.measurement * item.quantity
-        return total
+        return self.items_volume
+
+
+class BudgetSectionQuerySet(models.QuerySet):
+    """Refreshes Budget's stored totals after deleting sections (items cascade)."""
+
+    def delete(self, refresh_totals=True):
+        if not refresh_totals:
+            return super().delete()
+        budget_ids = set(self.values_list('budget_id', flat=True).distinct().order_by())
+        result = super().delete()
+        Budget.refresh_item_totals_for(budget_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class BudgetSection(models.Model):
@@ -327,6 +730,8 @@ class BudgetSection(models.Model):
         help_text='Posição da seção dentro do orçamento'
     )
 
+    objects = models.Manager.from_queryset(BudgetSectionQuerySet)()
+
     class Meta:
         verbose_name = 'Seção do Orçamento'
         verbose_name_plural = 'Seções do Orçamento'
@@ -335,13 +740,89 @@ class BudgetSection(models.Model):
     def __str__(self):
         return f"{self.title} ({self.budget.name})"
 
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Budget.refresh_item_totals_for([self.budget_id])
+        return result
+
     @property
     def subtotal(self):
         """Sum of total_price for all items in this section."""
+        # Reuse prefetched items (detail / public pages) instead of a query per section
+        if 'section_items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum((item.total_price for item in self.section_items.all()), Decimal('0'))
         total = self.section_items.aggregate(total=Sum('total_price'))['total']
         return total or 0
 
 
+class BudgetItemQuerySet(models.QuerySet):
+    """
+    QuerySet for BudgetItem that keeps Budget's stored totals in sync
+    after set-based writes (bulk_create, bulk_update, update, delete).
+
+    Single-row saves and deletes are handled incrementally by
+    BudgetItem.save() / BudgetItem.delete(). Callers batching several
+    writes can pass ``refresh_totals=False`` and call
+    Budget.refresh_item_totals() once at the end.
+    """
+
+    def totals_by(self, *fields):
+        """
+        One row per distinct *fields* value with the item aggregates, keyed
+        like Budget.ITEM_TOTAL_FIELDS (computed in SQL).
+        """
+        zero = Value(Decimal('0'))
+        fiscal = Q(include_fiscal=True)
+        approved = Q(is_approved=True)
+        return self.values(*fields).annotate(
+            items_total=Coalesce(Sum('total_price'), zero),
+            items_fiscal_base=Coalesce(Sum('total_price', filter=fiscal), zero),
+            approved_items_total=Coalesce(Sum('total_price', filter=approved), zero),
+            approved_fiscal_base=Coalesce(Sum('total_price', filter=approved & fiscal), zero),
+            items_weight=Coalesce(Sum(F('weight') * F('quantity'), filter=Q(weight__isnull=False)), zero),
+            items_volume=Coalesce(
+                Sum(F('measurement') * F('quantity'),
+                    filter=Q(measurement__isnull=False, measurement_unit='m3')),
+                zero,
+            ),
+            items_count=Count('id'),
+            fiscal_items_count=Count('id', filter=fiscal),
+        ).order_by()
+
+    def bulk_create(self, objs, *args, refresh_totals=True, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if refresh_totals:
+            Budget.refresh_item_totals_for({obj.budget_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, refresh_totals=True, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if refresh_totals:
+            Budget.refresh_item_totals_for({obj.budget_id for obj in objs})
+        return rows
+
+    def update(self, refresh_totals=True, **kwargs):
+        if not refresh_totals:
+            return super().update(**kwargs)
+        budget_ids = set(self.values_list('budget_id', flat=True).distinct().order_by())
+        rows = super().update(**kwargs)
+        if 'budget' in kwargs or 'budget_id' in kwargs:
+            budget_ids.add(getattr(kwargs.get('budget'), 'pk', kwargs.get('budget_id')))
+        Budget.refresh_item_totals_for(budget_ids)
+        return rows
+
+    def delete(self, refresh_totals=True):
+        if not refresh_totals:
+            return super().delete()
+        budget_ids = set(self.values_list('budget_id', flat=True).distinct().order_by())
+        result = super().delete()
+        Budget.refresh_item_totals_for(budget_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class BudgetItem(models.Model):
     """
     Individual line item in a budget.
@@ -501,6 +982,8 @@ class BudgetItem(models.Model):
         help_text='Referência à descrição padrão usada (se aplicável)'
     )
 
+    objects = BudgetItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Item do Orçamento'
         verbose_name_plural = 'Itens do Orçamento'
@@ -508,37 +991,288 @@ class BudgetItem(models.Model):
     
     def __str__(self):
         return f"{self.name} - {self.budget.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row currently contributes to Budget's stored totals
+        # so save() can apply just the difference.
+        if all(f.attname in instance.__dict__ for f in cls._meta.concrete_fields):
+            instance._stored_contribution = (instance.budget_id, instance.totals_contribution())
+        return instance
+
+    def pricing_line(self):
+        """This item as a budgets.pricing.ItemLine."""
+        return pricing.ItemLine(
+            self.total_price,
+            self.quantity,
+            self.weight,
+            self.measurement,
+            self.measurement_unit,
+            self.include_fiscal,
+            self.is_approved,
+        )
+
+    def totals_contribution(self):
+        """
+        This item's share of the Budget aggregates, ordered like
+        Budget.ITEM_TOTAL_FIELDS.
+        """
+        return tuple(pricing.item_contribution(self.pricing_line()))
+
+    def _budget_for_totals(self, budget_id):
+        """Return the cached parent budget when possible, so its totals stay current in memory."""
+        if BudgetItem.budget.is_cached(self) and self.budget_id == budget_id:
+            return self.budget
+        return Budget(pk=budget_id)
+
+    def _load_stored_contribution(self):
+        """
+        Read the contribution of this item's database row when from_db could
+        not remember it: the instance was loaded with .only()/.defer(), or
+        built by hand with the pk of an existing row.  One query, once.
+        """
+        if self.pk is None or getattr(self, '_stored_contribution', None) is not None:
+            return
+        row = BudgetItem.objects.filter(pk=self.pk).values_list('budget_id', *pricing.ItemLine._fields).first()
+        if row is not None:
+            self._stored_contribution = (row[0], tuple(pricing.item_contribution(pricing.ItemLine(*row[1:]))))
+
+    def _sync_budget_totals(self):
+        """Push the difference between the stored and current contribution to Budget."""
+        new = (self.budget_id, self.totals_contribution())
+        old = getattr(self, '_stored_contribution', None)
+        if old is not None and old[0] != new[0]:
+            self.remove_from_budget_totals()
+            old = None
+        old_values = old[1] if old else (0,) * len(new[1])
+        delta = tuple(n - o for n, o in zip(new[1], old_values))
+        self._budget_for_totals(self.budget_id).apply_item_totals_delta(delta)
+        self._stored_contribution = new
+
+    def remove_from_budget_totals(self):
+        """Subtract this item's stored contribution from its budget (used on delete)."""
+        budget_id, values = getattr(self, '_stored_contribution', None) or (
+            self.budget_id, self.totals_contribution()
+        )
+        self._budget_for_totals(budget_id).apply_item_totals_delta(tuple(-v for v in values))
+        self._stored_contribution = None
     
+    def calculate_totals(self, keep_total=False):
+        """
+        Apply the pricing rules for this item in memory (no database access).
+
+        - measurement (m³) comes from the three dimensions when all are given;
+        - total_price is recalculated from billing_type unless *keep_total*
+          is set, or the item already exists with a non-zero total;
+        - both are rounded to their column precision.
+        """
+        # If all three dimensions are provided, compute volume (m³) automatically
+        self.measurement, self.measurement_unit = pricing.item_measurement(
+            self.dim_length, self.dim_width, self.dim_height,
+            self.measurement, self.measurement_unit,
+        )
+
+        # Only recalculate if:
+        # 1. The caller did not ask to keep an explicit total, AND
+        # 2. Total is zero or item is new
+        if not keep_total and (self.total_price == 0 or self.pk is None):
+            self.total_price = pricing.item_total(
+                self.quantity, self.unit_price, self.billing_type, self.measurement,
+            )
+
+        # Round to the column precision now, so the in-memory values (and the
+        # delta applied to Budget's stored totals) match what the database keeps.
+        if self.total_price is not None:
+            self.total_price = Decimal(str(self.total_price)).quantize(Decimal('0.01'))
+        if self.measurement is not None:
+            self.measurement = Decimal(str(self.measurement)).quantize(Decimal('0.001'))
+
     def save(self, *args, **kwargs):
         """Auto-calculate total_price and volume before saving.
         
         However, if total_price was explicitly provided (from form edit),
         respect it and don't recalculate to avoid rounding errors.
         """
-        # If all three dimensions are provided, compute volume (m³) automatically
-        if self.dim_length and self.dim_width and self.dim_height:
-            self.measurement = self.dim_length * self.dim_width * self.dim_height
-            self.measurement_unit = 'm3'
-        
         # Check if this is an explicit total from form submission (not auto-calculated)
         # If _skip_total_recalc flag is set, respect the provided total
-        should_recalc = not getattr(self, '_skip_total_recalc', False)
-        
-        # Only recalculate if:
-        # 1. Should recalc flag is not set, AND
-        # 2. Total is zero or item is new
-        if should_recalc and (self.total_price == 0 or self.pk is None):
-            # Total based on billing type
-            if self.billing_type == 'meter':
-                self.total_price = (self.measurement or 0) * self.quantity * self.unit_price
-            else:
-                self.total_price = self.quantity * self.unit_price
+        self.calculate_totals(keep_total=getattr(self, '_skip_total_recalc', False))
         
         # Clean up the flag
         if hasattr(self, '_skip_total_recalc'):
             delattr(self, '_skip_total_recalc')
         
+        self._load_stored_contribution()
+        super().save(*args, **kwargs)
+        self._sync_budget_totals()
+
+    def delete(self, *args, **kwargs):
+        self._load_stored_contribution()
+        result = super().delete(*args, **kwargs)
+        self.remove_from_budget_totals()
+        return result
+
+
+class BudgetExtraChargeQuerySet(models.QuerySet):
+    """
+    QuerySet for BudgetExtraCharge that keeps Budget's stored extra-charge
+    sums in sync after set-based writes, like BudgetItemQuerySet.
+    """
+
+    def sums(self):
+        """``(base, fiscal_base)`` of the rows, in one aggregate."""
+        totals = self.aggregate(**self._sum_expressions())
+        return tuple(totals[name] for name in Budget.EXTRA_CHARGE_TOTAL_FIELDS)
+
+    def totals_by(self, *fields):
+        """
+        One row per distinct *fields* value with the extra-charge sums, keyed
+        like Budget.EXTRA_CHARGE_TOTAL_FIELDS (computed in SQL).  Reports use
+        it across budgets, e.g. ``totals_by('group')``.
+        """
+        return self.values(*fields).annotate(**self._sum_expressions()).order_by()
+
+    @staticmethod
+    def _sum_expressions():
+        zero = Value(Decimal('0'))
+        return {
+            'extra_charges_base': Coalesce(Sum('value'), zero),
+            'extra_charges_fiscal_base': Coalesce(Sum('value', filter=Q(fiscal=True)), zero),
+        }
+
+    def bulk_create(self, objs, *args, refresh_totals=True, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if refresh_totals:
+            Budget.refresh_extra_charges_totals_for({obj.budget_id for obj in objs})
+        return objs
+
+    def update(self, refresh_totals=True, **kwargs):
+        if not refresh_totals:
+            return super().update(**kwargs)
+        budget_ids = set(self.values_list('budget_id', flat=True).distinct().order_by())
+        rows = super().update(**kwargs)
+        Budget.refresh_extra_charges_totals_for(budget_ids)
+        return rows
+
+    def delete(self, refresh_totals=True):
+        if not refresh_totals:
+            return super().delete()
+        budget_ids = set(self.values_list('budget_id', flat=True).distinct().order_by())
+        result = super().delete()
+        Budget.refresh_extra_charges_totals_for(budget_ids)
+        return result
+
+
+class BudgetExtraCharge(models.Model):
+    """
+    One extra charge row of a budget (apoio, mão de obra, documentação,
+    taxa da feira...).  Budget.extra_charges exposes them grouped, and the
+    budget stores their sums (extra_charges_base / extra_charges_fiscal_base).
+    """
+
+    GROUP_CHOICES = [
+        ('logistica', 'Logística'),
+        ('apoio', 'Apoio'),
+        ('mao_de_obra', 'Mão de obra'),
+        ('documentacao', 'Documentação'),
+        ('taxa_feira', 'Taxa da feira'),
+        ('outros', 'Outros'),
+    ]
+
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name='extra_charge_rows',
+        verbose_name='Orçamento',
+    )
+    group = models.CharField('Grupo', max_length=30, choices=GROUP_CHOICES)
+    label = models.CharField('Descrição', max_length=255, blank=True)
+    value = models.DecimalField('Valor', max_digits=15, decimal_places=2, default=Decimal('0'))
+    fiscal = models.BooleanField('Encargos Fiscais (17%)', default=False)
+    order = models.PositiveIntegerField('Ordem', default=0)
+
+    objects = BudgetExtraChargeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Encargo Adicional'
+        verbose_name_plural = 'Encargos Adicionais'
+        ordering = ['budget', 'order', 'id']
+        indexes = [
+            # Covers the per-budget sums: answered from the index alone
+            models.Index(fields=['budget', 'fiscal', 'value'], name='budgets_extra_charge_sum_idx'),
+            models.Index(fields=['group'], name='budgets_extra_charge_group_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_group_display()}: {self.label}'
+
+    def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        Budget.refresh_extra_charges_totals_for([self.budget_id])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Budget.refresh_extra_charges_totals_for([self.budget_id])
+        return result
+
+    def as_dict(self):
+        """The row as stored in the old JSON field (and in version snapshots)."""
+        return {'label': self.label, 'value': str(self.value), 'fiscal': self.fiscal}
+
+    @classmethod
+    def rows_from_dict(cls, charges):
+        """
+        Unsaved rows for a ``{group: [{'label', 'value', 'fiscal'}, ...]}``
+        dict (the form payload / snapshot format).  Values that are not
+        numbers count as zero, as they always did.
+        """
+        rows = []
+        for group, entries in (charges or {}).items():
+            if not isinstance(entries, list):
+                continue
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                value = pricing.to_decimal(entry.get('value'))
+                rows.append(cls(
+                    group=str(group)[:30],
+                    label=str(entry.get('label') or '')[:255],
+                    value=value.quantize(pricing.CENT) if value.is_finite() else pricing.ZERO,
+                    fiscal=bool(entry.get('fiscal')),
+                    order=len(rows),
+                ))
+        return rows
+
+
+class LibraryQuerySet(models.QuerySet):
+    """Shared queries of the ItemDescription / PaymentInfoTemplate libraries."""
+
+    def search(self, query=''):
+        """
+        Typeahead search over title and body, ranked: titles starting with
+        *query* first, then other title matches, then body-only matches.
+
+        On PostgreSQL the ``icontains`` lookups are served by the trigram
+        indexes created in migration 0030.
+        """
+        query = (query or '').strip()
+        if not query:
+            return self.order_by('title', 'pk')
+        return self.filter(
+            Q(title__icontains=query) | Q(body__icontains=query)
+        ).annotate(
+            search_rank=Case(
+                When(title__istartswith=query, then=Value(0)),
+                When(title__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=models.IntegerField(),
+            ),
+        ).order_by('search_rank', 'title', 'pk')
+
+    def version(self):
+        """``(count, last update)`` of the library, used to build ETags."""
+        state = self.order_by().aggregate(count=Count('pk'), updated=models.Max('updated_at'))
+        return state['count'], state['updated']
 
 
 class ItemDescription(models.Model):
@@ -562,6 +1296,9 @@ class ItemDescription(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    objects = LibraryQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Descrição de Item'
@@ -593,6 +1330,9 @@ class PaymentInfoTemplate(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    objects = LibraryQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Informação de Pagamento'
@@ -627,8 +1367,6 @@ class BudgetNotification(models.Model):
         choices=ACTION_CHOICES,
     )
 
-    is_read = models.BooleanField('Lida', default=False)
-
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
 
     class Meta:
@@ -640,15 +1378,50 @@ class BudgetNotification(models.Model):
         return f"{self.budget.name} – {self.get_action_display()}"
 
 
+class NotificationReadState(models.Model):
+    """
+    Per-user read watermark for BudgetNotification.
+
+    Notifications with an id above ``last_read_id`` are unread for that user;
+    "mark all as read" just moves the watermark (see budgets.notifications).
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_read_state',
+        verbose_name='Usuário',
+    )
+
+    last_read_id = models.PositiveBigIntegerField('Última notificação lida', default=0)
+
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Leitura de Notificações'
+        verbose_name_plural = 'Leituras de Notificações'
+
+    def __str__(self):
+        return f"{self.user} – {self.last_read_id}"
+
+
 class BudgetVersion(models.Model):
     """
     Snapshot of a budget at a specific point in time.
 
     Created automatically every time a budget is saved via the edit form.
-    Stores a full JSON snapshot of the budget data (fields + sections + items)
-    so editors can browse the history and restore a previous version.
+    Holds the budget data (fields + sections + items) so editors can browse
+    the history and restore a previous version.  New rows store it
+    compressed, as a keyframe or as a delta against the previous version
+    (see budgets.versioning); use get_snapshot() to read it.
     """
 
+    ENCODING_CHOICES = [
+        ('full', 'JSON completo'),
+        ('keyframe', 'Quadro-chave comprimido'),
+        ('delta', 'Delta comprimido'),
+    ]
+
     budget = models.ForeignKey(
         'Budget',
         on_delete=models.CASCADE,
@@ -667,9 +1440,41 @@ class BudgetVersion(models.Model):
 
     snapshot = models.JSONField(
         'Snapshot',
-        help_text='Cópia completa dos dados da proposta neste momento',
+        null=True,
+        blank=True,
+        help_text='Cópia completa dos dados da proposta (versões antigas, não comprimidas)',
+    )
+
+    encoding = models.CharField(
+        'Codificação',
+        max_length=10,
+        choices=ENCODING_CHOICES,
+        default='full',
+    )
+
+    payload = models.BinaryField(
+        'Dados comprimidos',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    # Summary of the snapshot, written with it so the history list never
+    # has to decode snapshots.
+    total_with_freight = models.DecimalField(
+        'Total com Frete',
+        max_digits=15,
+        decimal_places=2,
+        null=True,
+        blank=True,
     )
 
+    status = models.CharField('Status', max_length=10, blank=True)
+
+    items_count = models.PositiveIntegerField('Itens', default=0)
+
+    sections_count = models.PositiveIntegerField('Seções', default=0)
+
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
 
     created_by = models.ForeignKey(
@@ -690,3 +1495,57 @@ class BudgetVersion(models.Model):
     def __str__(self):
         label = f' — {self.label}' if self.label else ''
         return f"{self.budget.name} v{self.version_number}{label}"
+
+    def get_snapshot(self):
+        """Full snapshot dict of this version, decoded from its storage format."""
+        from .versioning import load_snapshot
+        return load_snapshot(self)
+
+
+class BudgetTemplate(models.Model):
+    """
+    Reusable proposal skeleton: the commercial settings, sections and items
+    of a budget, kept as plain rows so new proposals can be started from it
+    (see budgets.duplication).
+    """
+
+    name = models.CharField('Nome', max_length=255)
+
+    description = models.TextField('Descrição', blank=True, default='')
+
+    data = models.JSONField(
+        'Conteúdo',
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        help_text='Campos da proposta, seções e itens copiados do orçamento de origem',
+    )
+
+    items_count = models.PositiveIntegerField('Itens', default=0)
+
+    source_budget = models.ForeignKey(
+        'Budget',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='templates',
+        verbose_name='Proposta de origem',
+    )
+
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='budget_templates_created',
+        verbose_name='Criado por',
+    )
+
+    class Meta:
+        verbose_name = 'Modelo de Proposta'
+        verbose_name_plural = 'Modelos de Proposta'
+        ordering = ['name', 'id']
+
+    def __str__(self):
+        return self.name
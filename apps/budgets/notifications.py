@@ -0,0 +1,141 @@
+"""
+Budget notification feed: per-user read state and cheap polling.
+
+Each user has a read watermark (NotificationReadState.last_read_id); the
+notifications above it are unread for that user only.  New users start at
+the latest notification, not at 0, so the history before them isn't
+unread.  The header bell polls with a cursor
+``"<latest id>.<last read id>"``: while neither number moved the answer
+comes from the cache alone, so idle tabs cost no queries.
+
+Cache keys (short TTLs, so per-process caches converge quickly):
+    budgets:notifications:latest          highest notification id
+    budgets:notifications:read:<user>     the user's watermark
+    budgets:notifications:unread:<user>:<read>:<latest>   unread count
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import BudgetNotification, NotificationReadState
+
+STATE_TTL = 15
+COUNT_TTL = 300
+FEED_SIZE = 20
+
+LATEST_KEY = 'budgets:notifications:latest'
+
+
+def _read_key(user_id):
+    return f'budgets:notifications:read:{user_id}'
+
+
+def _count_key(user_id, last_read_id, latest_id):
+    return f'budgets:notifications:unread:{user_id}:{last_read_id}:{latest_id}'
+
+
+def latest_id():
+    """Highest BudgetNotification id (0 when there are none)."""
+    value = cache.get(LATEST_KEY)
+    if value is None:
+        value = BudgetNotification.objects.aggregate(latest=Max('id'))['latest'] or 0
+        cache.set(LATEST_KEY, value, STATE_TTL)
+    return value
+
+
+def seed_read_state(user):
+    """
+    Give *user* a watermark at the latest notification, so an account that
+    never read the feed doesn't start with the whole history unread.  Called
+    when a user is created; last_read_id() does it lazily for accounts made
+    without the signal (raw loads, bulk inserts).  Returns the watermark.
+    """
+    latest = BudgetNotification.objects.aggregate(latest=Max('id'))['latest'] or 0
+    state, _ = NotificationReadState.objects.get_or_create(user=user, defaults={'last_read_id': latest})
+    cache.set(_read_key(user.pk), state.last_read_id, STATE_TTL)
+    return state.last_read_id
+
+
+def last_read_id(user):
+    """The read watermark of *user* (seeded on first access, see seed_read_state())."""
+    value = cache.get(_read_key(user.pk))
+    if value is None:
+        value = (
+            NotificationReadState.objects.filter(user=user)
+            .values_list('last_read_id', flat=True).first()
+        )
+        if value is None:
+            return seed_read_state(user)
+        cache.set(_read_key(user.pk), value, STATE_TTL)
+    return value
+
+
+def cursor(user):
+    """Opaque cursor of the feed state seen by *user*."""
+    return f'{latest_id()}.{last_read_id(user)}'
+
+
+def unread_count(user):
+    read, latest = last_read_id(user), latest_id()
+    if latest <= read:
+        return 0
+    key = _count_key(user.pk, read, latest)
+    value = cache.get(key)
+    if value is None:
+        value = BudgetNotification.objects.filter(id__gt=read, id__lte=latest).count()
+        cache.set(key, value, COUNT_TTL)
+    return value
+
+
+def unread(user, limit=FEED_SIZE):
+    """Newest unread notifications of *user*."""
+    return (
+        BudgetNotification.objects.select_related('budget')
+        .filter(id__gt=last_read_id(user))
+        .order_by('-id')[:limit]
+    )
+
+
+def notify(budget, action):
+    """Create a notification; pollers see it once the transaction commits."""
+    notification = BudgetNotification.objects.create(budget=budget, action=action)
+    transaction.on_commit(lambda: cache.set(LATEST_KEY, notification.id, STATE_TTL))
+    return notification
+
+
+def mark_read(user, up_to=None):
+    """Move *user*'s watermark to *up_to* (default: the latest notification)."""
+    if up_to is None:
+        up_to = BudgetNotification.objects.aggregate(latest=Max('id'))['latest'] or 0
+    state, created = NotificationReadState.objects.get_or_create(
+        user=user, defaults={'last_read_id': up_to},
+    )
+    if not created and state.last_read_id < up_to:
+        state.last_read_id = up_to
+        state.save(update_fields=['last_read_id', 'updated_at'])
+    cache.set(_read_key(user.pk), state.last_read_id, STATE_TTL)
+    cache.set(_count_key(user.pk, state.last_read_id, up_to), 0, COUNT_TTL)
+    return state.last_read_id
+
+
+def wait_for_change(user, since, timeout):
+    """
+    Block up to *timeout* seconds until the feed cursor of *user* differs
+    from *since*; returns the current cursor.  Only the cache is read while
+    waiting.  Long waits hold a worker, so the view clamps *timeout* to
+    BUDGET_NOTIFICATIONS_LONG_POLL (0 = answer immediately).
+    """
+    deadline = time.monotonic() + timeout
+    current = cursor(user)
+    while current == since and time.monotonic() < deadline:
+        time.sleep(min(1.0, max(deadline - time.monotonic(), 0)))
+        current = cursor(user)
+    return current
+
+
+def long_poll_limit():
+    return max(int(getattr(settings, 'BUDGET_NOTIFICATIONS_LONG_POLL', 0) or 0), 0)
@@ -0,0 +1,178 @@
+"""
+PDF rendering for public budget proposals.
+
+Rendered documents are kept in ``default_storage`` under a content-addressed
+name built from the budget id, its live version number, its approval state
+and a digest of the ``updated_at`` of the budget (bumped by every budget or
+item write) and of the project, event and client in its header, so a
+proposal is only rendered again after it actually changes.
+
+With ``BUDGET_PDF_ASYNC`` enabled and Celery available, missing documents
+are rendered by a worker (tasks.render_budget_pdf_task); otherwise they are
+rendered inline, which is also what the tests exercise.
+"""
+
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+PDF_STORAGE_DIR = 'budgets/pdf'
+
+# How long a queued render blocks further enqueues for the same document.
+RENDER_LOCK_TIMEOUT = 120
+
+
+def pdf_cache_key(budget):
+    """Content-addressed name of the current PDF of *budget*."""
+    return budget.public_cache_key()
+
+
+def pdf_storage_path(budget, key=None):
+    return f'{PDF_STORAGE_DIR}/{budget.pk}/{key or pdf_cache_key(budget)}.pdf'
+
+
+def _brl(value):
+    return f'R$ {value:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def render_budget_pdf(budget):
+    """Build the proposal PDF for *budget* and return its bytes."""
+    # Imported here so the app still loads where reportlab is missing
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#000000'),
+        spaceAfter=30,
+    )
+    elements.append(Paragraph(f'Proposta: {budget.name}', title_style))
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Budget info
+    info_style = styles['Normal']
+    if budget.proposal_id:
+        elements.append(Paragraph(f'<b>Projeto:</b> {budget.proposal.title}', info_style))
+    elements.append(Paragraph(f'<b>Status:</b> {budget.get_approval_status_display()}', info_style))
+    if budget.approved_at:
+        elements.append(Paragraph(f'<b>Data de Aprovação:</b> {budget.approved_at.strftime("%d/%m/%Y %H:%M")}', info_style))
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Items table
+    table_data = [['Item', 'Qtd', 'Valor Unit.', 'Total', 'Status']]
+
+    items = budget.items.only('name', 'quantity', 'unit_price', 'total_price', 'is_approved')
+    for item in items:
+        status = 'Aprovado' if item.is_approved else 'Não Aprovado'
+        if budget.is_editable:
+            status = 'Pendente'
+
+        table_data.append([
+            item.name,
+            str(item.quantity),
+            _brl(item.unit_price),
+            _brl(item.total_price),
+            status
+        ])
+
+    # Total row (stored aggregates, no extra query)
+    total = budget.approved_value if not budget.is_editable else budget.total_value
+    table_data.append(['', '', '', _brl(total), ''])
+
+    table = Table(table_data, colWidths=[8*cm, 2*cm, 3*cm, 3*cm, 3*cm])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.black),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    elements.append(table)
+
+    # Client notes
+    if budget.client_notes:
+        elements.append(Spacer(1, 0.5*cm))
+        elements.append(Paragraph('<b>Observações do Cliente:</b>', styles['Heading2']))
+        elements.append(Paragraph(budget.client_notes, info_style))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def store_budget_pdf(budget, key=None):
+    """
+    Render *budget* into storage unless its current document already exists.
+
+    Older renderings of the same budget are removed.  Returns the storage path.
+    """
+    key = key or pdf_cache_key(budget)
+    path = pdf_storage_path(budget, key)
+    if not default_storage.exists(path):
+        saved = default_storage.save(path, ContentFile(render_budget_pdf(budget)))
+        if saved != path:
+            # A concurrent render won the race; keep a single copy.
+            default_storage.delete(saved)
+        _prune_stale_pdfs(budget, keep=path)
+    return path
+
+
+def _prune_stale_pdfs(budget, keep):
+    directory = f'{PDF_STORAGE_DIR}/{budget.pk}'
+    try:
+        _dirs, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for name in files:
+        path = f'{directory}/{name}'
+        if path != keep:
+            default_storage.delete(path)
+
+
+def get_budget_pdf(budget):
+    """
+    Return the storage path of the current PDF of *budget*.
+
+    When the document is missing and background rendering is enabled, a
+    worker job is queued and ``None`` is returned; callers should ask the
+    client to retry.  Without a worker the PDF is rendered inline.
+    """
+    key = pdf_cache_key(budget)
+    path = pdf_storage_path(budget, key)
+    if default_storage.exists(path):
+        return path
+
+    from .tasks import render_budget_pdf_task
+
+    if getattr(settings, 'BUDGET_PDF_ASYNC', False) and hasattr(render_budget_pdf_task, 'delay'):
+        if cache.add(f'budget-pdf-render:{key}', True, RENDER_LOCK_TIMEOUT):
+            try:
+                render_budget_pdf_task.delay(budget.pk)
+            except Exception:
+                # Broker unreachable: don't leave the client waiting forever.
+                cache.delete(f'budget-pdf-render:{key}')
+                logger.exception('Could not queue PDF rendering for budget %s', budget.pk)
+                return store_budget_pdf(budget, key)
+        return None
+
+    return store_budget_pdf(budget, key)
@@ -0,0 +1,262 @@
+"""
+Bulk persistence of budget sections and items submitted by the budget form.
+
+save_budget_sections(budget, sections_data_json)
+    Loads the budget's current sections and items once, diffs them against
+    the submitted JSON and applies the result with bulk_create / bulk_update
+    and a single delete per table, inside one transaction.  The number of
+    queries does not depend on how many items the proposal has.
+
+    Sections sent as ``{"id": …, "title": …, "unchanged": true}`` keep their
+    items as stored: only the sections the user actually edited are loaded
+    and diffed, so saving a large proposal costs what was edited.
+"""
+
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BudgetItem, BudgetSection
+
+
+# Item columns written by the form; other columns are left untouched on
+# existing rows.
+ITEM_FIELDS = [
+    'section',
+    'name',
+    'description',
+    'description_ref',
+    'quantity',
+    'dim_length',
+    'dim_width',
+    'dim_height',
+    'measurement',
+    'measurement_unit',
+    'weight',
+    'unit_price',
+    'total_price',
+    'billing_type',
+    'subitems_data',
+    'is_approved',
+    'include_fiscal',
+    'observations',
+]
+
+
+def to_decimal(val, default=None):
+    """Parse a form value into Decimal, returning *default* for blanks or garbage."""
+    if val is None or str(val).strip() == '':
+        return default
+    try:
+        return Decimal(str(val))
+    except (InvalidOperation, ValueError):
+        return default
+
+
+def parse_sections_json(sections_data_json):
+    """Decode the sections_data payload, tolerating empty or malformed input."""
+    try:
+        sections_data = json.loads(sections_data_json or '[]')
+    except (json.JSONDecodeError, ValueError):
+        return []
+    return sections_data if isinstance(sections_data, list) else []
+
+
+def item_fields_from_payload(item_data):
+    """
+    Map one submitted item dict to BudgetItem field values.
+
+    Returns ``(fields, keep_total)`` where *keep_total* tells whether the
+    explicit total sent by the form must be kept instead of recalculated.
+    """
+    # Prefer an explicit total from the form over recalculation, to avoid
+    # rounding errors when editing items with specific totals.
+    total_price = to_decimal(item_data.get('total'))
+    keep_total = total_price is not None and total_price > 0
+
+    billing_type = item_data.get('billing_type') or 'qty'
+    if billing_type not in ('qty', 'meter'):
+        billing_type = 'qty'
+
+    subitems = item_data.get('subitems')
+    if subitems and not isinstance(subitems, list):
+        subitems = None
+
+    fields = {
+        'name': (item_data.get('name') or '').strip(),
+        'description': item_data.get('description') or '',
+        'description_ref_id': item_data.get('description_ref_id') or None,
+        'quantity': int(item_data.get('quantity') or 1),
+        'dim_length': to_decimal(item_data.get('dim_length')),
+        'dim_width': to_decimal(item_data.get('dim_width')),
+        'dim_height': to_decimal(item_data.get('dim_height')),
+        'measurement': to_decimal(item_data.get('measurement')),
+        'measurement_unit': item_data.get('measurement_unit') or '',
+        'weight': to_decimal(item_data.get('weight')),
+        'unit_price': to_decimal(item_data.get('unit_price'), Decimal('0')),
+        'total_price': total_price if keep_total else Decimal('0'),
+        'billing_type': billing_type,
+        'subitems_data': subitems or None,
+        'is_approved': True,
+        'include_fiscal': bool(item_data.get('include_fiscal', False)),
+        'observations': item_data.get('observations') or '',
+    }
+    return fields, keep_total
+
+
+def _as_pk(value):
+    """Normalise an id coming from the JSON payload (int, numeric string or null)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _item_state(item):
+    return tuple(getattr(item, BudgetItem._meta.get_field(name).attname) for name in ITEM_FIELDS)
+
+
+@transaction.atomic
+def save_budget_sections(budget, sections_data_json):
+    """
+    Persist sections + items from the budget form's ``sections_data`` JSON.
+
+    JSON structure expected::
+
+        [
+          {
+            "id": 1,           // existing section pk, null for new
+            "title": "Estrutura",
+            "items": [
+              {
+                "id": 5,       // existing item pk, null for new
+                "delete": false,
+                "name": "Painel 3×3",
+                "description": "",
+                "quantity": 2,
+                "dim_length": "3",
+                "dim_width": "3",
+                "dim_height": "0.04",
+                "measurement": "",
+                "measurement_unit": "",
+                "weight": "12",
+                "unit_price": "500.00"
+              }
+            ]
+          }
+        ]
+
+    Sections missing from the payload are deleted together with their
+    items; items missing from a submitted section are deleted as well.
+    An existing section flagged ``"unchanged": true`` (no ``items``) only
+    gets its title and position updated.  Legacy unsectioned items are only
+    touched when they appear in the payload.
+    """
+    sections_data = parse_sections_json(sections_data_json)
+
+    existing_sections = {s.pk: s for s in BudgetSection.objects.filter(budget=budget)}
+
+    # Only the items of edited sections (and items the payload names) are read
+    edited_section_ids = set()
+    payload_item_ids = set()
+    for sec_data in sections_data:
+        section_id = _as_pk(sec_data.get('id'))
+        if sec_data.get('unchanged') and section_id in existing_sections:
+            continue
+        edited_section_ids.add(section_id)
+        payload_item_ids.update(_as_pk(item.get('id')) for item in sec_data.get('items', []))
+    payload_item_ids.discard(None)
+    edited_section_ids.discard(None)
+
+    existing_items = {
+        i.pk: i for i in BudgetItem.objects.filter(budget=budget).filter(
+            Q(section_id__in=edited_section_ids) | Q(pk__in=payload_item_ids)
+        )
+    }
+    original_state = {pk: _item_state(item) for pk, item in existing_items.items()}
+    original_section_ids = {pk: item.section_id for pk, item in existing_items.items()}
+
+    # ── Sections ────────────────────────────────────────────────────────────
+    sections_to_create = []
+    sections_to_update = []
+    section_rows = []  # (section, items payload) in submitted order
+    kept_section_ids = set()
+
+    for order_idx, sec_data in enumerate(sections_data):
+        title = (sec_data.get('title') or '').strip()
+        if not title:
+            title = f'Seção {order_idx + 1}'
+
+        section = existing_sections.get(_as_pk(sec_data.get('id')))
+        if section is not None and section.pk not in kept_section_ids:
+            kept_section_ids.add(section.pk)
+            if section.title != title or section.order != order_idx:
+                section.title = title
+                section.order = order_idx
+                sections_to_update.append(section)
+            if sec_data.get('unchanged'):
+                continue
+        else:
+            section = BudgetSection(budget=budget, title=title, order=order_idx)
+            sections_to_create.append(section)
+        section_rows.append((section, sec_data.get('items', [])))
+
+    BudgetSection.objects.bulk_create(sections_to_create)
+    if sections_to_update:
+        BudgetSection.objects.bulk_update(sections_to_update, ['title', 'order'])
+
+    # ── Items ───────────────────────────────────────────────────────────────
+    items_to_create = []
+    items_to_update = []
+    kept_item_ids = set()
+    deleted_item_ids = set()
+
+    for section, items_data in section_rows:
+        for item_data in items_data:
+            item_id = _as_pk(item_data.get('id'))
+            if item_data.get('delete'):
+                if item_id in existing_items:
+                    deleted_item_ids.add(item_id)
+                continue
+
+            fields, keep_total = item_fields_from_payload(item_data)
+            if not fields['name']:
+                continue
+
+            item = existing_items.get(item_id)
+            if item is not None and item.pk not in kept_item_ids:
+                kept_item_ids.add(item.pk)
+                for attr, value in fields.items():
+                    setattr(item, attr, value)
+                item.section = section
+                item.calculate_totals(keep_total=keep_total)
+                if _item_state(item) != original_state[item.pk]:
+                    items_to_update.append(item)
+            else:
+                # New rows always get their total from the pricing rules
+                item = BudgetItem(budget=budget, section=section, **fields)
+                item.calculate_totals()
+                items_to_create.append(item)
+
+    BudgetItem.objects.bulk_create(items_to_create, refresh_totals=False)
+    if items_to_update:
+        BudgetItem.objects.bulk_update(items_to_update, ITEM_FIELDS, refresh_totals=False)
+
+    # Explicitly deleted items, plus items of edited sections the form no
+    # longer lists (items of unchanged sections were never loaded).
+    removed_item_ids = [
+        pk for pk in existing_items
+        if pk not in kept_item_ids
+        and (pk in deleted_item_ids or original_section_ids[pk] in edited_section_ids)
+    ]
+    removed_section_ids = set(existing_sections) - kept_section_ids
+    if removed_item_ids or removed_section_ids:
+        BudgetItem.objects.filter(
+            Q(pk__in=removed_item_ids) | Q(section_id__in=removed_section_ids)
+        ).delete(refresh_totals=False)
+    if removed_section_ids:
+        BudgetSection.objects.filter(pk__in=removed_section_ids).delete(refresh_totals=False)
+
+    budget.refresh_item_totals()
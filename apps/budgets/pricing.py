@@ -0,0 +1,232 @@
+"""
+Budget pricing kernel.
+
+Pure functions over plain values: no models, no queries.  Every place that
+prices a budget goes through here — BudgetItem.calculate_totals() and the
+Budget money properties (from the stored aggregates), the version preview
+(from a snapshot) and the live-totals endpoint (from the unsaved form).
+
+    price_budget(items, extra_charges, discount_type, discount_value,
+                 freight_cost, freight_included) -> BudgetTotals
+
+*items* is any iterable of ItemLine tuples; it is walked once, with local
+accumulators, so large budgets price without building intermediate lists.
+"""
+
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+
+FISCAL_RATE = Decimal('0.17')
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+MILLI = Decimal('0.001')
+HUNDRED = Decimal('100')
+
+
+class ItemLine(NamedTuple):
+    """The item columns that matter for pricing."""
+
+    total_price: Decimal
+    quantity: int = 1
+    weight: Decimal = None
+    measurement: Decimal = None
+    measurement_unit: str = ''
+    include_fiscal: bool = False
+    is_approved: bool = True
+
+
+class ItemAggregates(NamedTuple):
+    """Item sums, ordered like Budget.ITEM_TOTAL_FIELDS."""
+
+    items_total: Decimal = ZERO
+    items_fiscal_base: Decimal = ZERO
+    approved_items_total: Decimal = ZERO
+    approved_fiscal_base: Decimal = ZERO
+    items_weight: Decimal = ZERO
+    items_volume: Decimal = ZERO
+    items_count: int = 0
+    fiscal_items_count: int = 0
+
+
+class BudgetTotals(NamedTuple):
+    """Every money figure of a budget."""
+
+    items: ItemAggregates
+    extra_charges_base: Decimal
+    extra_charges_fiscal_base: Decimal
+    fiscal_charges: Decimal
+    subtotal: Decimal
+    discount: Decimal
+    total_with_freight: Decimal
+    approved_value: Decimal
+
+
+def to_decimal(value, default=ZERO):
+    """Decimal for *value*, or *default* when it is blank or not a number."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return default
+
+
+# ── Items ───────────────────────────────────────────────────────────────────
+
+def item_measurement(dim_length, dim_width, dim_height, measurement, measurement_unit):
+    """
+    ``(measurement, measurement_unit)`` of an item: the m³ volume when all
+    three dimensions are given, otherwise the values as entered.
+    """
+    if dim_length and dim_width and dim_height:
+        return dim_length * dim_width * dim_height, 'm3'
+    return measurement, measurement_unit
+
+
+def item_total(quantity, unit_price, billing_type='qty', measurement=None):
+    """Line total from the billing type: per meter (measurement × qty × price) or per unit."""
+    if billing_type == 'meter':
+        total = (measurement or 0) * quantity * unit_price
+    else:
+        total = quantity * unit_price
+    return to_decimal(total).quantize(CENT)
+
+
+def item_contribution(line):
+    """One ItemLine's share of the ItemAggregates (same field order)."""
+    total = to_decimal(line.total_price)
+    fiscal = total if line.include_fiscal else ZERO
+    quantity = line.quantity or 0
+    weight = line.weight * quantity if line.weight else ZERO
+    volume = (
+        line.measurement * quantity
+        if line.measurement and line.measurement_unit == 'm3'
+        else ZERO
+    )
+    return ItemAggregates(
+        total,
+        fiscal,
+        total if line.is_approved else ZERO,
+        fiscal if line.is_approved else ZERO,
+        weight,
+        volume,
+        1,
+        1 if line.include_fiscal else 0,
+    )
+
+
+def aggregate_items(items):
+    """Sum *items* (ItemLine tuples) into ItemAggregates in a single pass."""
+    total = fiscal = approved = approved_fiscal = weight = volume = ZERO
+    count = fiscal_count = 0
+    for price, quantity, item_weight, measurement, unit, include_fiscal, is_approved in items:
+        price = to_decimal(price)
+        quantity = quantity or 0
+        count += 1
+        total += price
+        if include_fiscal:
+            fiscal_count += 1
+            fiscal += price
+        if is_approved:
+            approved += price
+            if include_fiscal:
+                approved_fiscal += price
+        if item_weight:
+            weight += item_weight * quantity
+        if measurement and unit == 'm3':
+            volume += measurement * quantity
+    return ItemAggregates(total, fiscal, approved, approved_fiscal, weight, volume, count, fiscal_count)
+
+
+def combine_aggregates(*aggregates):
+    """Field-wise sum of several ItemAggregates."""
+    return ItemAggregates(*(sum(values) for values in zip(ItemAggregates(), *aggregates)))
+
+
+# ── Budget ──────────────────────────────────────────────────────────────────
+
+def extra_charges_sums(extra_charges):
+    """``(base, fiscal_base)`` of grouped extra charge rows (the Budget.extra_charges shape)."""
+    base = fiscal_base = ZERO
+    for rows in (extra_charges or {}).values():
+        if not isinstance(rows, list):
+            continue
+        for row in rows:
+            try:
+                value = Decimal(str(row.get('value') or 0))
+            except Exception:
+                continue
+            base += value
+            if row.get('fiscal'):
+                fiscal_base += value
+    return base, fiscal_base
+
+
+def calculate_discount(base_total, discount_type, discount_value):
+    """Discount over *base_total*: a percentage or a fixed value, never above the base."""
+    base = to_decimal(base_total)
+    if base <= 0:
+        return ZERO
+
+    raw = to_decimal(discount_value)
+    if raw <= 0 or discount_type == 'none':
+        return ZERO
+
+    if discount_type == 'percent':
+        discount = (base * raw) / HUNDRED
+    else:  # 'value'
+        discount = raw
+
+    if discount < 0:
+        return ZERO
+    return min(discount, base)
+
+
+def price_totals(items, extra_charges_base=ZERO, extra_charges_fiscal_base=ZERO,
+                 discount_type='none', discount_value=ZERO,
+                 freight_cost=None, freight_included=False):
+    """BudgetTotals from already aggregated items (e.g. Budget's stored columns)."""
+    freight = to_decimal(freight_cost)
+    extra_fiscal = extra_charges_fiscal_base * FISCAL_RATE
+    fiscal_charges = items.items_fiscal_base * FISCAL_RATE + extra_fiscal
+
+    subtotal = items.items_total + fiscal_charges + freight + extra_charges_base
+    discount = calculate_discount(subtotal, discount_type, discount_value)
+
+    approved = (
+        items.approved_items_total
+        + items.approved_fiscal_base * FISCAL_RATE
+        + extra_fiscal
+        + (freight if freight_included else ZERO)
+        + extra_charges_base
+    )
+    approved -= calculate_discount(approved, discount_type, discount_value)
+
+    return BudgetTotals(
+        items=items,
+        extra_charges_base=extra_charges_base,
+        extra_charges_fiscal_base=extra_charges_fiscal_base,
+        fiscal_charges=fiscal_charges,
+        subtotal=subtotal,
+        discount=discount,
+        total_with_freight=subtotal - discount,
+        approved_value=approved,
+    )
+
+
+def price_budget(items, extra_charges=None, discount_type='none', discount_value=ZERO,
+                 freight_cost=None, freight_included=False):
+    """Price a whole budget from ItemLine tuples and the raw extra charges JSON."""
+    extra_base, extra_fiscal_base = extra_charges_sums(extra_charges)
+    return price_totals(
+        aggregate_items(items),
+        extra_base,
+        extra_fiscal_base,
+        discount_type,
+        discount_value,
+        freight_cost,
+        freight_included,
+    )
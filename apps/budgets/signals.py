@@ -1,11 +1,57 @@
 """
-Signals for automatic service order creation from budgets.
+Signals for automatic service order creation from budgets and for the
+notification read state of new users.
 """
 
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Budget
 
+logger = logging.getLogger(__name__)
+
+
+# Fields mirrored from BudgetItem onto ServiceOrderItem (no financial values)
+MIRRORED_FIELDS = (
+    'section_name',
+    'name',
+    'description',
+    'quantity',
+    'dim_length',
+    'dim_width',
+    'dim_height',
+    'measurement',
+    'measurement_unit',
+    'weight',
+)
+
+
+class SyncReport(NamedTuple):
+    """Row counts touched by sync_service_order_items()."""
+
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+# Budget item lookups producing the MIRRORED_FIELDS values, in the same order
+BUDGET_ITEM_SOURCES = (
+    'section__title',
+    'name',
+    'description',
+    'quantity',
+    'dim_length',
+    'dim_width',
+    'dim_height',
+    'measurement',
+    'measurement_unit',
+    'weight',
+)
+
 
 def sync_service_order_items(budget):
     """
@@ -14,76 +60,79 @@ def sync_service_order_items(budget):
     Called after budget items are saved so the Service Order mirrors the budget
     exactly, minus the financial values (unit_price / total_price are excluded).
 
-    Existing ServiceOrderItems are matched by ``budget_item`` FK; items that no
-    longer exist in the budget are deleted, and new items are created.
-    Also updates the OS event if the project now has an event assigned.
+    Existing ServiceOrderItems are matched by ``budget_item`` FK and compared
+    field by field; only rows whose mirrored values changed are written
+    (bulk_update), new items are bulk-created and items that no longer exist
+    in the budget are deleted with one query.  Also updates the OS event if
+    the project now has an event assigned.  Everything runs in one transaction.
+
+    Returns a SyncReport with the inserted / updated / deleted row counts.
     """
-    from apps.service_orders.models import ServiceOrderItem
+    from apps.service_orders.models import ServiceOrder, ServiceOrderItem
 
     try:
         service_order = budget.service_order
-    except Exception:
+    except ServiceOrder.DoesNotExist:
         # ServiceOrder doesn't exist yet – nothing to sync
-        return
-
-    # Atualiza event na OS se o projeto ganhou evento após a criação do orçamento
-    event = getattr(budget.proposal, 'event', None) if budget.proposal_id else None
-    if event is not None and service_order.event_id != event.pk:
-        service_order.event = event
-        service_order.save(update_fields=['event'])
-
-    # Build a map of existing SO items keyed by their origin budget_item pk
-    existing_by_budget_item = {
-        soi.budget_item_id: soi
-        for soi in service_order.items.filter(budget_item__isnull=False)
-    }
-
-    current_budget_item_ids = set()
+        return SyncReport()
 
     # When the budget has been approved by the client, only keep items that
     # the client explicitly selected (is_approved=True).  For any other state
     # (draft, sent, editing…) mirror every item so the SO stays complete.
+    items_qs = budget.items.all()
     if budget.approval_status == 'approved':
-        items_qs = budget.items.select_related('section').filter(is_approved=True)
-    else:
-        items_qs = budget.items.select_related('section').all()
-
-    for budget_item in items_qs:
-        current_budget_item_ids.add(budget_item.pk)
-
-        section_name = budget_item.section.title if budget_item.section else None
-
-        fields = dict(
-            service_order=service_order,
-            budget_item=budget_item,
-            section_name=section_name,
-            name=budget_item.name,
-            description=budget_item.description,
-            quantity=budget_item.quantity,
-            dim_length=budget_item.dim_length,
-            dim_width=budget_item.dim_width,
-            dim_height=budget_item.dim_height,
-            measurement=budget_item.measurement,
-            measurement_unit=budget_item.measurement_unit,
-            weight=budget_item.weight,
-        )
-
-        if budget_item.pk in existing_by_budget_item:
-            # Update existing SO item
-            soi = existing_by_budget_item[budget_item.pk]
-            for attr, value in fields.items():
-                setattr(soi, attr, value)
-            soi.save()
-        else:
-            # Create new SO item
-            ServiceOrderItem.objects.create(**fields)
-
-    # Remove SO items whose origin budget_item no longer exists
-    service_order.items.filter(
-        budget_item__isnull=False
-    ).exclude(
-        budget_item_id__in=current_budget_item_ids
-    ).delete()
+        items_qs = items_qs.filter(is_approved=True)
+
+    with transaction.atomic():
+        # Atualiza event na OS se o projeto ganhou evento após a criação do orçamento
+        event = getattr(budget.proposal, 'event', None) if budget.proposal_id else None
+        if event is not None and service_order.event_id != event.pk:
+            service_order.event = event
+            service_order.save(update_fields=['event'])
+
+        # Existing SO items keyed by their origin budget_item pk.  Rows are
+        # compared as plain tuples; model instances are only built for the
+        # rows that have to be written.
+        existing_by_budget_item = {
+            row[1]: (row[0], row[2:])
+            for row in service_order.items.filter(budget_item__isnull=False)
+            .values_list('pk', 'budget_item_id', *MIRRORED_FIELDS)
+        }
+
+        to_create = []
+        to_update = []
+        for budget_item_id, *values in items_qs.values_list('pk', *BUDGET_ITEM_SOURCES):
+            values = tuple(values)
+            existing = existing_by_budget_item.pop(budget_item_id, None)
+            if existing is None:
+                to_create.append(ServiceOrderItem(
+                    service_order=service_order,
+                    budget_item_id=budget_item_id,
+                    **dict(zip(MIRRORED_FIELDS, values)),
+                ))
+            elif existing[1] != values:
+                to_update.append(ServiceOrderItem(
+                    pk=existing[0],
+                    **dict(zip(MIRRORED_FIELDS, values)),
+                ))
+
+        ServiceOrderItem.objects.bulk_create(to_create)
+        if to_update:
+            ServiceOrderItem.objects.bulk_update(to_update, MIRRORED_FIELDS)
+
+        # Remove SO items whose origin budget_item no longer exists (or was not selected)
+        deleted = 0
+        if existing_by_budget_item:
+            deleted, _ = ServiceOrderItem.objects.filter(
+                pk__in=[pk for pk, _values in existing_by_budget_item.values()]
+            ).delete()
+
+    report = SyncReport(inserted=len(to_create), updated=len(to_update), deleted=deleted)
+    logger.info(
+        'Budget %s → OS %s items synced: %d inserted, %d updated, %d deleted',
+        budget.pk, service_order.pk, *report,
+    )
+    return report
 
 
 @receiver(post_save, sender=Budget)
@@ -107,3 +156,12 @@ def create_service_order_on_budget_creation(sender, instance, created, **kwargs)
                 created_by=instance.created_by,
             )
 
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def seed_notification_read_state(sender, instance, created, raw=False, **kwargs):
+    """Start new users' notification watermark at the latest notification."""
+    if not created or raw:
+        return
+    from .notifications import seed_read_state
+
+    seed_read_state(instance)
@@ -0,0 +1,39 @@
+"""
+Background jobs for the budgets app.
+
+Celery is optional: without it the functions below are plain callables and
+callers fall back to running them inline.
+"""
+
+try:
+    from celery import shared_task
+except ImportError:  # pragma: no cover - depends on the deployment
+    shared_task = None
+
+
+def render_budget_pdf_task(budget_id):
+    """Render and store the current proposal PDF of budget *budget_id*."""
+    from .models import Budget
+    from .pdf import store_budget_pdf
+
+    budget = Budget.objects.select_related('proposal__event__client').filter(pk=budget_id).first()
+    if budget is not None:
+        store_budget_pdf(budget)
+
+
+if shared_task is not None:
+    render_budget_pdf_task = shared_task(ignore_result=True)(render_budget_pdf_task)
+
+
+def sync_service_order_task(budget_id):
+    """Bring the Service Order of budget *budget_id* up to its latest autosaved revision."""
+    from .autosave import flush_service_order_sync
+    from .models import Budget
+
+    budget = Budget.objects.filter(pk=budget_id).first()
+    if budget is not None:
+        flush_service_order_sync(budget)
+
+
+if shared_task is not None:
+    sync_service_order_task = shared_task(ignore_result=True)(sync_service_order_task)
@@ -0,0 +1,1298 @@
+"""Budgets app tests."""
+
+import csv
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .approval import approve_budget
+from .duplication import duplicate_budget, instantiate_template, save_as_template
+from .models import (
+    Budget, BudgetExtraCharge, BudgetItem, BudgetNotification, BudgetSection, BudgetVersion, ItemDescription,
+    NotificationReadState,
+)
+from .notifications import notify
+from . import pricing
+from .persistence import save_budget_sections
+from .signals import sync_service_order_items
+from .versioning import KEYFRAME_INTERVAL, create_version
+from .views import PublicBudgetApprovalView, _sections_to_json, _snapshot_budget
+
+
+def _item_payload(index, **overrides):
+    data = {
+        'id': None,
+        'name': f'Item {index}',
+        'quantity': 2,
+        'unit_price': '10.00',
+        'weight': '1.5',
+        'dim_length': '1',
+        'dim_width': '2',
+        'dim_height': '0.5',
+    }
+    data.update(overrides)
+    return data
+
+
+class SaveBudgetSectionsTestCase(TestCase):
+    """Testes para a persistência em lote de seções e itens."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.budget = Budget.objects.create(name='Proposta')
+
+    def _save(self, sections):
+        save_budget_sections(self.budget, json.dumps(sections))
+        self.budget.refresh_from_db()
+
+    def _sections_payload(self):
+        """Serialise the current DB state the way the edit form would resubmit it."""
+        payload = []
+        for section in self.budget.sections.prefetch_related('section_items'):
+            payload.append({
+                'id': section.pk,
+                'title': section.title,
+                'items': [
+                    _item_payload(0, id=item.pk, name=item.name, total=str(item.total_price))
+                    for item in section.section_items.all()
+                ],
+            })
+        return payload
+
+    def test_creates_sections_and_items(self):
+        """Cria seções e itens aplicando as regras de preço do modelo."""
+        self._save([
+            {'id': None, 'title': 'Estrutura', 'items': [_item_payload(1), _item_payload(2)]},
+            {'id': None, 'title': '', 'items': [_item_payload(3, billing_type='meter')]},
+        ])
+
+        sections = list(self.budget.sections.all())
+        self.assertEqual([s.title for s in sections], ['Estrutura', 'Seção 2'])
+        item = BudgetItem.objects.get(name='Item 1')
+        self.assertEqual(item.measurement, Decimal('1.000'))
+        self.assertEqual(item.measurement_unit, 'm3')
+        self.assertEqual(item.total_price, Decimal('20.00'))
+        self.assertEqual(BudgetItem.objects.get(name='Item 3').total_price, Decimal('20.00'))
+        self.assertEqual(self.budget.items_count, 3)
+        self.assertEqual(self.budget.total_value, Decimal('60.00'))
+        self.assertEqual(self.budget.total_weight, Decimal('9.000'))
+
+    def test_updates_moves_and_deletes(self):
+        """Atualiza, move entre seções e remove itens e seções ausentes do payload."""
+        self._save([
+            {'id': None, 'title': 'A', 'items': [_item_payload(1), _item_payload(2)]},
+            {'id': None, 'title': 'B', 'items': [_item_payload(3)]},
+        ])
+        section_a, section_b = self.budget.sections.all()
+        item_1 = BudgetItem.objects.get(name='Item 1')
+        item_3 = BudgetItem.objects.get(name='Item 3')
+
+        self._save([
+            {'id': section_b.pk, 'title': 'B renomeada', 'items': [
+                _item_payload(3, id=item_3.pk, total='99.00'),
+                _item_payload(1, id=item_1.pk),
+            ]},
+        ])
+
+        self.assertFalse(BudgetSection.objects.filter(pk=section_a.pk).exists())
+        self.assertEqual(list(self.budget.sections.values_list('title', 'order')), [('B renomeada', 0)])
+        self.assertEqual(
+            sorted(self.budget.items.values_list('name', 'section_id')),
+            [('Item 1', section_b.pk), ('Item 3', section_b.pk)],
+        )
+        self.assertEqual(BudgetItem.objects.get(pk=item_3.pk).total_price, Decimal('99.00'))
+        self.assertEqual(self.budget.total_value, Decimal('119.00'))
+
+        self._save([
+            {'id': section_b.pk, 'title': 'B renomeada', 'items': [
+                _item_payload(3, id=item_3.pk, delete=True),
+                _item_payload(1, id=item_1.pk),
+            ]},
+        ])
+        self.assertEqual(list(self.budget.items.values_list('pk', flat=True)), [item_1.pk])
+        self.assertEqual(self.budget.items_count, 1)
+
+    def test_keeps_unlisted_unsectioned_items(self):
+        """Itens legados sem seção só são alterados quando aparecem no payload."""
+        legacy = BudgetItem.objects.create(budget=self.budget, name='Legado', unit_price=Decimal('5'))
+        self._save([{'id': None, 'title': 'Nova', 'items': [_item_payload(1)]}])
+        self.assertTrue(BudgetItem.objects.filter(pk=legacy.pk).exists())
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.total_value, Decimal('25.00'))
+
+    def test_unchanged_sections_keep_their_items(self):
+        """Seções marcadas como inalteradas mantêm os itens sem que sejam lidos."""
+        self._save([
+            {'id': None, 'title': 'A', 'items': [_item_payload(i) for i in range(30)]},
+            {'id': None, 'title': 'B', 'items': [_item_payload(1)]},
+            {'id': None, 'title': 'C', 'items': [_item_payload(2)]},
+        ])
+        section_a, section_b, section_c = self.budget.sections.all()
+        item_b = section_b.section_items.get()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._save([
+                {'id': section_a.pk, 'title': 'A renomeada', 'unchanged': True},
+                {'id': section_b.pk, 'title': 'B', 'items': [_item_payload(1, id=item_b.pk, total='7.00')]},
+            ])
+        item_select = [q['sql'] for q in ctx.captured_queries if 'FROM "budgets_budgetitem"' in q['sql']][0]
+        self.assertIn(f'"section_id" IN ({section_b.pk})', item_select)
+
+        self.assertEqual(section_a.section_items.count(), 30)
+        self.assertFalse(BudgetSection.objects.filter(pk=section_c.pk).exists())
+        self.assertEqual(BudgetSection.objects.get(pk=section_a.pk).title, 'A renomeada')
+        self.assertEqual(self.budget.items_count, 31)
+        self.assertEqual(self.budget.total_value, Decimal('607.00'))
+
+    def test_query_count_is_constant(self):
+        """O número de queries não depende da quantidade de itens."""
+        def count_queries(size):
+            budget = Budget.objects.create(name=f'Proposta {size}')
+            first = [{'id': None, 'title': 'S', 'items': [_item_payload(i) for i in range(size)]}]
+            with CaptureQueriesContext(connection) as create_ctx:
+                save_budget_sections(budget, json.dumps(first))
+
+            self.budget = budget
+            resubmitted = self._sections_payload()
+            for item in resubmitted[0]['items'][::2]:
+                item['quantity'] = 5
+            resubmitted[0]['items'] = resubmitted[0]['items'][1:]
+            resubmitted.append({'id': None, 'title': 'Nova', 'items': [_item_payload(i) for i in range(size)]})
+            with CaptureQueriesContext(connection) as update_ctx:
+                save_budget_sections(budget, json.dumps(resubmitted))
+            return len(create_ctx.captured_queries), len(update_ctx.captured_queries)
+
+        self.assertEqual(count_queries(5), count_queries(45))
+
+
+class StoredTotalsTestCase(TestCase):
+    """Testes para os totais de itens armazenados na proposta."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.budget = Budget.objects.create(
+            name='Totais', discount_type='percent', discount_value=Decimal('10'), freight_cost=Decimal('35'),
+        )
+        self.other = Budget.objects.create(name='Outra')
+        self.items = [
+            BudgetItem.objects.create(
+                budget=self.budget, name=f'Item {i}', quantity=i + 1, unit_price=Decimal('12.5'),
+                weight=Decimal('2'), measurement=Decimal('0.5'), measurement_unit='m3',
+                include_fiscal=i % 2 == 0, is_approved=i != 1,
+            )
+            for i in range(3)
+        ]
+
+    def assertTotalsConsistent(self, budget):
+        stored = Budget.objects.values(*Budget.ITEM_TOTAL_FIELDS).get(pk=budget.pk)
+        recomputed = next(iter(BudgetItem.objects.filter(budget=budget).totals_by('budget_id')), {})
+        for name in Budget.ITEM_TOTAL_FIELDS:
+            self.assertEqual(stored[name], recomputed.get(name, 0), name)
+
+        budget = Budget.objects.get(pk=budget.pk)
+        annotated = Budget.objects.with_totals().get(pk=budget.pk)
+        kernel = pricing.price_budget(
+            [item.pricing_line() for item in budget.items.all()],
+            budget.extra_charges,
+            budget.discount_type,
+            budget.discount_value,
+            budget.freight_cost,
+            budget.freight_included,
+        )
+        cent = Decimal('0.01')
+        for name, expected in (
+            ('total_with_freight', kernel.total_with_freight),
+            ('approved_value', kernel.approved_value),
+            ('discount_amount', kernel.discount),
+            ('fiscal_charges_value', kernel.fiscal_charges),
+        ):
+            self.assertEqual(Decimal(getattr(budget, name)).quantize(cent), expected.quantize(cent), name)
+            self.assertEqual(Decimal(getattr(annotated, name)).quantize(cent), expected.quantize(cent), name)
+
+    def test_stored_totals_match_recomputed_and_annotated(self):
+        """Os totais armazenados, a anotação SQL e o recálculo do zero coincidem após cada escrita."""
+        self.assertTotalsConsistent(self.budget)
+
+        item = BudgetItem.objects.get(pk=self.items[0].pk)
+        item.quantity = 7
+        item.total_price = 0
+        item.save()
+        self.assertTotalsConsistent(self.budget)
+
+        moved = BudgetItem.objects.get(pk=self.items[1].pk)
+        moved.budget = self.other
+        moved.save()
+        self.assertTotalsConsistent(self.budget)
+        self.assertTotalsConsistent(self.other)
+
+        BudgetItem.objects.filter(budget=self.budget).update(include_fiscal=True)
+        self.assertTotalsConsistent(self.budget)
+
+        BudgetItem.objects.get(pk=self.items[2].pk).delete()
+        self.assertTotalsConsistent(self.budget)
+
+    def test_partially_loaded_item_is_not_counted_twice(self):
+        """Salvar um item carregado com only()/defer() aplica só a diferença."""
+        before = Budget.objects.values(*Budget.ITEM_TOTAL_FIELDS).get(pk=self.budget.pk)
+
+        BudgetItem.objects.only('pk', 'name').get(pk=self.items[0].pk).save()
+        self.assertEqual(Budget.objects.values(*Budget.ITEM_TOTAL_FIELDS).get(pk=self.budget.pk), before)
+
+        item = BudgetItem.objects.defer('total_price').get(pk=self.items[0].pk)
+        item.quantity = 4
+        item.total_price = 0
+        item.save()
+        self.assertTotalsConsistent(self.budget)
+
+        BudgetItem.objects.defer('weight').get(pk=self.items[2].pk).delete()
+        self.assertTotalsConsistent(self.budget)
+
+    def test_query_counts(self):
+        """Um item salvo custa um número fixo de consultas e a listagem com totais, uma só."""
+        item = BudgetItem.objects.get(pk=self.items[0].pk)
+        item.quantity = 3
+        with self.assertNumQueries(2):  # the row + the budget aggregates delta
+            item.save()
+
+        for index in range(5):
+            budget = Budget.objects.create(name=f'Lista {index}', freight_cost=Decimal('10'))
+            BudgetItem.objects.create(budget=budget, name='X', quantity=1, unit_price=Decimal('5'))
+        with self.assertNumQueries(1):
+            rows = [
+                (budget.total_with_freight, budget.approved_value, budget.discount_amount,
+                 budget.fiscal_charges_value)
+                for budget in Budget.objects.with_totals()
+            ]
+        self.assertEqual(len(rows), 7)
+
+
+class PricingKernelTestCase(TestCase):
+    """Testes de propriedades do núcleo de precificação."""
+
+    def _random_line(self, rng):
+        return pricing.ItemLine(
+            Decimal(rng.randint(0, 500000)) / 100,
+            rng.randint(0, 20),
+            Decimal(rng.randint(0, 5000)) / 10 if rng.random() < 0.7 else None,
+            Decimal(rng.randint(0, 9000)) / 1000 if rng.random() < 0.7 else None,
+            rng.choice(['m3', 'm2', '']),
+            rng.random() < 0.4,
+            rng.random() < 0.7,
+        )
+
+    def test_aggregation_is_additive(self):
+        """Agregar duas listas é o mesmo que somar os agregados de cada uma."""
+        rng = random.Random(10)
+        for _ in range(50):
+            left = [self._random_line(rng) for _ in range(rng.randint(0, 30))]
+            right = [self._random_line(rng) for _ in range(rng.randint(0, 30))]
+            combined = pricing.aggregate_items(left + right)
+            summed = tuple(
+                a + b for a, b in zip(pricing.aggregate_items(left), pricing.aggregate_items(right))
+            )
+            self.assertEqual(tuple(combined), summed)
+            self.assertEqual(
+                tuple(combined),
+                tuple(map(sum, zip(pricing.ItemAggregates(), *map(pricing.item_contribution, left + right)))),
+            )
+
+    def test_discount_is_bounded(self):
+        """O desconto nunca é negativo nem maior que a base, e o total nunca fica negativo."""
+        rng = random.Random(11)
+        for _ in range(200):
+            lines = [self._random_line(rng) for _ in range(rng.randint(0, 10))]
+            discount_type = rng.choice(['none', 'percent', 'value'])
+            discount_value = Decimal(rng.randint(-1000, 300000)) / 100
+            totals = pricing.price_budget(lines, {}, discount_type, discount_value, Decimal(rng.randint(0, 1000)))
+            self.assertGreaterEqual(totals.discount, 0)
+            self.assertLessEqual(totals.discount, max(totals.subtotal, Decimal('0')))
+            self.assertEqual(totals.total_with_freight, totals.subtotal - totals.discount)
+            self.assertGreaterEqual(totals.total_with_freight, 0)
+
+    def test_kernel_matches_saved_budget(self):
+        """Os valores do modelo, da anotação SQL e do endpoint ao vivo coincidem com o núcleo."""
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        rng = random.Random(12)
+        for _ in range(5):
+            sections = [{'id': None, 'title': 'S', 'items': [
+                _item_payload(
+                    i,
+                    quantity=rng.randint(1, 9),
+                    unit_price=str(Decimal(rng.randint(1, 99999)) / 100),
+                    include_fiscal=rng.random() < 0.5,
+                    billing_type=rng.choice(['qty', 'meter']),
+                )
+                for i in range(rng.randint(1, 12))
+            ]}]
+            extra_charges = {'apoio': [{'label': 'A', 'value': '150.50', 'fiscal': True}]}
+            post = {
+                'sections_data': json.dumps(sections),
+                'extra_charges_data': json.dumps(extra_charges),
+                'discount_type': rng.choice(['none', 'percent', 'value']),
+                'discount_value': str(rng.randint(0, 40)),
+                'freight_cost': '250.00',
+            }
+            live = self.client.post(reverse('budgets:live-totals'), post).json()
+
+            budget = Budget.objects.create(
+                name='Proposta',
+                extra_charges=extra_charges,
+                discount_type=post['discount_type'],
+                discount_value=Decimal(post['discount_value']),
+                freight_cost=Decimal('250.00'),
+            )
+            save_budget_sections(budget, post['sections_data'])
+            budget = Budget.objects.get(pk=budget.pk)
+            kernel = pricing.price_budget(
+                [item.pricing_line() for item in budget.items.all()],
+                budget.extra_charges,
+                budget.discount_type,
+                budget.discount_value,
+                budget.freight_cost,
+                budget.freight_included,
+            )
+            annotated = Budget.objects.with_totals().get(pk=budget.pk)
+            self.assertEqual(budget.total_with_freight, kernel.total_with_freight)
+            self.assertEqual(budget.approved_value, kernel.approved_value)
+            self.assertEqual(budget.fiscal_charges_value, kernel.fiscal_charges)
+            self.assertEqual(annotated.total_with_freight.quantize(Decimal('0.01')),
+                             kernel.total_with_freight.quantize(Decimal('0.01')))
+            self.assertEqual(Decimal(live['total']), kernel.total_with_freight.quantize(Decimal('0.01')))
+            self.assertEqual(live['items_count'], budget.items_count)
+
+    def test_live_totals_skip_half_typed_lines(self):
+        """Uma quantidade inválida no formulário não derruba os totais ao vivo."""
+        user = get_user_model().objects.create_user(email='digitando@example.com', password='x')
+        self.client.force_login(user)
+        sections = [{'id': None, 'title': 'S', 'items': [
+            _item_payload(0), _item_payload(1, quantity='1.5'), _item_payload(2, quantity='abc'), 'malformado',
+        ]}]
+        response = self.client.post(reverse('budgets:live-totals'), {'sections_data': json.dumps(sections)})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['items_count'], 1)
+        self.assertEqual(data['invalid_items'], 3)
+        self.assertEqual(data['items_total'], '20.00')
+
+    def test_large_budget_prices_without_queries(self):
+        """Orçamentos com 10 mil itens são precificados sem acessar o banco."""
+        rng = random.Random(13)
+        lines = [self._random_line(rng) for _ in range(10000)]
+        with self.assertNumQueries(0):
+            totals = pricing.price_budget(lines, {}, 'percent', Decimal('5'), Decimal('100'))
+        self.assertEqual(totals.items.items_count, 10000)
+
+
+class SyncServiceOrderItemsTestCase(TestCase):
+    """Testes para o espelhamento dos itens na Ordem de Serviço."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.budget = Budget.objects.create(name='Proposta')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'S', 'items': [_item_payload(i) for i in range(3)]},
+        ]))
+
+    def test_only_changed_rows_are_written(self):
+        """Somente itens alterados são gravados e o relatório reflete isso."""
+        self.assertEqual(tuple(sync_service_order_items(self.budget)), (3, 0, 0))
+        self.assertEqual(tuple(sync_service_order_items(self.budget)), (0, 0, 0))
+
+        item = self.budget.items.first()
+        item.quantity = 7
+        item.save()
+        BudgetItem.objects.create(budget=self.budget, name='Novo', unit_price=Decimal('1'))
+        self.assertEqual(tuple(sync_service_order_items(self.budget)), (1, 1, 0))
+
+        so_item = self.budget.service_order.items.get(budget_item=item)
+        self.assertEqual(so_item.quantity, 7)
+        self.assertEqual(so_item.section_name, 'S')
+
+    def test_approved_budget_keeps_selected_items(self):
+        """Após aprovação, a OS mantém apenas os itens selecionados pelo cliente."""
+        sync_service_order_items(self.budget)
+        kept = self.budget.items.first()
+        self.budget.items.exclude(pk=kept.pk).update(is_approved=False)
+        self.budget.approval_status = 'approved'
+
+        self.assertEqual(tuple(sync_service_order_items(self.budget)), (0, 0, 2))
+        self.assertEqual(
+            list(self.budget.service_order.items.values_list('budget_item_id', flat=True)),
+            [kept.pk],
+        )
+
+
+class ApproveBudgetTestCase(TestCase):
+    """Testes para a aprovação da proposta pelo cliente."""
+
+    def _budget(self, size):
+        budget = Budget.objects.create(name=f'Proposta {size}')
+        save_budget_sections(budget, json.dumps([
+            {'id': None, 'title': 'S', 'items': [_item_payload(i) for i in range(size)]},
+        ]))
+        sync_service_order_items(budget)
+        return budget
+
+    def test_approval_marks_selected_items(self):
+        """Somente os itens selecionados ficam aprovados, e OS e notificação acompanham."""
+        budget = self._budget(4)
+        selected = list(budget.items.values_list('pk', flat=True)[:1])
+        approve_budget(budget, selected, notes='ok')
+
+        budget.refresh_from_db()
+        self.assertEqual(budget.approval_status, 'approved')
+        self.assertEqual(list(budget.items.filter(is_approved=True).values_list('pk', flat=True)), selected)
+        self.assertEqual(budget.approved_value, Decimal('20.00'))
+        self.assertEqual(budget.service_order.status, 'approved')
+        self.assertEqual(list(budget.service_order.items.values_list('budget_item_id', flat=True)), selected)
+        self.assertTrue(BudgetNotification.objects.filter(budget=budget, action='approved').exists())
+
+    def test_approval_query_count_is_constant(self):
+        """O número de queries da aprovação não depende da quantidade de itens."""
+        def count_queries(size):
+            budget = self._budget(size)
+            selected = list(budget.items.values_list('pk', flat=True))[::2]
+            with CaptureQueriesContext(connection) as ctx:
+                approve_budget(budget, selected)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(5), count_queries(45))
+
+
+class PublicBudgetPDFTestCase(TestCase):
+    """Testes para o PDF público armazenado em cache."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BUDGET_PDF_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.budget = Budget.objects.create(name='Proposta')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'S', 'items': [_item_payload(1)]},
+        ]))
+        self.url = reverse('budgets:public_pdf', kwargs={'token': self.budget.approval_token})
+
+    def test_pdf_is_cached_until_items_change(self):
+        """O PDF é reutilizado e só é gerado de novo quando a proposta muda."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        item = self.budget.items.get()
+        item.name = 'Renomeado'
+        item.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response.close()
+
+    def test_pdf_is_rendered_again_after_project_edit(self):
+        """Editar o projeto exibido no cabeçalho gera um novo PDF."""
+        from apps.projects.models import Project
+
+        project = Project.objects.create(title='Estande')
+        self.budget.proposal = project
+        self.budget.save()
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        response.close()
+
+        project.title = 'Estande Renomeado'
+        project.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response.close()
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'budgets', 'pdf', str(self.budget.pk)))), 1)
+
+
+class BudgetVersionEncodingTestCase(TestCase):
+    """Testes para o armazenamento comprimido do histórico de versões."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.budget = Budget.objects.create(name='Proposta')
+        self.snapshots = []
+        sections = [{'id': None, 'title': 'S', 'items': [_item_payload(i) for i in range(3)]}]
+        for n in range(KEYFRAME_INTERVAL + 2):
+            save_budget_sections(self.budget, json.dumps(sections))
+            self.budget.refresh_from_db()
+            snapshot = json.loads(json.dumps(_snapshot_budget(self.budget)))
+            create_version(self.budget, snapshot, label='Marco' if n == 1 else '')
+            self.snapshots.append(snapshot)
+            sections = [
+                {'id': section.pk, 'title': section.title, 'items': [
+                    _item_payload(0, id=item.pk, name=item.name, quantity=item.quantity + (item.pk % 2))
+                    for item in section.section_items.all()
+                ] + [_item_payload(n)]}
+                for section in self.budget.sections.prefetch_related('section_items')
+            ]
+
+    def test_versions_round_trip(self):
+        """Cada versão é reconstruída exatamente a partir de quadros-chave e deltas."""
+        versions = list(self.budget.versions.order_by('version_number'))
+        self.assertEqual(
+            [v.encoding for v in versions],
+            ['keyframe'] + ['delta'] * (KEYFRAME_INTERVAL - 1) + ['keyframe', 'delta'],
+        )
+        for version, snapshot in zip(versions, self.snapshots):
+            self.assertIsNone(version.snapshot)
+            self.assertEqual(version.get_snapshot(), snapshot)
+
+    def test_version_list_reads_summary_with_cursor(self):
+        """A lista de versões usa as colunas de resumo e pagina por cursor."""
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        url = reverse('budgets:version-list', kwargs={'pk': self.budget.pk})
+        latest = len(self.snapshots)
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {'limit': 5}).json()
+        version_sql = [q['sql'] for q in ctx.captured_queries if 'budgetversion' in q['sql']]
+        self.assertTrue(version_sql)
+        for sql in version_sql:
+            self.assertNotIn('"snapshot"', sql)
+            self.assertNotIn('"payload"', sql)
+
+        self.assertEqual([v['version_number'] for v in data['versions']], list(range(latest, latest - 5, -1)))
+        self.assertEqual(data['next_cursor'], latest - 4)
+        self.assertEqual(data['versions'][0]['items_count'], len(self.snapshots[-1]['sections'][0]['items']))
+        self.assertEqual(data['versions'][0]['sections_count'], 1)
+        self.assertEqual(Decimal(data['versions'][0]['total']), Decimal(self.snapshots[-1]['total_with_freight']))
+
+        data = self.client.get(url, {'limit': 5, 'before': data['next_cursor']}).json()
+        self.assertEqual(data['versions'][0]['version_number'], latest - 5)
+
+    def test_compact_command_applies_retention(self):
+        """O comando remove versões antigas sem rótulo e mantém as demais legíveis."""
+        BudgetVersion.objects.filter(version_number=3).update(
+            encoding='full', payload=None, snapshot=self.snapshots[2],
+        )
+        call_command('compact_budget_versions', '--keep-last', '3', '--commit', stdout=StringIO())
+
+        versions = list(self.budget.versions.order_by('version_number'))
+        kept_numbers = [v.version_number for v in versions]
+        self.assertEqual(kept_numbers, [2] + list(range(KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 3)))
+        self.assertEqual(versions[0].encoding, 'keyframe')
+        for version in versions:
+            self.assertEqual(version.get_snapshot(), self.snapshots[version.version_number - 1])
+
+
+class PublicBudgetApprovalCacheTestCase(TestCase):
+    """Testes para o cache da página pública de aprovação."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        cache.clear()
+        self.budget = Budget.objects.create(name='Proposta')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'S', 'items': [_item_payload(1)]},
+        ]))
+        self.url = reverse('budgets:public_approval', kwargs={'token': self.budget.approval_token})
+
+    def test_repeat_visits_are_served_from_cache(self):
+        """Visitas repetidas recebem 304 ou o HTML em cache, com o token CSRF do visitante."""
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Item 1')
+        etag = response['ETag']
+        self.assertNotContains(response, PublicBudgetApprovalView.csrf_placeholder)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.assertNumQueries(1):
+            response = Client().get(self.url)
+        self.assertContains(response, 'Item 1')
+
+        # The cached form still posts with the visitor's own token
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', client.get(self.url).content.decode()).group(1)
+        response = client.post(self.url, {'action': 'reject', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Proposta rejeitada.')
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_client_and_event_edits_refresh_the_page(self):
+        """Alterar o cliente, o evento ou o projeto invalida a página em cache e o ETag."""
+        from datetime import date
+
+        from apps.clients.models import Client as CustomerClient
+        from apps.events.models import Event
+        from apps.projects.models import Project
+
+        customer = CustomerClient.objects.create(name='Cliente', phone='1111-1111')
+        event = Event.objects.create(client=customer, name='Feira', event_date=date(2026, 5, 1), location='Pavilhão A')
+        self.budget.proposal = Project.objects.create(title='Estande', event=event)
+        self.budget.save()
+
+        response = self.client.get(self.url)
+        self.assertContains(response, '1111-1111')
+        etag = response['ETag']
+
+        customer.phone = '2222-2222'
+        customer.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '2222-2222')
+        etag = response['ETag']
+
+        event.location = 'Pavilhão B'
+        event.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Pavilhão B')
+
+
+class BudgetExportTestCase(TestCase):
+    """Testes para a exportação de propostas em CSV e XLSX."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        self.budget = Budget.objects.create(name='Palco <principal>', status='approved')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'Estrutura', 'items': [_item_payload(1), _item_payload(2)]},
+        ]))
+        Budget.objects.create(name='Outra proposta')
+
+    def test_csv_export_follows_list_filters(self):
+        """O CSV de itens traz só as propostas filtradas, uma linha por item."""
+        response = self.client.get(reverse('budgets:export'), {'format': 'csv', 'status': 'approved'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        ))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][1], 'Palco <principal>')
+        self.assertEqual(rows[1][3], 'Estrutura')
+        self.assertEqual(rows[1][14], '20.00')
+
+        response = self.client.get(reverse('budgets:export'), {'format': 'csv', 'scope': 'budgets'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 3)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        """O XLSX é um pacote zip com a planilha completa e o texto escapado."""
+        response = self.client.get(reverse('budgets:export'), {'format': 'xlsx', 'scope': 'budgets'})
+        self.assertEqual(response.status_code, 200)
+        package = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(package.testzip())
+        sheet = package.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('Palco &lt;principal&gt;', sheet)
+        self.assertEqual(sheet.count('<row>'), 3)
+
+        self.assertEqual(self.client.get(reverse('budgets:export'), {'format': 'pdf'}).status_code, 400)
+
+
+class LibrarySearchTestCase(TestCase):
+    """Testes para a busca paginada das bibliotecas de descrições e pagamentos."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        ItemDescription.objects.bulk_create([
+            ItemDescription(title=f'Painel {index:02d}', body=f'Painel modulado {index}')
+            for index in range(25)
+        ])
+        self.truss = ItemDescription.objects.create(title='Treliça Q30', body='Treliça em alumínio, inclui painel')
+        self.url = reverse('budgets:item-descriptions')
+
+    def test_search_is_paginated_ranked_and_revalidated(self):
+        """A busca pagina só títulos, prioriza o título e responde 304 enquanto nada muda."""
+        response = self.client.get(self.url, {'q': 'painel'})
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+        self.assertEqual(data['results'][0]['title'], 'Painel 00')
+
+        last = self.client.get(self.url, {'q': 'painel', 'page': 2}).json()
+        self.assertFalse(last['has_more'])
+        self.assertEqual(last['results'][-1]['title'], 'Treliça Q30')
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, {'q': 'painel'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(
+            reverse('budgets:item-descriptions-detail', args=[self.truss.pk]),
+            json.dumps({'title': 'Treliça Q25', 'body': 'Treliça'}),
+            content_type='application/json',
+        )
+        self.assertEqual(self.client.get(self.url, {'q': 'painel'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_form_embeds_only_used_entries(self):
+        """O formulário embute só as descrições usadas; o corpo vem do endpoint de detalhe."""
+        budget = Budget.objects.create(name='Proposta')
+        BudgetItem.objects.create(budget=budget, name='Treliça', description_ref=self.truss, unit_price=1)
+        response = self.client.get(reverse('budgets:edit', args=[budget.pk]))
+        self.assertContains(response, 'Q30')
+        self.assertNotContains(response, 'Painel 07')
+
+        detail = self.client.get(reverse('budgets:item-descriptions-detail', args=[self.truss.pk]))
+        self.assertEqual(detail.json()['body'], self.truss.body)
+        self.assertEqual(
+            self.client.get(
+                reverse('budgets:item-descriptions-detail', args=[self.truss.pk]),
+                HTTP_IF_NONE_MATCH=detail['ETag'],
+            ).status_code,
+            304,
+        )
+
+
+class NotificationFeedTestCase(TestCase):
+    """Testes para o feed de notificações com leitura por usuário."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        cache.clear()
+        User = get_user_model()
+        self.alice = User.objects.create_user(email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(email='bob@example.com', password='x')
+        self.budget = Budget.objects.create(name='Proposta')
+        self.url = reverse('budgets:notifications')
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.budget, 'approved')
+
+    def test_read_state_is_per_user(self):
+        """Marcar como lidas afeta só o usuário que marcou."""
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(self.url).json()['unread_count'], 1)
+        self.client.post(self.url)
+        self.assertEqual(self.client.get(self.url).json()['unread_count'], 0)
+
+        self.client.force_login(self.bob)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['unread_count'], 1)
+        self.assertEqual(data['notifications'][0]['budget_name'], 'Proposta')
+
+    def test_idle_polls_hit_only_the_cache(self):
+        """Com o cursor em dia a resposta é 204 sem queries; uma nova notificação muda o cursor."""
+        self.client.force_login(self.alice)
+        cursor = self.client.get(self.url).json()['cursor']
+        with self.assertNumQueries(2):  # session + user
+            response = self.client.get(self.url, {'cursor': cursor, 'wait': 30})
+        self.assertEqual(response.status_code, 204)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.budget, 'rejected')
+        data = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertNotEqual(data['cursor'], cursor)
+        self.assertEqual(data['unread_count'], 2)
+
+    def test_new_users_start_with_the_history_read(self):
+        """Usuários novos (ou sem estado salvo) não recebem o histórico inteiro como não lido."""
+        carol = get_user_model().objects.create_user(email='carol@example.com', password='x')
+        self.client.force_login(carol)
+        self.assertEqual(self.client.get(self.url).json()['unread_count'], 0)
+
+        # Conta criada sem o sinal: o estado é semeado no primeiro acesso
+        NotificationReadState.objects.filter(user=self.bob).delete()
+        cache.clear()
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(self.url).json()['unread_count'], 0)
+        self.assertEqual(
+            NotificationReadState.objects.get(user=self.bob).last_read_id,
+            BudgetNotification.objects.get().pk,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.budget, 'rejected')
+        self.assertEqual(self.client.get(self.url).json()['unread_count'], 1)
+
+
+class LazySectionsTestCase(TestCase):
+    """Testes para o carregamento sob demanda das seções no formulário."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        self.budget = Budget.objects.create(name='Proposta')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'A', 'items': [_item_payload(i, include_fiscal=True) for i in range(5)]},
+            {'id': None, 'title': 'B', 'items': [_item_payload(9)]},
+        ]))
+        self.section_a, self.section_b = self.budget.sections.all()
+
+    def test_outline_and_item_pages(self):
+        """Orçamentos grandes recebem só o resumo das seções; os itens vêm paginados."""
+        outline = json.loads(_sections_to_json(self.budget, lazy=True))
+        self.assertEqual([s['items_count'] for s in outline], [5, 1])
+        self.assertEqual(Decimal(outline[0]['subtotal']), Decimal('100.00'))
+        self.assertNotIn('items', outline[0])
+
+        url = reverse('budgets:section-items', args=[self.budget.pk, self.section_a.pk])
+        first = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual(len(first['items']), 3)
+        rest = self.client.get(url, {'limit': 3, 'after': first['next_cursor']}).json()
+        self.assertEqual([i['name'] for i in rest['items']], ['Item 3', 'Item 4'])
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_live_totals_price_unchanged_sections_from_stored_items(self):
+        """As seções não carregadas entram no total pelos valores gravados."""
+        sections = [
+            {'id': self.section_a.pk, 'title': 'A', 'unchanged': True},
+            {'id': self.section_b.pk, 'title': 'B', 'items': [_item_payload(9, total='50.00')]},
+        ]
+        data = self.client.post(reverse('budgets:live-totals'), {
+            'sections_data': json.dumps(sections),
+            'budget_id': self.budget.pk,
+        }).json()
+        self.assertEqual(data['section_subtotals'], ['100.00', '50.00'])
+        self.assertEqual(data['items_count'], 6)
+        self.assertEqual(data['fiscal_charges'], '17.00')
+
+
+class AutosaveApiTestCase(TestCase):
+    """Testes para a API de gravação por item usada pelo salvamento automático."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        cache.clear()
+        user = get_user_model().objects.create_user(email='editor@example.com', password='x')
+        self.client.force_login(user)
+        self.budget = Budget.objects.create(name='Proposta')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'A', 'items': [_item_payload(0), _item_payload(1)]},
+        ]))
+        self.section = self.budget.sections.get()
+        self.item = self.budget.items.order_by('pk').first()
+
+    def _send(self, method, url, data=None, revision=0):
+        headers = {} if revision is None else {'HTTP_IF_MATCH': f'"{revision}"'}
+        return getattr(self.client, method)(
+            url, json.dumps(data or {}), content_type='application/json', **headers,
+        )
+
+    def test_patch_updates_item_and_totals(self):
+        """O PATCH altera só os campos enviados e atualiza os totais da proposta."""
+        url = reverse('budgets:api-item', args=[self.budget.pk, self.item.pk])
+        response = self._send('patch', url, {'quantity': 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['revision'], 1)
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(data['item']['total'], '50.00')
+        self.assertEqual(data['item']['name'], 'Item 0')
+        self.assertEqual(data['totals']['items_total'], '70.00')
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.items_total, Decimal('70.00'))
+
+        created = self._send('post', reverse('budgets:api-items', args=[self.budget.pk]), {
+            'section_id': self.section.pk, 'name': 'Novo', 'quantity': 1, 'unit_price': '5',
+        }, revision=1)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.json()['totals']['items_count'], 3)
+
+        deleted = self._send('delete', url, revision=2)
+        self.assertEqual(deleted.json()['totals']['items_total'], '25.00')
+        self.assertFalse(BudgetItem.objects.filter(pk=self.item.pk).exists())
+
+    def test_stale_revision_is_rejected(self):
+        """Uma revisão desatualizada recebe 409 e nada é gravado."""
+        url = reverse('budgets:api-item', args=[self.budget.pk, self.item.pk])
+        self.assertEqual(self._send('patch', url, {'name': 'Primeiro'}).status_code, 200)
+
+        response = self._send('patch', url, {'name': 'Segundo'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual(self._send('patch', url, {'name': 'Segundo'}, revision=None).status_code, 428)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.name, 'Primeiro')
+
+    def test_versions_are_coalesced_per_session(self):
+        """Várias gravações da mesma sessão geram uma única versão."""
+        url = reverse('budgets:api-item', args=[self.budget.pk, self.item.pk])
+        for revision, quantity in enumerate((3, 4, 5)):
+            self._send('patch', url, {'quantity': quantity}, revision=revision)
+        self._send('patch', reverse('budgets:api-section', args=[self.budget.pk, self.section.pk]),
+                   {'title': 'Estrutura'}, revision=3)
+        self.assertEqual(BudgetVersion.objects.filter(budget=self.budget).count(), 1)
+
+        self.client.post(reverse('budgets:api-flush', args=[self.budget.pk]))
+        self._send('patch', url, {'quantity': 6}, revision=4)
+        self.assertEqual(BudgetVersion.objects.filter(budget=self.budget).count(), 2)
+
+    def test_service_order_sync_is_debounced(self):
+        """A OS é sincronizada na primeira gravação e as seguintes aguardam o flush."""
+        url = reverse('budgets:api-item', args=[self.budget.pk, self.item.pk])
+        so_items = self.budget.service_order.items
+        with self.captureOnCommitCallbacks(execute=True):
+            self._send('patch', url, {'quantity': 3})
+        self.assertEqual(so_items.get(budget_item=self.item).quantity, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._send('patch', url, {'quantity': 4}, revision=1)
+        self.assertEqual(so_items.get(budget_item=self.item).quantity, 3)
+
+        response = self.client.post(reverse('budgets:api-flush', args=[self.budget.pk]))
+        self.assertTrue(response.json()['synced'])
+        self.assertEqual(so_items.get(budget_item=self.item).quantity, 4)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.service_order_revision, self.budget.revision)
+
+    def test_sections_create_reorder_and_delete(self):
+        """Seções podem ser criadas, reordenadas e removidas com seus itens."""
+        created = self._send('post', reverse('budgets:api-sections', args=[self.budget.pk]), {'title': 'B'})
+        self.assertEqual(created.status_code, 201)
+        new_id = created.json()['section']['id']
+
+        reordered = self._send('post', reverse('budgets:api-sections-reorder', args=[self.budget.pk]),
+                               {'order': [new_id, self.section.pk]}, revision=1)
+        self.assertEqual([s['id'] for s in reordered.json()['sections']], [new_id, self.section.pk])
+        self.assertEqual(list(self.budget.sections.values_list('pk', flat=True)), [new_id, self.section.pk])
+
+        deleted = self._send('delete', reverse('budgets:api-section', args=[self.budget.pk, self.section.pk]),
+                             revision=2)
+        self.assertEqual(deleted.json()['totals']['items_count'], 0)
+
+    def _approve(self):
+        approve_budget(self.budget, [self.item.pk])
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.approval_status, 'approved')
+
+    def test_autosave_reopens_approved_budget(self):
+        """Editar pela API uma proposta aprovada reabre a aprovação do cliente."""
+        self._approve()
+        url = reverse('budgets:api-item', args=[self.budget.pk, self.item.pk])
+        response = self._send('patch', url, {'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['approval_reset'])
+
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.approval_status, 'pending')
+        self.assertIsNone(self.budget.approved_at)
+        self.assertEqual(self.budget.approved_items_total, Decimal('0'))
+        self.assertFalse(self.budget.items.filter(is_approved=True).exists())
+        self.assertEqual(self.budget.service_order.status, 'pending')
+
+        again = self._send('patch', url, {'quantity': 4}, revision=1)
+        self.assertNotIn('approval_reset', again.json())
+
+    def test_form_save_reopens_approved_budget(self):
+        """Salvar o formulário completo de uma proposta aprovada também reabre a aprovação."""
+        self._approve()
+        response = self.client.post(reverse('budgets:edit', args=[self.budget.pk]), {
+            'name': 'Proposta', 'status': 'sent', 'discount_type': 'none', 'discount_value': '0',
+            'freight_cost': '0', 'extra_charges_data': '{}',
+            'sections_data': _sections_to_json(self.budget),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.approval_status, 'pending')
+        self.assertFalse(self.budget.items.filter(is_approved=True).exists())
+
+
+class BudgetDuplicationTestCase(TestCase):
+    """Testes para a duplicação de propostas e os modelos reutilizáveis."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.user = get_user_model().objects.create_user(email='vendas@example.com', password='x')
+        self.description = ItemDescription.objects.create(title='Painel', body='Painel modulado')
+        self.budget = self._budget_with_items(4)
+
+    def _budget_with_items(self, count):
+        budget = Budget.objects.create(
+            name='Estande', extra_charges={'apoio': [{'label': 'Apoio', 'value': '100', 'fiscal': True}]},
+            discount_type='percent', discount_value=Decimal('5'),
+        )
+        save_budget_sections(budget, json.dumps([
+            {'id': None, 'title': 'A', 'items': [
+                _item_payload(i, include_fiscal=True, description_ref_id=self.description.pk,
+                              subitems=[{'name': 'Parte', 'qty': '2'}])
+                for i in range(count)
+            ]},
+            {'id': None, 'title': 'B', 'items': [_item_payload(99)]},
+        ]))
+        approve_budget(budget, list(budget.items.values_list('pk', flat=True))[:1])
+        budget.refresh_from_db()
+        return budget
+
+    def test_duplicate_copies_rows_and_resets_approval(self):
+        """A cópia tem as mesmas seções, itens e totais, mas começa pendente."""
+        copy = duplicate_budget(self.budget, user=self.user)
+        self.assertEqual(copy.name, 'Estande (cópia)')
+        self.assertEqual(copy.approval_status, 'pending')
+        self.assertNotEqual(copy.approval_token, self.budget.approval_token)
+        self.assertEqual(list(copy.sections.values_list('title', flat=True)), ['A', 'B'])
+        self.assertEqual(copy.items_count, 5)
+        self.assertEqual(copy.total_with_freight, self.budget.total_with_freight)
+        item = copy.items.order_by('pk').first()
+        self.assertEqual(item.description_ref_id, self.description.pk)
+        self.assertEqual(item.subitems_data, [{'name': 'Parte', 'qty': '2'}])
+        self.assertFalse(copy.items.filter(is_approved=False).exists())
+        self.assertEqual(copy.service_order.items.count(), 5)
+
+    def test_copy_query_count_does_not_grow_with_items(self):
+        """O número de consultas da cópia não depende da quantidade de itens."""
+        counts = []
+        for size in (5, 40):
+            budget = self._budget_with_items(size)
+            with CaptureQueriesContext(connection) as queries:
+                duplicate_budget(budget)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_template_round_trip(self):
+        """Um modelo salvo gera propostas iguais à de origem, sem referências apagadas."""
+        template = save_as_template(self.budget, name='Estande padrão', user=self.user)
+        self.assertEqual(template.items_count, 5)
+        self.description.delete()
+
+        budget = instantiate_template(template, user=self.user)
+        self.assertEqual(budget.name, 'Estande padrão')
+        self.assertIsNone(budget.proposal_id)
+        self.assertEqual(budget.items_count, 5)
+        self.assertEqual(budget.discount_value, Decimal('5'))
+        self.assertEqual(budget.total_with_freight, self.budget.total_with_freight)
+        self.assertFalse(budget.items.filter(description_ref__isnull=False).exists())
+
+    def test_views(self):
+        """As ações da página de detalhe redirecionam para a nova proposta e para os modelos."""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('budgets:duplicate', args=[self.budget.pk]))
+        copy = Budget.objects.latest('pk')
+        self.assertRedirects(response, reverse('budgets:edit', args=[copy.pk]), fetch_redirect_response=False)
+
+        response = self.client.post(reverse('budgets:save-template', args=[self.budget.pk]), {'name': 'Padrão'})
+        self.assertRedirects(response, reverse('budgets:templates'), fetch_redirect_response=False)
+        self.assertContains(self.client.get(reverse('budgets:templates')), 'Padrão')
+
+
+class BudgetItemImportTestCase(TestCase):
+    """Testes para a importação de itens a partir de planilhas CSV e XLSX."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        user = get_user_model().objects.create_user(email='importa@example.com', password='x')
+        self.client.force_login(user)
+        self.budget = Budget.objects.create(name='Feira')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'Estrutura', 'items': [_item_payload(1)]},
+        ]))
+        self.url = reverse('budgets:import-items', args=[self.budget.pk])
+
+    def _upload(self, content, name='itens.csv', **data):
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content), **data})
+
+    def test_csv_import_prices_items_and_reuses_sections(self):
+        """O CSV (formato brasileiro) cria os itens com as regras de preço e reaproveita seções."""
+        content = (
+            '\ufeffSeção;Item;Qtd;Comprimento;Largura;Altura;Valor unitário;Cobrança;Encargo fiscal\n'
+            'estrutura;Treliça;2;;;;1.234,50;;Sim\n'
+            'Piso;Carpete;3;2,5;2;0,01;10;Por metro;\n'
+            ';Banner;1;;;;50;;\n'
+        ).encode('utf-8')
+        response = self._upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 3, 'sections_created': 2, 'errors': []})
+
+        trelica = self.budget.items.get(name='Treliça')
+        self.assertEqual(trelica.section.title, 'Estrutura')
+        self.assertEqual(trelica.total_price, Decimal('2469.00'))
+        self.assertTrue(trelica.include_fiscal)
+        carpete = self.budget.items.get(name='Carpete')
+        self.assertEqual((carpete.measurement, carpete.measurement_unit), (Decimal('0.050'), 'm3'))
+        self.assertEqual(carpete.total_price, Decimal('1.50'))
+        self.assertEqual(self.budget.items.get(name='Banner').section.title, 'Itens importados')
+
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.items_count, 4)
+        self.assertEqual(self.budget.items_total, Decimal('2540.50'))
+        self.assertEqual(self.budget.service_order.items.count(), 4)
+        self.assertEqual(self.budget.versions.first().label, 'Antes da importação')
+
+    def test_errors_reject_the_whole_file(self):
+        """Com linhas inválidas nada é gravado, a não ser no modo parcial."""
+        content = (
+            'Item,Quantidade,Valor unitário,Unidade\n'
+            'Ok,1,10,\n'
+            'Ruim,-2,10,\n'
+            'Outro,1,abc,\n'
+            ',1,10,\n'
+            'Medida,1,10,km\n'
+        ).encode('utf-8')
+        response = self._upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [3, 4, 5, 6])
+        self.assertEqual(self.budget.items.count(), 1)
+        self.assertFalse(self.budget.versions.exists())
+
+        self.assertEqual(self._upload(content, dry_run='1').json()['created'], 0)
+        self.assertEqual(self.budget.items.count(), 1)
+
+        response = self._upload(content, partial='1', section='Extras')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(self.budget.items.get(name='Ok').section.title, 'Extras')
+
+        self.assertEqual(self._upload(b'Descricao\nsem nome\n').status_code, 400)
+        self.assertEqual(self._upload(b'not a zip', name='itens.xlsx').status_code, 400)
+
+    def test_exported_xlsx_round_trips(self):
+        """Uma planilha exportada pode ser importada de volta."""
+        from .export import export_rows, stream_xlsx
+
+        headers, rows = export_rows(Budget.objects.filter(pk=self.budget.pk))
+        content = b''.join(stream_xlsx(headers, rows))
+        other = Budget.objects.create(name='Cópia')
+        response = self.client.post(
+            reverse('budgets:import-items', args=[other.pk]),
+            {'file': SimpleUploadedFile('export.xlsx', content)},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        copied = other.items.get()
+        original = self.budget.items.get()
+        self.assertEqual(copied.section.title, 'Estrutura')
+        for field in ('name', 'quantity', 'unit_price', 'total_price', 'billing_type', 'include_fiscal'):
+            self.assertEqual(getattr(copied, field), getattr(original, field), field)
+
+    def test_processed_budgets_refuse_imports(self):
+        """Propostas aprovadas ou rejeitadas não recebem itens nem mostram o formulário."""
+        content = 'Item;Qtd;Valor unitário\nTreliça;1;10\n'.encode('utf-8')
+        detail = reverse('budgets:detail', args=[self.budget.pk])
+        self.assertContains(self.client.get(detail), 'id="import-items-form"')
+        for approval_status in ('approved', 'rejected'):
+            Budget.objects.filter(pk=self.budget.pk).update(approval_status=approval_status)
+            response = self._upload(content)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['created'], 0)
+            self.assertEqual(self.budget.items.count(), 1)
+            self.assertFalse(self.budget.versions.exists())
+            self.assertNotContains(self.client.get(detail), 'id="import-items-form"')
+
+
+class BudgetExtraChargeTestCase(TestCase):
+    """Testes para os encargos adicionais normalizados em BudgetExtraCharge."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.charges = {
+            'apoio': [
+                {'label': 'Transporte', 'value': '150.50', 'fiscal': True},
+                {'label': 'Carregadores', 'value': 'abc'},
+            ],
+            'taxa_feira': [{'label': 'Taxa', 'value': '49.5', 'fiscal': False}],
+        }
+        self.budget = Budget.objects.create(name='Feira', extra_charges=self.charges)
+
+    def test_accessor_round_trips_through_rows(self):
+        """O dicionário atribuído vira linhas e é lido de volta no mesmo formato."""
+        self.assertEqual(
+            list(BudgetExtraCharge.objects.filter(budget=self.budget).values_list('group', 'label', 'value', 'fiscal')),
+            [('apoio', 'Transporte', Decimal('150.50'), True),
+             ('apoio', 'Carregadores', Decimal('0.00'), False),
+             ('taxa_feira', 'Taxa', Decimal('49.50'), False)],
+        )
+        budget = Budget.objects.get(pk=self.budget.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(budget.extra_charges['apoio'][0], {'label': 'Transporte', 'value': '150.50', 'fiscal': True})
+            self.assertEqual(budget.extra_charges['taxa_feira'][0]['value'], '49.50')
+        self.assertEqual((budget.extra_charges_base, budget.extra_charges_fiscal_base), (Decimal('200.00'), Decimal('150.50')))
+        self.assertTrue(budget.has_item_fiscal)
+
+        budget.extra_charges = {'outros': [{'label': 'Extra', 'value': '10'}]}
+        budget.save(update_fields=['extra_charges'])
+        budget.refresh_from_db()
+        self.assertEqual(list(budget.extra_charges), ['outros'])
+        self.assertEqual((budget.extra_charges_base, budget.extra_charges_fiscal_base), (Decimal('10.00'), Decimal('0.00')))
+        self.assertFalse(budget.has_item_fiscal)
+
+    def test_row_writes_keep_stored_sums(self):
+        """Gravações diretas nas linhas atualizam as somas guardadas na proposta."""
+        row = self.budget.extra_charge_rows.get(label='Taxa')
+        row.value = Decimal('100')
+        row.save()
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.extra_charges_base, Decimal('250.50'))
+
+        self.budget.extra_charge_rows.filter(fiscal=True).delete()
+        self.budget.refresh_from_db()
+        self.assertEqual((self.budget.extra_charges_base, self.budget.extra_charges_fiscal_base), (Decimal('100.00'), Decimal('0')))
+
+    def test_totals_report_across_budgets(self):
+        """As somas por grupo saem de um único agregado, para várias propostas."""
+        Budget.objects.create(name='Outra', extra_charges={'apoio': [{'label': 'Apoio', 'value': '20', 'fiscal': True}]})
+        with self.assertNumQueries(1):
+            totals = {row['group']: row for row in BudgetExtraCharge.objects.totals_by('group')}
+        self.assertEqual(totals['apoio']['extra_charges_base'], Decimal('170.50'))
+        self.assertEqual(totals['apoio']['extra_charges_fiscal_base'], Decimal('170.50'))
+        self.assertEqual(totals['taxa_feira']['extra_charges_base'], Decimal('49.50'))
+        self.assertEqual(BudgetExtraCharge.objects.filter(budget=self.budget).sums(), (Decimal('200.00'), Decimal('150.50')))
+
+    def test_duplicate_copies_extra_charges(self):
+        """A duplicação copia os encargos adicionais."""
+        copy = duplicate_budget(self.budget)
+        self.assertEqual(copy.extra_charge_rows.count(), 3)
+        self.assertEqual(Budget.objects.get(pk=copy.pk).extra_charges_base, Decimal('200.00'))
+
+
+class BudgetPricingMemoTestCase(TestCase):
+    """Testes para a memoização dos valores calculados da proposta."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        self.budget = Budget.objects.create(
+            name='Feira', discount_type='percent', discount_value=Decimal('10'), freight_cost=Decimal('100'),
+        )
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'Estrutura', 'items': [_item_payload(1, include_fiscal=True), _item_payload(2)]},
+        ]))
+        self.budget = Budget.objects.get(pk=self.budget.pk)
+
+    def test_money_figures_are_priced_once(self):
+        """Uma página lendo vários valores precifica a proposta uma única vez."""
+        from django.template import Context, Template
+
+        template = Template(
+            '{{ b.total_with_freight }} {{ b.discount_amount }} {{ b.fiscal_charges_value }} '
+            '{{ b.approved_value }} {{ b.total_with_freight }} {{ b.total_weight }}'
+        )
+        with mock.patch.object(pricing, 'price_totals', wraps=pricing.price_totals) as price, \
+                self.assertNumQueries(0):
+            template.render(Context({'b': self.budget}))
+            self.assertEqual(self.budget.total_with_freight, Decimal('129.06'))
+        self.assertEqual(price.call_count, 1)
+
+    def test_memo_follows_changes(self):
+        """A memoização é descartada quando os dados de preço mudam."""
+        self.assertEqual(self.budget.discount_amount, Decimal('14.34'))
+        self.budget.discount_value = Decimal('0')
+        self.assertEqual(self.budget.discount_amount, Decimal('0'))
+
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.discount_amount, Decimal('14.34'))
+        # The item write updates the cached budget's aggregates in memory
+        self.budget.items.first().delete()
+        self.assertEqual(self.budget.discount_amount, Decimal('12'))
+        self.assertEqual(Budget.objects.get(pk=self.budget.pk).discount_amount, Decimal('12'))
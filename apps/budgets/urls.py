@@ -10,11 +10,28 @@ app_name = 'budgets'
 urlpatterns = [
     path('', views.BudgetListView.as_view(), name='list'),
     path('create/', views.BudgetCreateView.as_view(), name='create'),
+    path('export/', views.BudgetExportView.as_view(), name='export'),
+    path('templates/', views.BudgetTemplateListView.as_view(), name='templates'),
+    path('templates/<int:pk>/use/', views.BudgetTemplateUseView.as_view(), name='template-use'),
+    path('templates/<int:pk>/delete/', views.BudgetTemplateDeleteView.as_view(), name='template-delete'),
     path('<int:pk>/', views.BudgetDetailView.as_view(), name='detail'),
+    path('<int:pk>/duplicate/', views.BudgetDuplicateView.as_view(), name='duplicate'),
+    path('<int:pk>/save-template/', views.BudgetSaveTemplateView.as_view(), name='save-template'),
+    path('<int:pk>/import-items/', views.BudgetImportItemsView.as_view(), name='import-items'),
     path('<int:pk>/edit/', views.BudgetUpdateView.as_view(), name='edit'),
     path('<int:pk>/delete/', views.BudgetDeleteView.as_view(), name='delete'),
+    path('<int:pk>/sections/<int:section_id>/items/', views.BudgetSectionItemsView.as_view(), name='section-items'),
+    path('<int:pk>/api/items/', views.BudgetItemApiView.as_view(), name='api-items'),
+    path('<int:pk>/api/items/<int:item_id>/', views.BudgetItemApiDetailView.as_view(), name='api-item'),
+    path('<int:pk>/api/sections/', views.BudgetSectionApiView.as_view(), name='api-sections'),
+    path('<int:pk>/api/sections/reorder/', views.BudgetSectionReorderApiView.as_view(), name='api-sections-reorder'),
+    path('<int:pk>/api/sections/<int:section_id>/', views.BudgetSectionApiDetailView.as_view(), name='api-section'),
+    path('<int:pk>/api/flush/', views.BudgetAutosaveFlushView.as_view(), name='api-flush'),
     path('<int:pk>/calculate-freight/', views.BudgetCalculateFreightView.as_view(), name='calculate-freight'),
     path('freight-preview/', views.BudgetFreightPreviewView.as_view(), name='freight-preview'),
+    path('<int:pk>/freight-matrix/', views.BudgetFreightMatrixView.as_view(), name='freight-matrix'),
+    path('freight-matrix/', views.BudgetFreightMatrixView.as_view(), name='freight-matrix-preview'),
+    path('live-totals/', views.BudgetLiveTotalsView.as_view(), name='live-totals'),
     path('item-descriptions/', views.ItemDescriptionListCreateView.as_view(), name='item-descriptions'),
     path('item-descriptions/<int:pk>/', views.ItemDescriptionDetailView.as_view(), name='item-descriptions-detail'),
     path('payment-info-templates/', views.PaymentInfoTemplateListCreateView.as_view(), name='payment-info-templates'),
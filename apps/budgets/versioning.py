@@ -0,0 +1,233 @@
+"""
+Compact storage for BudgetVersion snapshots.
+
+Each version row stores its snapshot either as a zlib-compressed *keyframe*
+(the full snapshot) or as a compressed *delta* against the previous version
+of the same budget.  A keyframe is written every KEYFRAME_INTERVAL versions,
+so reading any version decompresses at most one keyframe plus
+KEYFRAME_INTERVAL - 1 deltas.  Rows written before this scheme keep their
+plain JSON in BudgetVersion.snapshot (encoding 'full') and act as keyframes.
+
+Delta format (JSON, one node per changed value):
+
+    ["=", value]                      replace the value
+    ["d", {key: node}, [removed]]     patch a dict
+    ["l", [ids], {id: node}, {id: v}] rebuild a list of dicts keyed by "id"
+                                      (new order, patched rows, added rows)
+"""
+
+import json
+import zlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import models, transaction
+
+KEYFRAME_INTERVAL = getattr(settings, 'BUDGET_VERSION_KEYFRAME_INTERVAL', 10)
+
+
+# ── Compression ─────────────────────────────────────────────────────────────
+
+def compress(data):
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decompress(payload):
+    return json.loads(zlib.decompress(bytes(payload)).decode('utf-8'))
+
+
+# ── Delta encoding ──────────────────────────────────────────────────────────
+
+def _is_keyed_list(value):
+    if not isinstance(value, list):
+        return False
+    ids = [row.get('id') if isinstance(row, dict) else None for row in value]
+    return None not in ids and len(set(map(str, ids))) == len(ids)
+
+
+def diff_snapshots(old, new):
+    """Return the delta node turning *old* into *new*, or None when equal."""
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {}
+        for key, value in new.items():
+            if key not in old:
+                changed[key] = ['=', value]
+                continue
+            node = diff_snapshots(old[key], value)
+            if node is not None:
+                changed[key] = node
+        removed = [key for key in old if key not in new]
+        return ['d', changed, removed]
+    if _is_keyed_list(old) and _is_keyed_list(new):
+        old_rows = {str(row['id']): row for row in old}
+        changed = {}
+        added = {}
+        for row in new:
+            key = str(row['id'])
+            if key not in old_rows:
+                added[key] = row
+                continue
+            node = diff_snapshots(old_rows[key], row)
+            if node is not None:
+                changed[key] = node
+        return ['l', [row['id'] for row in new], changed, added]
+    return ['=', new]
+
+
+def apply_delta(old, node):
+    """Inverse of diff_snapshots(): apply the delta *node* to *old*."""
+    if node is None:
+        return old
+    tag = node[0]
+    if tag == '=':
+        return node[1]
+    if tag == 'd':
+        _, changed, removed = node
+        result = dict(old or {})
+        for key, sub in changed.items():
+            result[key] = apply_delta(result.get(key), sub)
+        for key in removed:
+            result.pop(key, None)
+        return result
+    if tag == 'l':
+        _, order, changed, added = node
+        old_rows = {str(row['id']): row for row in old or []}
+        result = []
+        for row_id in order:
+            key = str(row_id)
+            if key in added:
+                result.append(added[key])
+            else:
+                result.append(apply_delta(old_rows[key], changed.get(key)))
+        return result
+    raise ValueError(f'Unknown snapshot delta node: {tag!r}')
+
+
+# ── Reading ─────────────────────────────────────────────────────────────────
+
+def _decode(version, previous_snapshot):
+    if version.encoding == 'keyframe':
+        return decompress(version.payload)
+    if version.encoding == 'delta':
+        return apply_delta(previous_snapshot, decompress(version.payload))
+    return version.snapshot or {}
+
+
+def _chain(version_model, budget_id, version_number):
+    """Rows needed to rebuild *version_number*: the nearest keyframe up to it."""
+    rows = version_model.objects.filter(budget_id=budget_id, version_number__lte=version_number)
+    start = (
+        rows.exclude(encoding='delta')
+        .order_by('-version_number')
+        .values_list('version_number', flat=True)
+        .first()
+    ) or 0
+    return list(
+        rows.filter(version_number__gte=start)
+        .only('version_number', 'encoding', 'payload', 'snapshot')
+        .order_by('version_number')
+    )
+
+
+def load_snapshot(version):
+    """Reconstruct the full snapshot dict stored by *version*."""
+    if version.encoding != 'delta':
+        return _decode(version, None)
+    snapshot = None
+    for row in _chain(type(version), version.budget_id, version.version_number):
+        snapshot = _decode(row, snapshot)
+    return snapshot or {}
+
+
+def iter_snapshots(versions):
+    """
+    Yield ``(version, snapshot)`` for *versions* of one budget, ordered by
+    version_number, decoding each row once.
+    """
+    snapshot = None
+    for version in versions:
+        snapshot = _decode(version, snapshot)
+        yield version, snapshot
+
+
+# ── Writing ─────────────────────────────────────────────────────────────────
+
+def summary_fields(snapshot):
+    """BudgetVersion summary columns derived from *snapshot*."""
+    sections = snapshot.get('sections') or []
+    try:
+        total = Decimal(str(snapshot['total_with_freight'])).quantize(Decimal('0.01'))
+    except (KeyError, InvalidOperation, ValueError, TypeError):
+        total = None
+    return {
+        'total_with_freight': total,
+        'status': snapshot.get('status') or '',
+        'items_count': (
+            sum(len(section.get('items') or []) for section in sections)
+            + len(snapshot.get('unsectioned_items') or [])
+        ),
+        'sections_count': len(sections),
+    }
+
+
+def encode(snapshot, previous_snapshot=None, deltas_since_keyframe=0):
+    """
+    Return ``(encoding, payload)`` for *snapshot*.
+
+    A keyframe is produced when there is no previous snapshot or the delta
+    chain has reached KEYFRAME_INTERVAL.
+    """
+    if previous_snapshot is None or deltas_since_keyframe + 1 >= KEYFRAME_INTERVAL:
+        return 'keyframe', compress(snapshot)
+    return 'delta', compress(diff_snapshots(previous_snapshot, snapshot))
+
+
+def create_version(budget, snapshot, **fields):
+    """Store *snapshot* as the next BudgetVersion of *budget*, delta-encoded."""
+    from .models import BudgetVersion
+
+    with transaction.atomic():
+        last_number = budget.versions.aggregate(max_v=models.Max('version_number'))['max_v'] or 0
+        chain = _chain(BudgetVersion, budget.pk, last_number) if last_number else []
+        previous = None
+        for _version, previous in iter_snapshots(chain):
+            pass
+        deltas = sum(1 for row in chain if row.encoding == 'delta')
+        encoding, payload = encode(snapshot, previous, deltas)
+        return BudgetVersion.objects.create(
+            budget=budget,
+            version_number=last_number + 1,
+            encoding=encoding,
+            payload=payload,
+            snapshot=None,
+            **summary_fields(snapshot),
+            **fields,
+        )
+
+
+def reencode(versions):
+    """
+    Re-encode *versions* (one budget, ordered by version_number) as a fresh
+    keyframe/delta chain.  *versions* must hold their decoded snapshot in a
+    ``decoded`` attribute.  Returns the rows whose encoding changed, ready
+    for bulk_update(['encoding', 'payload', 'snapshot']).
+    """
+    changed = []
+    previous = None
+    deltas = 0
+    for version in versions:
+        encoding, payload = encode(version.decoded, previous, deltas)
+        deltas = deltas + 1 if encoding == 'delta' else 0
+        previous = version.decoded
+        if (
+            encoding != version.encoding
+            or version.snapshot is not None
+            or bytes(version.payload or b'') != payload
+        ):
+            version.encoding = encoding
+            version.payload = payload
+            version.snapshot = None
+            changed.append(version)
+    return changed
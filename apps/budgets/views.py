@@ -2,6 +2,7 @@
 Budget views for Event Management System.
 """
 
+import hashlib
 import json
 from decimal import Decimal, InvalidOperation
 
@@ -10,19 +11,25 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views import View
-from django.db import models
+from django.db import transaction
 from django.db.models import Q, Max
 from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.utils import timezone
+from django.template.loader import render_to_string
 from django.contrib import messages
 
 from apps.common.mixins import AuditMixin
-from .models import Budget, BudgetItem, BudgetSection, ItemDescription, PaymentInfoTemplate, BudgetNotification, BudgetVersion
+from .models import (
+    Budget, BudgetItem, BudgetSection, BudgetTemplate, ItemDescription, PaymentInfoTemplate, BudgetVersion,
+)
 from .forms import BudgetForm, BudgetSearchForm, BudgetItemFormSet
+from .approval import approve_budget, reject_budget, reset_approval
+from . import autosave, duplication, importer, pricing
+from .persistence import item_fields_from_payload, save_budget_sections
+from .versioning import create_version
 
 
-# ── Helper: save sections + items from JSON payload ─────────────────────────
+# ── Helpers: version snapshots + sections JSON ─────────────────────────────
 
 
 def _snapshot_budget(budget):
@@ -78,6 +85,7 @@ def _snapshot_budget(budget):
         'status': budget.status,
         'approval_status': budget.approval_status,
         'freight_cost': _dec(budget.freight_cost),
+        'freight_calculated': budget.freight_calculated,
         'freight_distance_km': _dec(budget.freight_distance_km),
         'freight_urgency_id': budget.freight_urgency_id,
         'include_fiscal_charges': budget.include_fiscal_charges,
@@ -92,229 +100,89 @@ def _snapshot_budget(budget):
 
 
 def _create_budget_version(budget, user=None, label=''):
-    """Persist a BudgetVersion snapshot for the current state of *budget*."""
-    last_version = budget.versions.aggregate(
-        max_v=models.Max('version_number'))['max_v'] or 0
-    BudgetVersion.objects.create(
-        budget=budget,
-        version_number=last_version + 1,
-        label=label,
-        snapshot=_snapshot_budget(budget),
-        created_by=user,
-    )
+    """Persist a (delta-encoded) BudgetVersion for the current state of *budget*."""
+    create_version(budget, _snapshot_budget(budget), label=label, created_by=user)
 
 
-def _save_sections_from_json(budget, sections_data_json):
-    """
-    Parse the sections_data JSON string submitted via the budget form
-    and persist sections + items to the database.
-
-    JSON structure expected::
-
-        [
-          {
-            "id": 1,           // existing section pk, null for new
-            "title": "Estrutura",
-            "items": [
-              {
-                "id": 5,       // existing item pk, null for new
-                "delete": false,
-                "name": "Painel 3×3",
-                "description": "",
-                "quantity": 2,
-                "dim_length": "3",
-                "dim_width": "3",
-                "dim_height": "0.04",
-                "measurement": "",
-                "measurement_unit": "",
-                "weight": "12",
-                "unit_price": "500.00"
-              }
-            ]
-          }
-        ]
-    """
-    try:
-        sections_data = json.loads(sections_data_json or '[]')
-    except (json.JSONDecodeError, ValueError):
-        sections_data = []
+def _item_to_json(item):
+    """Serialize one BudgetItem the way the form's addItem() expects it."""
+    return {
+        'id': item.pk,
+        'name': item.name,
+        'description': item.description or '',
+        'description_ref_id': item.description_ref_id,
+        'quantity': item.quantity,
+        'dim_length': str(item.dim_length) if item.dim_length else '',
+        'dim_width': str(item.dim_width) if item.dim_width else '',
+        'dim_height': str(item.dim_height) if item.dim_height else '',
+        'measurement': str(item.measurement) if item.measurement else '',
+        'measurement_unit': item.measurement_unit or '',
+        'weight': str(item.weight) if item.weight else '',
+        'unit_price': str(item.unit_price),
+        'total': str(item.total_price),  # ← Include total to prevent recalculation
+        'billing_type': item.billing_type or 'qty',
+        'subitems': item.subitems_data or [],
+        'include_fiscal': item.include_fiscal,
+        'observations': item.observations or '',
+    }
 
-    def to_decimal(val, default=None):
-        if val is None or str(val).strip() == '':
-            return default
-        try:
-            return Decimal(str(val))
-        except (InvalidOperation, ValueError):
-            return default
 
-    kept_section_ids = set()
+# Above this many items the edit form gets a section outline and loads the
+# items of each section on demand (BudgetSectionItemsView).
+LAZY_SECTIONS_MIN_ITEMS = 200
 
-    for order_idx, sec_data in enumerate(sections_data):
-        title = (sec_data.get('title') or '').strip()
-        if not title:
-            title = f'Seção {order_idx + 1}'
 
-        section_id = sec_data.get('id')
-        if section_id:
-            section = BudgetSection.objects.filter(pk=section_id, budget=budget).first()
-            if section:
-                section.title = title
-                section.order = order_idx
-                section.save(update_fields=['title', 'order'])
-            else:
-                section = BudgetSection.objects.create(budget=budget, title=title, order=order_idx)
-        else:
-            section = BudgetSection.objects.create(budget=budget, title=title, order=order_idx)
-
-        kept_section_ids.add(section.pk)
-
-        kept_item_ids = set()
-        for item_data in sec_data.get('items', []):
-            if item_data.get('delete'):
-                item_id = item_data.get('id')
-                if item_id:
-                    BudgetItem.objects.filter(pk=item_id, budget=budget).delete()
-                continue
-
-            item_name = (item_data.get('name') or '').strip()
-            if not item_name:
-                continue
-
-            # ── Handle total price directly from form (prefer explicit total over recalculation) ──
-            total_price = to_decimal(item_data.get('total'))
-            unit_price = to_decimal(item_data.get('unit_price'), Decimal('0'))
-            
-            # If total is provided explicitly, use it directly (don't recalculate)
-            # This prevents rounding errors when editing items with specific totals
-            if total_price is not None and total_price > 0:
-                # Keep the provided total, don't recalculate from unit_price
-                final_total = total_price
-            else:
-                # If no total provided, recalculate from unit_price × qty (new items)
-                final_total = None  # Will be calculated in model.save()
-            
-            dim_length = to_decimal(item_data.get('dim_length'))
-            dim_width = to_decimal(item_data.get('dim_width'))
-            dim_height = to_decimal(item_data.get('dim_height'))
-
-            billing_type = item_data.get('billing_type') or 'qty'
-            if billing_type not in ('qty', 'meter'):
-                billing_type = 'qty'
-
-            subitems = item_data.get('subitems')
-            if subitems and not isinstance(subitems, list):
-                subitems = None
-
-            item_fields = {
-                'budget': budget,
-                'section': section,
-                'name': item_name,
-                'description': item_data.get('description') or '',
-                'description_ref_id': item_data.get('description_ref_id') or None,
-                'quantity': int(item_data.get('quantity') or 1),
-                'dim_length': dim_length,
-                'dim_width': dim_width,
-                'dim_height': dim_height,
-                'measurement': to_decimal(item_data.get('measurement')),
-                'measurement_unit': item_data.get('measurement_unit') or '',
-                'weight': to_decimal(item_data.get('weight')),
-                'unit_price': unit_price,
-                'total_price': final_total or Decimal('0'),  # Set explicitly if provided
-                'billing_type': billing_type,
-                'subitems_data': subitems or None,
-                'is_approved': True,
-                'include_fiscal': bool(item_data.get('include_fiscal', False)),
-                'observations': item_data.get('observations') or '',
-            }
+def _sections_outline(budget):
+    """
+    Sections of *budget* without their items: id, title, item count and the
+    stored subtotal / fiscal base (one aggregate query for all sections).
+    """
+    totals = {
+        row['section_id']: row
+        for row in BudgetItem.objects.filter(budget=budget, section__isnull=False).totals_by('section_id')
+    }
+    outline = []
+    for section in budget.sections.order_by('order', 'pk'):
+        row = totals.get(section.pk, {})
+        outline.append({
+            'id': section.pk,
+            'title': section.title,
+            'lazy': True,
+            'items_count': row.get('items_count', 0),
+            'subtotal': str(row.get('items_total', 0)),
+            'fiscal_base': str(row.get('items_fiscal_base', 0)),
+        })
+    return outline
+
 
-            item_id = item_data.get('id')
-            if item_id:
-                item = BudgetItem.objects.filter(pk=item_id, budget=budget).first()
-                if item:
-                    for k, v in item_fields.items():
-                        setattr(item, k, v)
-                    # If an explicit total was provided, mark it so save() doesn't recalculate
-                    if total_price is not None and total_price > 0:
-                        item._skip_total_recalc = True
-                    item.save()
-                else:
-                    item = BudgetItem(**item_fields)
-                    item.save()
-            else:
-                item = BudgetItem(**item_fields)
-                item.save()
-
-            kept_item_ids.add(item.pk)
-
-        # Delete items inside this section that were removed from the form
-        section.section_items.exclude(pk__in=kept_item_ids).delete()
-
-    # Delete sections that were removed on the form
-    budget.sections.exclude(pk__in=kept_section_ids).delete()
-
-
-def _sections_to_json(budget):
+def _sections_to_json(budget, lazy=None):
     """
     Serialize existing sections + items of a budget to JSON
     so the edit form can pre-populate the sections UI.
+
+    Large budgets (see LAZY_SECTIONS_MIN_ITEMS) get an outline instead and
+    the form fetches each section's items when it is opened.
     """
-    data = []
-    for section in budget.sections.prefetch_related('section_items').all():
-        items = []
-        for item in section.section_items.all():
-            items.append({
-                'id': item.pk,
-                'name': item.name,
-                'description': item.description or '',
-                'description_ref_id': item.description_ref_id,
-                'quantity': item.quantity,
-                'dim_length': str(item.dim_length) if item.dim_length else '',
-                'dim_width': str(item.dim_width) if item.dim_width else '',
-                'dim_height': str(item.dim_height) if item.dim_height else '',
-                'measurement': str(item.measurement) if item.measurement else '',
-                'measurement_unit': item.measurement_unit or '',
-                'weight': str(item.weight) if item.weight else '',
-                'unit_price': str(item.unit_price),
-                'total': str(item.total_price),  # ← Include total to prevent recalculation
-                'billing_type': item.billing_type or 'qty',
-                'subitems': item.subitems_data or [],
-                'include_fiscal': item.include_fiscal,
-                'observations': item.observations or '',
+    if lazy is None:
+        lazy = budget.items_count > LAZY_SECTIONS_MIN_ITEMS
+    if lazy:
+        data = _sections_outline(budget)
+    else:
+        data = []
+        for section in budget.sections.prefetch_related('section_items').all():
+            data.append({
+                'id': section.pk,
+                'title': section.title,
+                'items': [_item_to_json(item) for item in section.section_items.all()],
             })
-        data.append({
-            'id': section.pk,
-            'title': section.title,
-            'items': items,
-        })
 
     # Budgets that have items but no sections (legacy) → synthesise one section
     unsectioned = budget.items.filter(section__isnull=True)
     if unsectioned.exists():
-        items = []
-        for item in unsectioned.all():
-            items.append({
-                'id': item.pk,
-                'name': item.name,
-                'description': item.description or '',
-                'description_ref_id': item.description_ref_id,
-                'quantity': item.quantity,
-                'dim_length': str(item.dim_length) if item.dim_length else '',
-                'dim_width': str(item.dim_width) if item.dim_width else '',
-                'dim_height': str(item.dim_height) if item.dim_height else '',
-                'measurement': str(item.measurement) if item.measurement else '',
-                'measurement_unit': item.measurement_unit or '',
-                'weight': str(item.weight) if item.weight else '',
-                'unit_price': str(item.unit_price),
-                'total': str(item.total_price),  # ← Include total to prevent recalculation
-                'billing_type': item.billing_type or 'qty',
-                'subitems': item.subitems_data or [],
-                'include_fiscal': item.include_fiscal,
-                'observations': item.observations or '',
-            })
         data.insert(0, {
             'id': None,
             'title': 'Itens',
-            'items': items,
+            'items': [_item_to_json(item) for item in unsectioned.all()],
         })
 
     return json.dumps(data)
@@ -329,27 +197,20 @@ class BudgetListView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         """Filter budgets based on search query."""
-        queryset = Budget.objects.select_related('proposal', 'proposal__event', 'created_by', 'updated_by').all()
-        
-        # Search functionality
+        queryset = Budget.objects.select_related(
+            'proposal', 'proposal__event', 'created_by', 'updated_by'
+        ).with_totals()
+
+        # Search, status and project filters (shared with the export)
         search = self.request.GET.get('search', '').strip()
+        queryset = queryset.filter_listing(
+            search=search,
+            status=self.request.GET.get('status', ''),
+            proposal=self.request.GET.get('proposal', ''),
+        )
+
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(proposal__title__icontains=search) |
-                Q(proposal__event__name__icontains=search)
-            )
-        
-        # Filter by status
-        status = self.request.GET.get('status', '').strip()
-        if status:
-            queryset = queryset.filter(status=status)
-        
-        # Filter by proposal
-        proposal = self.request.GET.get('proposal', '').strip()
-        if proposal:
-            queryset = queryset.filter(proposal_id=proposal)
-        
+            return queryset.order_by('-search_rank', '-created_at')
         return queryset.order_by('-created_at')
     
     def get_context_data(self, **kwargs):
@@ -362,6 +223,37 @@ class BudgetListView(LoginRequiredMixin, ListView):
         return context
 
 
+class BudgetExportView(LoginRequiredMixin, View):
+    """
+    Stream the budgets matching the list filters as CSV or XLSX.
+
+    Query params: ``format`` (csv | xlsx), ``scope`` (items | budgets) plus the
+    BudgetListView filters ``search``, ``status`` and ``proposal``.
+    """
+
+    def get(self, request):
+        from django.http import StreamingHttpResponse
+        from .export import CONTENT_TYPES, FORMATS, SCOPES, export_filename, stream_export
+
+        export_format = request.GET.get('format', 'csv')
+        scope = request.GET.get('scope', 'items')
+        if export_format not in FORMATS or scope not in SCOPES:
+            return JsonResponse({'error': 'Formato ou escopo inválido.'}, status=400)
+
+        budgets = Budget.objects.filter_listing(
+            search=request.GET.get('search', ''),
+            status=request.GET.get('status', ''),
+            proposal=request.GET.get('proposal', ''),
+        )
+        response = StreamingHttpResponse(
+            stream_export(budgets, export_format, scope),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(export_format, scope)}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+
 class BudgetDetailView(LoginRequiredMixin, DetailView):
     """Display budget details and related data."""
     
@@ -392,6 +284,9 @@ class BudgetDetailView(LoginRequiredMixin, DetailView):
             {'name': self.object.name, 'url': None}
         ]
         context['urgency_options'] = UrgencyMultiplier.objects.order_by('multiplier')
+        if self.object.freight_distance_km is None:
+            from apps.logistics.geo import estimate_budget_distance
+            context['estimated_distance_km'] = estimate_budget_distance(self.object)
         return context
 
 
@@ -429,13 +324,10 @@ class BudgetCreateView(LoginRequiredMixin, AuditMixin, SuccessMessageMixin, Crea
         context['sections_json'] = '[]'
         context['extra_charges_json'] = '{}'
 
-        # Pass item descriptions for the select dropdown
-        context['item_descriptions_json'] = json.dumps(
-            list(ItemDescription.objects.values('id', 'title', 'body'))
-        )
-        context['payment_info_templates_json'] = json.dumps(
-            list(PaymentInfoTemplate.objects.values('id', 'title', 'body'))
-        )
+        # Library entries already in use; the rest is searched on demand
+        descriptions, payment_templates = _library_seed(None)
+        context['item_descriptions_json'] = json.dumps(descriptions)
+        context['payment_info_templates_json'] = json.dumps(payment_templates)
 
         return context
 
@@ -445,7 +337,7 @@ class BudgetCreateView(LoginRequiredMixin, AuditMixin, SuccessMessageMixin, Crea
         # self.object is set by ModelFormMixin.form_valid after form.save().
         response = super().form_valid(form)
         sections_data_json = self.request.POST.get('sections_data', '')
-        _save_sections_from_json(self.object, sections_data_json)
+        save_budget_sections(self.object, sections_data_json)
         # Save extra charges
         try:
             extra_charges = json.loads(self.request.POST.get('extra_charges_data', '{}') or '{}')
@@ -492,13 +384,10 @@ class BudgetUpdateView(LoginRequiredMixin, AuditMixin, SuccessMessageMixin, Upda
         context['sections_json'] = _sections_to_json(self.object)
         context['extra_charges_json'] = json.dumps(self.object.extra_charges or {})
 
-        # Pass item descriptions for the select dropdown
-        context['item_descriptions_json'] = json.dumps(
-            list(ItemDescription.objects.values('id', 'title', 'body'))
-        )
-        context['payment_info_templates_json'] = json.dumps(
-            list(PaymentInfoTemplate.objects.values('id', 'title', 'body'))
-        )
+        # Library entries already in use; the rest is searched on demand
+        descriptions, payment_templates = _library_seed(self.object)
+        context['item_descriptions_json'] = json.dumps(descriptions)
+        context['payment_info_templates_json'] = json.dumps(payment_templates)
 
         return context
 
@@ -515,12 +404,9 @@ class BudgetUpdateView(LoginRequiredMixin, AuditMixin, SuccessMessageMixin, Upda
                 label=self.request.POST.get('version_label', '').strip(),
             )
 
-        # Check if budget was approved before saving so we can reset it afterwards
-        was_approved = self.object.approval_status == 'approved'
-
         response = super().form_valid(form)
         sections_data_json = self.request.POST.get('sections_data', '')
-        _save_sections_from_json(self.object, sections_data_json)
+        save_budget_sections(self.object, sections_data_json)
         # Save extra charges
         try:
             extra_charges = json.loads(self.request.POST.get('extra_charges_data', '{}') or '{}')
@@ -533,31 +419,21 @@ class BudgetUpdateView(LoginRequiredMixin, AuditMixin, SuccessMessageMixin, Upda
             self.object.freight_cost = Decimal(self.request.POST.get('freight_cost') or 0)
         except (InvalidOperation, ValueError):
             self.object.freight_cost = Decimal('0')
-        self.object.save(update_fields=['extra_charges', 'freight_cost'])
+        # A freight typed over the calculated one is manual from now on
+        if self.object.freight_cost != form.initial.get('freight_cost'):
+            self.object.freight_calculated = False
+        self.object.save(update_fields=['extra_charges', 'freight_cost', 'freight_calculated'])
 
         # If the budget was previously approved, reset approval so the client
         # can review and re-approve the updated version.
-        if was_approved:
-            self.object.approval_status = 'pending'
-            self.object.approved_at = None
-            self.object.client_notes = ''
-            if self.object.status == 'confirmed':
-                self.object.status = 'sent'
-            self.object.save(update_fields=['approval_status', 'approved_at', 'client_notes', 'status'])
-            # Reset per-item approval so the selection panel reopens for the client
-            self.object.items.all().update(is_approved=False)
-            # Reset linked Service Order back to pending
-            try:
-                so = self.object.service_order
-                if so and so.status == 'approved':
-                    so.status = 'pending'
-                    so.save(update_fields=['status'])
-            except Exception:
-                pass
+        reset_approval(self.object)
 
         # Re-sync items to Service Order after edit (without financial values)
         from apps.budgets.signals import sync_service_order_items
         sync_service_order_items(self.object)
+        # Open autosave sessions are now outdated (their next write gets a 409)
+        autosave.mark_saved(self.object)
+        autosave.end_edit(self.object, self.request.user)
         return response
 
 
@@ -600,41 +476,209 @@ class BudgetDeleteView(LoginRequiredMixin, DeleteView):
         return HttpResponseRedirect(reverse_lazy('budgets:detail', kwargs={'pk': budget.pk}))
 
 
+# ── Duplication and templates ──────────────────────────────────────────────
+
+class BudgetDuplicateView(LoginRequiredMixin, View):
+    """POST /budgets/<pk>/duplicate/ → copy the budget and open the copy for editing."""
+
+    def post(self, request, pk):
+        budget = get_object_or_404(Budget, pk=pk)
+        copy = duplication.duplicate_budget(
+            budget, name=request.POST.get('name', '').strip() or None, user=request.user,
+        )
+        messages.success(request, f'Proposta duplicada como "{copy.name}".')
+        return redirect('budgets:edit', pk=copy.pk)
+
+
+class BudgetSaveTemplateView(LoginRequiredMixin, View):
+    """POST /budgets/<pk>/save-template/ → store the budget as a reusable template."""
+
+    def post(self, request, pk):
+        budget = get_object_or_404(Budget, pk=pk)
+        template = duplication.save_as_template(
+            budget,
+            name=request.POST.get('name', '').strip() or None,
+            description=request.POST.get('description', '').strip(),
+            user=request.user,
+        )
+        messages.success(request, f'Modelo "{template.name}" salvo com {template.items_count} itens.')
+        return redirect('budgets:templates')
+
+
+class BudgetImportItemsView(LoginRequiredMixin, View):
+    """
+    POST /budgets/<pk>/import-items/ (multipart) → add the items of a CSV/XLSX
+    spreadsheet to the budget.
+
+    Fields: ``file``; optional ``section`` (for rows without one), ``partial``
+    (import the valid rows, skip the rest) and ``dry_run`` (validate only).
+    Answers ``{created, sections_created, errors: [{line, message}]}``, with
+    HTTP 400 when the file was rejected and 409 when the budget was already
+    approved or rejected (only pending proposals take imports).
+    """
+
+    def post(self, request, pk):
+        budget = get_object_or_404(Budget, pk=pk)
+        if not budget.is_editable:
+            return JsonResponse({
+                'error': 'Só é possível importar itens em propostas com aprovação pendente.',
+                'created': 0, 'errors': [],
+            }, status=409)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'error': 'Envie a planilha no campo "file".'}, status=400)
+        partial = request.POST.get('partial') in ('1', 'true', 'on')
+        dry_run = request.POST.get('dry_run') in ('1', 'true', 'on')
+
+        try:
+            with transaction.atomic():
+                if not dry_run:
+                    _create_budget_version(budget, user=request.user, label='Antes da importação')
+                report = importer.import_items(
+                    budget,
+                    upload,
+                    filename=upload.name,
+                    default_section=request.POST.get('section', '').strip() or importer.DEFAULT_SECTION,
+                    partial=partial,
+                    dry_run=dry_run,
+                )
+                if not report.created and not dry_run:
+                    # Nothing imported: drop the version snapshot as well
+                    transaction.set_rollback(True)
+                elif report.created:
+                    from .signals import sync_service_order_items
+                    sync_service_order_items(budget)
+                    autosave.mark_saved(budget)
+        except importer.SpreadsheetError as exc:
+            return JsonResponse({'error': str(exc), 'created': 0, 'errors': []}, status=400)
+
+        rejected = report.errors and not report.created and not dry_run
+        return JsonResponse(report.as_dict(), status=400 if rejected else 200)
+
+
+class BudgetTemplateListView(LoginRequiredMixin, ListView):
+    """List the proposal templates."""
+
+    model = BudgetTemplate
+    template_name = 'budgets/budget_template_list.html'
+    context_object_name = 'templates'
+    paginate_by = 20
+
+    def get_queryset(self):
+        # The content JSON is only needed to instantiate a template
+        return BudgetTemplate.objects.defer('data').select_related('source_budget', 'created_by')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['breadcrumbs'] = [
+            {'name': 'Propostas', 'url': reverse_lazy('budgets:list')},
+            {'name': 'Modelos', 'url': None},
+        ]
+        return context
+
+
+class BudgetTemplateUseView(LoginRequiredMixin, View):
+    """POST /budgets/templates/<pk>/use/ → new budget from the template, opened for editing."""
+
+    def post(self, request, pk):
+        template = get_object_or_404(BudgetTemplate, pk=pk)
+        proposal_id = request.POST.get('proposal') or None
+        budget = duplication.instantiate_template(
+            template,
+            name=request.POST.get('name', '').strip() or None,
+            proposal_id=int(proposal_id) if str(proposal_id or '').isdigit() else None,
+            user=request.user,
+        )
+        messages.success(request, f'Proposta "{budget.name}" criada a partir do modelo.')
+        return redirect('budgets:edit', pk=budget.pk)
+
+
+class BudgetTemplateDeleteView(LoginRequiredMixin, View):
+    """POST /budgets/templates/<pk>/delete/"""
+
+    def post(self, request, pk):
+        template = get_object_or_404(BudgetTemplate, pk=pk)
+        template.delete()
+        messages.success(request, f'Modelo "{template.name}" excluído.')
+        return redirect('budgets:templates')
+
+
 # Public Budget Approval Views
 
+def _public_budget_queryset():
+    """Budgets with the latest version number and the rows shown preloaded for public_cache_key()."""
+    return Budget.objects.select_related('proposal__event__client').annotate(
+        latest_version_number=Max('versions__version_number'),
+    )
+
+
 class PublicBudgetApprovalView(View):
     """
     Public view for clients to review and approve/reject budget.
     No login required - accessed via unique token.
     """
     template_name = 'budgets/public_approval.html'
-    
+
+    # Rendered pages are cached under the budget's public_cache_key(), which
+    # changes with every edit or approval, so entries never need purging.
+    cache_timeout = 60 * 60 * 24
+    csrf_placeholder = '__public-approval-csrf-token__'
+
     def get(self, request, token):
-        """Display budget for approval."""
-        budget = get_object_or_404(Budget, approval_token=token)
+        """Display budget for approval (304 / cached HTML for repeat visits)."""
+        from django.core.cache import cache
+        from django.http import HttpResponse
+        from django.middleware.csrf import get_token
+        from django.utils.cache import get_conditional_response
+        from django.utils.http import http_date, quote_etag
+
+        budget = get_object_or_404(_public_budget_queryset(), approval_token=token)
+
+        # Flash messages after a POST make the page request-specific
+        has_messages = len(messages.get_messages(request)) > 0
+        if has_messages:
+            return render(request, self.template_name, self.get_context_data(budget))
+
+        key = budget.public_cache_key()
+        etag = quote_etag(key)
+        updated_at = budget.public_updated_at()
+        last_modified = int(updated_at.timestamp()) if updated_at else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = f'budgets:public-approval:{key}'
+        html = cache.get(cache_key)
+        if html is None:
+            # Rendered without the request so the cached copy holds nothing
+            # visitor-specific; the CSRF token is filled in per response.
+            context = self.get_context_data(budget)
+            context['csrf_token'] = self.csrf_placeholder
+            html = render_to_string(self.template_name, context)
+            cache.set(cache_key, html, self.cache_timeout)
+
+        response = HttpResponse(html.replace(self.csrf_placeholder, get_token(request)))
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
+    def get_context_data(self, budget):
         sections = budget.sections.prefetch_related('section_items').all()
         # Fall back to unsectioned items if no sections defined
         unsectioned_items = budget.items.filter(section__isnull=True)
 
-        # The version history stores snapshots of the state *before* each edit.
-        # So the current live state is always one version ahead of the latest snapshot.
-        # 0 snapshots → current is v1 (I)
-        # 1 snapshot  → current is v2 (II), etc.
-        latest_version = budget.versions.order_by('-version_number').values_list('version_number', flat=True).first()
-        current_version_number = (latest_version or 0) + 1
-
-        context = {
+        return {
             'budget': budget,
             'sections': sections,
             'unsectioned_items': unsectioned_items,
             'is_editable': budget.is_editable,
             'show_pdf_button': True,
-            'current_version_number': current_version_number,
+            # The live state is one version ahead of the latest snapshot
+            'current_version_number': budget.current_version_number,
         }
 
-        return render(request, self.template_name, context)
-    
     def post(self, request, token):
         """Handle approval/rejection submission."""
         budget = get_object_or_404(Budget, approval_token=token)
@@ -645,166 +689,453 @@ class PublicBudgetApprovalView(View):
             return redirect('budgets:public_approval', token=token)
         
         action = request.POST.get('action')
-        
-        if action == 'approve':
-            # Get selected items
-            selected_items = request.POST.getlist('items')
-            
-            # Update approval status for all items
-            for item in budget.items.all():
-                item.is_approved = str(item.id) in selected_items
-                item.save()
-            
-            # Freight opt-in
-            budget.freight_included = request.POST.get('include_freight') == '1'
-
-            # Update budget status
-            budget.approval_status = 'approved'
-            budget.approved_at = timezone.now()
-            budget.client_notes = request.POST.get('notes', '')
-            budget.status = 'approved'
-            budget.save()
-
-            # Advance linked Service Order to "approved"
-            try:
-                so = budget.service_order
-                if so and so.status == 'pending':
-                    so.status = 'approved'
-                    so.save(update_fields=['status'])
-            except Exception:
-                pass
-
-            # Sync SO items to reflect only the client-selected items
-            from apps.budgets.signals import sync_service_order_items
-            sync_service_order_items(budget)
 
+        if action == 'approve':
+            selected_items = [
+                int(value) for value in request.POST.getlist('items') if value.isdigit()
+            ]
+            approve_budget(
+                budget,
+                selected_items,
+                include_freight=request.POST.get('include_freight') == '1',
+                notes=request.POST.get('notes', ''),
+            )
             messages.success(request, 'Proposta aprovada com sucesso!')
 
-            # Create internal notification
-            BudgetNotification.objects.create(budget=budget, action='approved')
-
         elif action == 'reject':
-            # Mark budget as rejected
-            budget.approval_status = 'rejected'
-            budget.approved_at = timezone.now()
-            budget.client_notes = request.POST.get('notes', '')
-            budget.status = 'rejected'
-            budget.save()
-
-            # Reset linked Service Order back to pending
-            try:
-                so = budget.service_order
-                if so and so.status == 'approved':
-                    so.status = 'pending'
-                    so.save(update_fields=['status'])
-            except Exception:
-                pass
-
+            reject_budget(budget, notes=request.POST.get('notes', ''))
             messages.info(request, 'Proposta rejeitada.')
 
-            # Create internal notification
-            BudgetNotification.objects.create(budget=budget, action='rejected')
-
         return redirect('budgets:public_approval', token=token)
 
 
 class PublicBudgetPDFView(View):
-    """Generate PDF for budget - public access via token."""
-    
+    """
+    Serve the budget PDF - public access via token.
+
+    The document is rendered once per budget state (see budgets.pdf) and
+    served from storage with ETag / Last-Modified validators.
+    """
+
     def get(self, request, token):
-        """Generate and return PDF."""
-        budget = get_object_or_404(Budget, approval_token=token)
-        
-        # Import here to avoid issues if reportlab not installed yet
+        """Return the stored PDF, a 304, or a 202 while a worker renders it."""
+        from django.core.files.storage import default_storage
+        from django.http import FileResponse, HttpResponse
+        from django.utils.cache import get_conditional_response
+        from django.utils.http import http_date, quote_etag
+        from .pdf import get_budget_pdf, pdf_cache_key
+
+        budget = get_object_or_404(_public_budget_queryset(), approval_token=token)
+
+        etag = quote_etag(pdf_cache_key(budget))
+        updated_at = budget.public_updated_at()
+        last_modified = int(updated_at.timestamp()) if updated_at else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
         try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib import colors
-            from reportlab.lib.units import cm
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from django.http import HttpResponse
-            from io import BytesIO
+            path = get_budget_pdf(budget)
         except ImportError:
             messages.error(request, 'Sistema de geração de PDF não está disponível.')
             return redirect('budgets:public_approval', token=token)
-        
-        # Create PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#000000'),
-            spaceAfter=30,
+
+        if path is None:
+            response = HttpResponse(
+                '<html><head><meta http-equiv="refresh" content="3"></head>'
+                '<body>Gerando PDF, aguarde...</body></html>',
+                status=202,
+            )
+            response['Retry-After'] = '3'
+            return response
+
+        response = FileResponse(
+            default_storage.open(path, 'rb'),
+            content_type='application/pdf',
+            as_attachment=True,
+            filename=f'orcamento_{budget.id}.pdf',
         )
-        elements.append(Paragraph(f'Proposta: {budget.name}', title_style))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Budget info
-        info_style = styles['Normal']
-        if budget.proposal_id:
-            elements.append(Paragraph(f'<b>Projeto:</b> {budget.proposal.title}', info_style))
-        elements.append(Paragraph(f'<b>Status:</b> {budget.get_approval_status_display()}', info_style))
-        if budget.approved_at:
-            elements.append(Paragraph(f'<b>Data de Aprovação:</b> {budget.approved_at.strftime("%d/%m/%Y %H:%M")}', info_style))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Items table
-        table_data = [['Item', 'Qtd', 'Valor Unit.', 'Total', 'Status']]
-        
-        for item in budget.items.all():
-            status = 'Aprovado' if item.is_approved else 'Não Aprovado'
-            if budget.is_editable:
-                status = 'Pendente'
-            
-            table_data.append([
-                item.name,
-                str(item.quantity),
-                f'R$ {item.unit_price:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'),
-                f'R$ {item.total_price:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'),
-                status
-            ])
-        
-        # Total row
-        total = budget.approved_value if not budget.is_editable else budget.total_value
-        table_data.append(['', '', '', f'R$ {total:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), ''])
-        
-        table = Table(table_data, colWidths=[8*cm, 2*cm, 3*cm, 3*cm, 3*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.black),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        
-        elements.append(table)
-        
-        # Client notes
-        if budget.client_notes:
-            elements.append(Spacer(1, 0.5*cm))
-            elements.append(Paragraph('<b>Observações do Cliente:</b>', styles['Heading2']))
-            elements.append(Paragraph(budget.client_notes, info_style))
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Return response
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="orcamento_{budget.id}.pdf"'
-        
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
 
+# ── Lazy section loading (edit form) ───────────────────────────────────────
+
+class BudgetSectionItemsView(LoginRequiredMixin, View):
+    """
+    GET /budgets/<pk>/sections/<section_id>/items/?after=<item id>&limit=<n>
+
+    One page of a section's items, serialized like the inline form data,
+    plus ``next_cursor`` (null on the last page).
+    """
+
+    page_size = 100
+    max_page_size = 500
+
+    def get(self, request, pk, section_id):
+        section = get_object_or_404(BudgetSection, pk=section_id, budget_id=pk)
+        try:
+            limit = min(max(int(request.GET.get('limit', self.page_size)), 1), self.max_page_size)
+            after = int(request.GET.get('after', 0))
+        except ValueError:
+            return JsonResponse({'error': 'Parâmetros de paginação inválidos.'}, status=400)
+
+        items = list(section.section_items.filter(pk__gt=after).order_by('pk')[:limit + 1])
+        has_more = len(items) > limit
+        items = items[:limit]
+        return JsonResponse({
+            'items': [_item_to_json(item) for item in items],
+            'next_cursor': items[-1].pk if has_more else None,
+        })
+
+
+# ── Autosave API ────────────────────────────────────────────────────────────
+#
+# Row-level writes used by the form's autosave.  Every write must carry the
+# budget revision it was made against (``If-Match: "<revision>"`` header or a
+# ``revision`` key in the JSON body); see budgets.autosave.
+
+# Item keys that change the computed total when sent without an explicit one
+_PRICING_KEYS = frozenset(
+    ('quantity', 'unit_price', 'billing_type', 'measurement', 'dim_length', 'dim_width', 'dim_height')
+)
+
+
+class _AutosaveError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _autosave_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, ValueError):
+        raise _AutosaveError('JSON inválido.')
+    if not isinstance(data, dict):
+        raise _AutosaveError('JSON inválido.')
+    return data
+
+
+def _autosave_section(budget, section_id):
+    section = BudgetSection.objects.filter(pk=section_id, budget=budget).first() if section_id else None
+    if section is None:
+        raise _AutosaveError('Seção inválida.')
+    return section
+
+
+def _autosave_response(request, pk, write, status=200):
+    """
+    Run ``write(budget, data)`` under the budget's revision check and answer
+    with its payload plus the new revision and the budget totals.  Editing
+    an approved budget reopens its approval, as the full form save does.
+    """
+    budget = get_object_or_404(Budget, pk=pk)
+    try:
+        data = _autosave_body(request) if request.body else {}
+        expected = autosave.parse_revision(request.headers.get('If-Match', data.get('revision')))
+        if expected is None:
+            raise _AutosaveError('Informe a revisão da proposta (If-Match).', status=428)
+        with transaction.atomic():
+            revision = autosave.claim_revision(budget, expected)
+            started = autosave.begin_edit(budget, request.user)
+            try:
+                payload = write(budget, data)
+            except Exception:
+                if started:  # its version is rolled back with the write
+                    autosave.end_edit(budget, request.user)
+                raise
+            # Same rule as the full form save: an edited approval is reopened
+            if reset_approval(budget):
+                payload['approval_reset'] = True
+            autosave.schedule_service_order_sync(budget)
+    except autosave.RevisionConflict as conflict:
+        return JsonResponse({
+            'error': 'A proposta foi alterada em outra sessão. Recarregue a página.',
+            'revision': conflict.current,
+        }, status=409)
+    except _AutosaveError as error:
+        return JsonResponse({'error': error.message}, status=error.status)
+
+    totals = budget.priced()
+    payload.update({
+        'revision': revision,
+        'totals': {
+            'items_total': str(totals.items.items_total),
+            'items_count': totals.items.items_count,
+            'total': str(Decimal(totals.total_with_freight).quantize(Decimal('0.01'))),
+        },
+    })
+    response = JsonResponse(payload, status=status)
+    response['ETag'] = f'"{revision}"'
+    return response
+
+
+def _autosave_item_fields(data):
+    try:
+        return item_fields_from_payload(data)
+    except (TypeError, ValueError):
+        raise _AutosaveError('Dados do item inválidos.')
+
+
+def _autosave_item_json(item):
+    return {**_item_to_json(item), 'section_id': item.section_id}
+
+
+def _autosave_section_json(section):
+    return {'id': section.pk, 'title': section.title, 'order': section.order}
+
+
+class BudgetItemApiView(LoginRequiredMixin, View):
+    """
+    POST /budgets/<pk>/api/items/  → create an item ({"section_id": …, item fields})
+
+    Item fields are the ones of the form's sections_data items.
+    """
+
+    def post(self, request, pk):
+        def write(budget, data):
+            section = _autosave_section(budget, data.get('section_id'))
+            fields, keep_total = _autosave_item_fields(data)
+            item = BudgetItem(budget=budget, section=section, **fields)
+            item._skip_total_recalc = keep_total
+            item.save()
+            return {'item': _autosave_item_json(item)}
+
+        return _autosave_response(request, pk, write, status=201)
+
+
+class BudgetItemApiDetailView(LoginRequiredMixin, View):
+    """
+    PATCH  /budgets/<pk>/api/items/<item_id>/  → update the fields sent (a new
+           ``section_id`` moves the item); the total is recalculated when a
+           pricing field changes without an explicit ``total``
+    DELETE /budgets/<pk>/api/items/<item_id>/
+    """
+
+    def patch(self, request, pk, item_id):
+        def write(budget, data):
+            item = get_object_or_404(BudgetItem.objects.select_for_update(), pk=item_id, budget=budget)
+            item.budget = budget
+            merged = {**_item_to_json(item), **data}
+            if 'total' not in data and _PRICING_KEYS.intersection(data):
+                merged['total'] = None
+            fields, keep_total = _autosave_item_fields(merged)
+            fields.pop('is_approved')
+            if 'section_id' in data and data['section_id'] != item.section_id:
+                item.section = _autosave_section(budget, data['section_id'])
+            for name, value in fields.items():
+                setattr(item, name, value)
+            item._skip_total_recalc = keep_total
+            item.save()
+            return {'item': _autosave_item_json(item)}
+
+        return _autosave_response(request, pk, write)
+
+    def delete(self, request, pk, item_id):
+        def write(budget, data):
+            item = get_object_or_404(BudgetItem, pk=item_id, budget=budget)
+            item.budget = budget
+            item.delete()
+            return {'deleted': item_id}
+
+        return _autosave_response(request, pk, write)
+
+
+class BudgetSectionApiView(LoginRequiredMixin, View):
+    """POST /budgets/<pk>/api/sections/  → append a section ({"title": …})"""
+
+    def post(self, request, pk):
+        def write(budget, data):
+            last = budget.sections.aggregate(last=Max('order'))['last']
+            order = 0 if last is None else last + 1
+            title = (data.get('title') or '').strip() or f'Seção {order + 1}'
+            section = BudgetSection.objects.create(budget=budget, title=title, order=order)
+            return {'section': _autosave_section_json(section)}
+
+        return _autosave_response(request, pk, write, status=201)
+
+
+class BudgetSectionApiDetailView(LoginRequiredMixin, View):
+    """
+    PATCH  /budgets/<pk>/api/sections/<section_id>/  → rename ({"title": …})
+    DELETE /budgets/<pk>/api/sections/<section_id>/  → delete with its items
+    """
+
+    def patch(self, request, pk, section_id):
+        def write(budget, data):
+            section = _autosave_section(budget, section_id)
+            title = (data.get('title') or '').strip()
+            if not title:
+                raise _AutosaveError('Título é obrigatório.')
+            if title != section.title:
+                section.title = title
+                section.save(update_fields=['title'])
+            return {'section': _autosave_section_json(section)}
+
+        return _autosave_response(request, pk, write)
+
+    def delete(self, request, pk, section_id):
+        def write(budget, data):
+            _autosave_section(budget, section_id).delete()
+            budget.refresh_from_db(fields=list(Budget.ITEM_TOTAL_FIELDS))
+            return {'deleted': section_id}
+
+        return _autosave_response(request, pk, write)
+
+
+class BudgetSectionReorderApiView(LoginRequiredMixin, View):
+    """
+    POST /budgets/<pk>/api/sections/reorder/  → {"order": [section ids…]}
+
+    Sections left out keep their relative order after the listed ones.
+    """
+
+    def post(self, request, pk):
+        def write(budget, data):
+            order = data.get('order')
+            if not isinstance(order, list):
+                raise _AutosaveError('Informe a nova ordem das seções.')
+            sections = {section.pk: section for section in budget.sections.all()}
+            ids = [int(pk) for pk in order if str(pk).isdigit() and int(pk) in sections]
+            ids += [pk for pk in sections if pk not in ids]
+            changed = []
+            for position, section_id in enumerate(ids):
+                section = sections[section_id]
+                if section.order != position:
+                    section.order = position
+                    changed.append(section)
+            BudgetSection.objects.bulk_update(changed, ['order'])
+            return {'sections': [_autosave_section_json(sections[section_id]) for section_id in ids]}
+
+        return _autosave_response(request, pk, write)
+
+
+class BudgetAutosaveFlushView(LoginRequiredMixin, View):
+    """
+    POST /budgets/<pk>/api/flush/
+
+    Sent when the editor leaves the page: closes the user's editing session
+    and brings a Service Order left behind by debounced syncs up to date.
+    """
+
+    def post(self, request, pk):
+        budget = get_object_or_404(Budget, pk=pk)
+        autosave.end_edit(budget, request.user)
+        synced = autosave.flush_service_order_sync(budget)
+        return JsonResponse({'revision': budget.revision, 'synced': synced})
+
+
+# ── Live totals ─────────────────────────────────────────────────────────────
+
+class BudgetLiveTotalsView(LoginRequiredMixin, View):
+    """
+    AJAX-only endpoint.  Prices the unsaved budget form server-side with the
+    same kernel as the saved budget (budgets.pricing), WITHOUT touching the
+    database.
+
+    POST body (application/x-www-form-urlencoded), same fields the form submits:
+        sections_data       – sections + items JSON (see save_budget_sections)
+        budget_id           – needed when sections are sent as "unchanged"
+        extra_charges_data  – extra charges JSON
+        discount_type, discount_value, freight_cost, freight_included
+
+    Lines that can't be priced yet (a half-typed quantity such as "1." or
+    "abc") are left out of the totals and counted in ``invalid_items``.
+    """
+
+    def post(self, request):
+        from .persistence import item_fields_from_payload, parse_sections_json, to_decimal
+
+        try:
+            extra_charges = json.loads(request.POST.get('extra_charges_data') or '{}')
+        except (ValueError, TypeError):
+            extra_charges = {}
+        if not isinstance(extra_charges, dict):
+            extra_charges = {}
+
+        sections_data = parse_sections_json(request.POST.get('sections_data'))
+
+        # Sections the form did not load are priced from their stored items
+        stored = {}
+        unchanged_ids = [
+            sec_data.get('id') for sec_data in sections_data
+            if sec_data.get('unchanged') and str(sec_data.get('id') or '').isdigit()
+        ]
+        if unchanged_ids and str(request.POST.get('budget_id') or '').isdigit():
+            stored = {
+                row.pop('section_id'): pricing.ItemAggregates(**row)
+                for row in BudgetItem.objects.filter(
+                    budget_id=request.POST['budget_id'], section_id__in=unchanged_ids,
+                ).totals_by('section_id')
+            }
+
+        section_subtotals = []
+        invalid_items = 0
+
+        def _lines():
+            nonlocal invalid_items
+            for sec_data in sections_data:
+                if sec_data.get('unchanged'):
+                    aggregates = stored.get(int(sec_data['id'])) if str(sec_data.get('id') or '').isdigit() else None
+                    section_subtotals.append(aggregates.items_total if aggregates else Decimal('0'))
+                    continue
+                subtotal = Decimal('0')
+                for item_data in sec_data.get('items', []):
+                    if isinstance(item_data, dict) and item_data.get('delete'):
+                        continue
+                    try:
+                        fields, keep_total = item_fields_from_payload(item_data)
+                    except (AttributeError, TypeError, ValueError, InvalidOperation):
+                        invalid_items += 1
+                        continue
+                    measurement, unit = pricing.item_measurement(
+                        fields['dim_length'], fields['dim_width'], fields['dim_height'],
+                        fields['measurement'], fields['measurement_unit'],
+                    )
+                    total = fields['total_price'] if keep_total else pricing.item_total(
+                        fields['quantity'], fields['unit_price'], fields['billing_type'], measurement,
+                    )
+                    subtotal += total
+                    yield pricing.ItemLine(
+                        total, fields['quantity'], fields['weight'], measurement, unit,
+                        fields['include_fiscal'], True,
+                    )
+                section_subtotals.append(subtotal)
+
+        extra_base, extra_fiscal_base = pricing.extra_charges_sums(extra_charges)
+        totals = pricing.price_totals(
+            pricing.combine_aggregates(pricing.aggregate_items(_lines()), *stored.values()),
+            extra_base,
+            extra_fiscal_base,
+            request.POST.get('discount_type') or 'none',
+            to_decimal(request.POST.get('discount_value'), Decimal('0')),
+            to_decimal(request.POST.get('freight_cost')),
+            request.POST.get('freight_included') == '1',
+        )
+
+        def _money(value):
+            return str(Decimal(value).quantize(Decimal('0.01')))
+
+        return JsonResponse({
+            'items_total': _money(totals.items.items_total),
+            'section_subtotals': [_money(value) for value in section_subtotals],
+            'fiscal_charges': _money(totals.fiscal_charges),
+            'extra_charges': _money(totals.extra_charges_base),
+            'subtotal': _money(totals.subtotal),
+            'discount': _money(totals.discount),
+            'total': _money(totals.total_with_freight),
+            'total_weight': str(totals.items.items_weight),
+            'total_volume': str(totals.items.items_volume),
+            'items_count': totals.items.items_count,
+            'invalid_items': invalid_items,
+        })
+
+
 # ── Freight Calculation ─────────────────────────────────────────────────────
 
 class BudgetCalculateFreightView(LoginRequiredMixin, View):
@@ -813,62 +1144,68 @@ class BudgetCalculateFreightView(LoginRequiredMixin, View):
 
     POST params (all optional):
         urgency_id   – pk of UrgencyMultiplier to use
-        distance_km  – delivery distance in km
+        distance_km  – delivery distance in km; when absent and the budget
+                       has none, it is estimated from the event location
+                       (apps.logistics.geo)
         save         – "1" to persist freight_cost on the budget
-    Returns JSON with the full breakdown.
+    Returns JSON with the full breakdown (FreightQuote.as_json()).
     """
 
     def post(self, request, pk):
-        from apps.logistics.models import UrgencyMultiplier
+        from apps.logistics.geo import estimate_budget_distance
         from apps.logistics.utils import calculate_freight
-        from decimal import Decimal, InvalidOperation
-
-        budget = get_object_or_404(Budget, pk=pk)
-
-        urgency = None
-        urgency_id = request.POST.get('urgency_id') or ''
-        if urgency_id.isdigit():
-            urgency = UrgencyMultiplier.objects.filter(pk=int(urgency_id)).first()
-
-        distance_km = None
-        raw_distance = request.POST.get('distance_km') or ''
-        try:
-            distance_km = Decimal(raw_distance) if raw_distance else None
-        except InvalidOperation:
-            pass
 
+        budget = get_object_or_404(Budget.objects.select_related('proposal__event'), pk=pk)
+        urgency, distance_km = _freight_params(request.POST, default_urgency=False)
+        if distance_km is None and budget.freight_distance_km is None:
+            distance_km = estimate_budget_distance(budget)
         result = calculate_freight(budget, urgency=urgency, distance_km=distance_km)
 
         # Persist if requested
         should_save = request.POST.get('save') == '1'
         if should_save:
-            budget.freight_cost = result['freight_total']
-            budget.freight_urgency = urgency
+            budget.freight_cost = result.freight_total
+            budget.freight_calculated = True
+            budget.freight_urgency_id = urgency.pk if urgency else None
             if distance_km is not None:
                 budget.freight_distance_km = distance_km
-            budget.save(update_fields=['freight_cost', 'freight_urgency', 'freight_distance_km'])
-            messages.success(request, f"Frete calculado e salvo: R$ {result['freight_total']:.2f}")
+            budget.save(update_fields=['freight_cost', 'freight_calculated', 'freight_urgency', 'freight_distance_km'])
+            messages.success(request, f"Frete calculado e salvo: R$ {result.freight_total:.2f}")
 
         # Return JSON for AJAX or redirect for standard form
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({
-                'success': True,
-                'weight_total': float(result['weight_total']),
-                'volume_total': float(result['volume_total']),
-                'weight_cost': float(result['weight_cost']),
-                'volume_cost': float(result['volume_cost']),
-                'base_freight': float(result['base_freight']),
-                'fixed_fee': float(result['fixed_fee']),
-                'percentage_cost': float(result['percentage_cost']),
-                'distance_cost': float(result['distance_cost']),
-                'urgency_multiplier': float(result['urgency_multiplier']),
-                'urgency_label': result['urgency_label'],
-                'freight_total': float(result['freight_total']),
-            })
+            return JsonResponse({'success': True, **result.as_json()})
 
         return redirect('budgets:detail', pk=pk)
 
 
+def _freight_params(data, default_urgency=True):
+    """
+    ``(urgency, distance_km)`` from the request *data*: the urgency level of
+    ``urgency_id`` from the compiled tariff (the default level when absent
+    and *default_urgency*), and ``distance_km`` as a Decimal or None.
+    """
+    from apps.logistics.tariff import get_tariff
+
+    tariff = get_tariff()
+    urgency_id = str(data.get('urgency_id') or '').strip()
+    urgency = tariff.urgencies.get(int(urgency_id)) if urgency_id.isdigit() else None
+    if urgency is None and default_urgency:
+        urgency = tariff.default_urgency
+
+    raw_distance = str(data.get('distance_km') or '').strip()
+    try:
+        distance_km = Decimal(raw_distance) if raw_distance else None
+    except InvalidOperation:
+        distance_km = None
+    return urgency, distance_km
+
+
+# What-if grid (BudgetFreightMatrixView)
+FREIGHT_MATRIX_DISTANCES = ('0', '50', '100', '250', '500')
+FREIGHT_MATRIX_MAX_DISTANCES = 10
+
+
 # ── Freight Live Preview (no save) ──────────────────────────────────────────
 
 class BudgetFreightPreviewView(LoginRequiredMixin, View):
@@ -885,12 +1222,8 @@ class BudgetFreightPreviewView(LoginRequiredMixin, View):
     """
 
     def post(self, request):
-        import json
-        from decimal import Decimal, InvalidOperation
-        from apps.logistics.models import FreightSettings, UrgencyMultiplier, WeightRange, VolumeRange
-        from apps.logistics.utils import _weight_cost, _volume_cost
+        from apps.logistics.utils import payload_totals, quote_freight
 
-        # ── Parse payload ──────────────────────────────────────────────────
         try:
             items = json.loads(request.POST.get('items_json', '[]'))
         except (ValueError, TypeError):
@@ -901,91 +1234,176 @@ class BudgetFreightPreviewView(LoginRequiredMixin, View):
         except InvalidOperation:
             budget_total = Decimal('0')
 
-        urgency_id = request.POST.get('urgency_id', '').strip()
-        urgency = None
-        if urgency_id.isdigit():
-            urgency = UrgencyMultiplier.objects.filter(pk=int(urgency_id)).first()
-        if urgency is None:
-            urgency = UrgencyMultiplier.objects.filter(is_default=True).first()
+        urgency, distance_km = _freight_params(request.POST)
+        weight_total, volume_total = payload_totals(items)
+        result = quote_freight(weight_total, volume_total, budget_total, urgency=urgency, distance_km=distance_km)
+        return JsonResponse(result.as_json())
 
-        distance_km = None
-        raw_dist = request.POST.get('distance_km', '').strip()
-        try:
-            distance_km = Decimal(raw_dist) if raw_dist else None
-        except InvalidOperation:
-            pass
 
-        # ── Aggregate weight & volume from item list ───────────────────────
-        weight_total = Decimal('0')
-        volume_total = Decimal('0')
+class BudgetFreightMatrixView(LoginRequiredMixin, View):
+    """
+    What-if freight grid: every urgency level × distance × calculation mode
+    in one answer, without saving anything.
+
+    GET/POST /budgets/<pk>/freight-matrix/  – a saved budget's stored totals
+    POST     /budgets/freight-matrix/       – ad-hoc payload, as the preview:
+                                              items_json, budget_total
+    Optional params:
+        distances – comma-separated km (default: FREIGHT_MATRIX_DISTANCES
+                    when distance pricing is on, else none)
+        modes     – comma-separated calculation modes (default: all)
+    """
 
-        for item in items:
-            try:
-                qty = Decimal(str(item.get('quantity', 1) or 1))
-                w = item.get('weight') or 0
-                v = item.get('volume') or 0
-                mu = item.get('measurement_unit', '') or ''
-
-                if w:
-                    weight_total += Decimal(str(w)) * qty
-                if v and mu == 'm3':
-                    volume_total += Decimal(str(v)) * qty
-            except (InvalidOperation, TypeError):
-                continue
-
-        # ── Cost per table ─────────────────────────────────────────────────
-        settings = FreightSettings.get_settings()
-        w_cost = _weight_cost(weight_total)
-        v_cost = _volume_cost(volume_total)
-
-        mode = settings.calculation_mode
-        if mode == 'max':
-            base_freight = max(w_cost, v_cost)
-        elif mode == 'sum':
-            base_freight = w_cost + v_cost
-        elif mode == 'weight':
-            base_freight = w_cost
-        else:
-            base_freight = v_cost
+    def get(self, request, pk=None):
+        return self._matrix(request, request.GET, pk)
 
-        fixed_fee = settings.fixed_delivery_fee or Decimal('0')
-        pct = settings.percentage_on_total or Decimal('0')
-        percentage_cost = budget_total * (pct / Decimal('100'))
+    def post(self, request, pk=None):
+        return self._matrix(request, request.POST, pk)
 
-        distance_cost = Decimal('0')
-        if settings.distance_rate_enabled and distance_km is not None:
-            distance_cost = settings.distance_rate_per_km * distance_km
+    def _matrix(self, request, data, pk):
+        from apps.logistics.tariff import get_tariff
+        from apps.logistics.utils import CALCULATION_MODES, freight_matrix, payload_totals
+
+        if pk is not None:
+            budget = get_object_or_404(Budget, pk=pk)
+            weight_total, volume_total, budget_total = budget.items_weight, budget.items_volume, budget.items_total
+        else:
+            try:
+                items = json.loads(data.get('items_json') or '[]')
+                budget_total = Decimal(str(data.get('budget_total') or '0'))
+            except (ValueError, TypeError, InvalidOperation):
+                return JsonResponse({'error': 'Dados inválidos.'}, status=400)
+            weight_total, volume_total = payload_totals(items)
 
-        urgency_multiplier = urgency.multiplier if urgency else Decimal('1')
-        urgency_label = urgency.label if urgency else 'Normal'
+        tariff = get_tariff()
+        try:
+            distances = [
+                Decimal(value) for value in (data.get('distances') or '').split(',') if value.strip()
+            ]
+        except InvalidOperation:
+            return JsonResponse({'error': 'Distâncias inválidas.'}, status=400)
+        if not distances and tariff.terms.distance_rate_enabled:
+            distances = [Decimal(value) for value in FREIGHT_MATRIX_DISTANCES]
+        invalid = any(not value.is_finite() or value < 0 for value in distances)
+        if invalid or len(distances) > FREIGHT_MATRIX_MAX_DISTANCES:
+            return JsonResponse(
+                {'error': f'Informe até {FREIGHT_MATRIX_MAX_DISTANCES} distâncias positivas.'}, status=400,
+            )
 
-        freight_sub = base_freight + fixed_fee + percentage_cost + distance_cost
-        freight_total = freight_sub * urgency_multiplier
+        modes = [mode.strip() for mode in (data.get('modes') or '').split(',') if mode.strip()] or CALCULATION_MODES
+        if any(mode not in CALCULATION_MODES for mode in modes):
+            return JsonResponse({'error': 'Modo de cálculo inválido.'}, status=400)
 
+        scenarios = freight_matrix(weight_total, volume_total, budget_total, distances or [None], modes)
         return JsonResponse({
             'weight_total': float(weight_total),
             'volume_total': float(volume_total),
-            'weight_cost': float(w_cost),
-            'volume_cost': float(v_cost),
-            'base_freight': float(base_freight),
-            'fixed_fee': float(fixed_fee),
-            'percentage_cost': float(percentage_cost),
-            'distance_cost': float(distance_cost),
-            'urgency_multiplier': float(urgency_multiplier),
-            'urgency_label': urgency_label,
-            'freight_total': float(freight_total),
+            'budget_total': float(budget_total),
+            'calculation_mode': tariff.terms.calculation_mode,
+            'urgencies': [
+                {'id': urgency.pk, 'label': urgency.label, 'multiplier': float(urgency.multiplier)}
+                for urgency in tariff.urgencies.values()
+            ],
+            'default_urgency_id': tariff.default_urgency.pk if tariff.default_urgency else None,
+            'distances': [float(value) for value in distances],
+            'modes': list(modes),
+            'scenarios': [scenario.as_json() for scenario in scenarios],
         })
 
 
+# ── Description / payment-info libraries ───────────────────────────────────
+
+LIBRARY_PAGE_SIZE = 20
+LIBRARY_MAX_PAGE_SIZE = 50
+
+
+def _library_entry(obj):
+    return {'id': obj.id, 'title': obj.title, 'body': obj.body}
+
+
+def _library_list_response(request, model):
+    """
+    Typeahead page of *model* entries: ``?q=&page=&limit=`` →
+    ``{"results": [{"id", "title"}], "page", "has_more"}``.
+
+    Bodies are left out (see _library_detail_response); the ETag covers the
+    query and the library version, so unchanged pages revalidate with a 304.
+    """
+    from django.utils.cache import get_conditional_response
+    from django.utils.http import quote_etag
+
+    query = (request.GET.get('q') or '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        limit = min(max(int(request.GET.get('limit', LIBRARY_PAGE_SIZE)), 1), LIBRARY_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros de paginação inválidos.'}, status=400)
+
+    count, updated = model.objects.version()
+    fingerprint = f'{count}|{updated.isoformat() if updated else ""}|{query}|{page}|{limit}'
+    etag = quote_etag(hashlib.sha1(fingerprint.encode()).hexdigest()[:20])
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    offset = (page - 1) * limit
+    rows = list(model.objects.search(query).values('id', 'title')[offset:offset + limit + 1])
+    response = JsonResponse({
+        'results': rows[:limit],
+        'page': page,
+        'has_more': len(rows) > limit,
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _library_detail_response(request, obj):
+    """Full entry (body included), with an ETag from its last update."""
+    from django.utils.cache import get_conditional_response
+    from django.utils.http import quote_etag
+
+    etag = quote_etag(f'{obj.pk}-{int(obj.updated_at.timestamp() * 1000)}')
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(_library_entry(obj))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _library_seed(budget):
+    """
+    The library entries the form of *budget* needs up front: the item
+    descriptions its items use and the payment template matching its
+    payment info.  Everything else is searched / fetched on demand.
+    """
+    if budget is None:
+        return [], []
+    unreferenced = BudgetItem.objects.filter(
+        budget=budget, description_ref__isnull=True,
+    ).exclude(description='').values('description')
+    descriptions = ItemDescription.objects.filter(
+        Q(budget_items__budget=budget) | Q(body__in=unreferenced)
+    ).distinct().values('id', 'title', 'body')
+
+    payment_info = (budget.payment_info or '').strip()
+    templates = (
+        PaymentInfoTemplate.objects.filter(body=payment_info).values('id', 'title', 'body')[:1]
+        if payment_info else []
+    )
+    return list(descriptions), list(templates)
+
+
 class ItemDescriptionListCreateView(LoginRequiredMixin, View):
     """
-    GET  /budgets/item-descriptions/        → JSON list of all descriptions
-    POST /budgets/item-descriptions/        → create and return new description
+    GET  /budgets/item-descriptions/?q=&page=  → paginated typeahead search (id, title)
+    POST /budgets/item-descriptions/           → create and return new description
     """
 
     def get(self, request):
-        descriptions = list(ItemDescription.objects.values('id', 'title', 'body'))
-        return JsonResponse(descriptions, safe=False)
+        return _library_list_response(request, ItemDescription)
 
     def post(self, request):
         try:
@@ -1000,15 +1418,19 @@ class ItemDescriptionListCreateView(LoginRequiredMixin, View):
             return JsonResponse({'error': 'Título é obrigatório.'}, status=400)
 
         desc = ItemDescription.objects.create(title=title, body=body)
-        return JsonResponse({'id': desc.id, 'title': desc.title, 'body': desc.body}, status=201)
+        return JsonResponse(_library_entry(desc), status=201)
 
 
 class ItemDescriptionDetailView(LoginRequiredMixin, View):
     """
+    GET    /budgets/item-descriptions/<pk>/  → full description (body included)
     PATCH  /budgets/item-descriptions/<pk>/  → update title/body
     DELETE /budgets/item-descriptions/<pk>/  → delete
     """
 
+    def get(self, request, pk):
+        return _library_detail_response(request, get_object_or_404(ItemDescription, pk=pk))
+
     def patch(self, request, pk):
         desc = get_object_or_404(ItemDescription, pk=pk)
         try:
@@ -1025,7 +1447,7 @@ class ItemDescriptionDetailView(LoginRequiredMixin, View):
         desc.title = title
         desc.body  = body
         desc.save()
-        return JsonResponse({'id': desc.id, 'title': desc.title, 'body': desc.body})
+        return JsonResponse(_library_entry(desc))
 
     def delete(self, request, pk):
         desc = get_object_or_404(ItemDescription, pk=pk)
@@ -1035,13 +1457,12 @@ class ItemDescriptionDetailView(LoginRequiredMixin, View):
 
 class PaymentInfoTemplateListCreateView(LoginRequiredMixin, View):
     """
-    GET  /budgets/payment-info-templates/      → JSON list of all templates
-    POST /budgets/payment-info-templates/      → create and return new template
+    GET  /budgets/payment-info-templates/?q=&page=  → paginated typeahead search (id, title)
+    POST /budgets/payment-info-templates/           → create and return new template
     """
 
     def get(self, request):
-        templates = list(PaymentInfoTemplate.objects.values('id', 'title', 'body'))
-        return JsonResponse(templates, safe=False)
+        return _library_list_response(request, PaymentInfoTemplate)
 
     def post(self, request):
         try:
@@ -1056,15 +1477,19 @@ class PaymentInfoTemplateListCreateView(LoginRequiredMixin, View):
             return JsonResponse({'error': 'Título é obrigatório.'}, status=400)
 
         template = PaymentInfoTemplate.objects.create(title=title, body=body)
-        return JsonResponse({'id': template.id, 'title': template.title, 'body': template.body}, status=201)
+        return JsonResponse(_library_entry(template), status=201)
 
 
 class PaymentInfoTemplateDetailView(LoginRequiredMixin, View):
     """
+    GET    /budgets/payment-info-templates/<pk>/  → full template (body included)
     PATCH  /budgets/payment-info-templates/<pk>/  → update title/body
     DELETE /budgets/payment-info-templates/<pk>/  → delete
     """
 
+    def get(self, request, pk):
+        return _library_detail_response(request, get_object_or_404(PaymentInfoTemplate, pk=pk))
+
     def patch(self, request, pk):
         template = get_object_or_404(PaymentInfoTemplate, pk=pk)
         try:
@@ -1081,7 +1506,7 @@ class PaymentInfoTemplateDetailView(LoginRequiredMixin, View):
         template.title = title
         template.body = body
         template.save()
-        return JsonResponse({'id': template.id, 'title': template.title, 'body': template.body})
+        return JsonResponse(_library_entry(template))
 
     def delete(self, request, pk):
         template = get_object_or_404(PaymentInfoTemplate, pk=pk)
@@ -1091,13 +1516,35 @@ class PaymentInfoTemplateDetailView(LoginRequiredMixin, View):
 
 class NotificationsView(LoginRequiredMixin, View):
     """
-    AJAX endpoint to:
-    - GET: list unread budget notifications (last 20)
-    - POST: mark all as read
+    AJAX endpoint for the header bell (per-user read state):
+
+    - GET ``?cursor=<c>&wait=<s>``: 204 while the feed still matches the
+      client's cursor (optionally waiting up to BUDGET_NOTIFICATIONS_LONG_POLL
+      seconds for a change), otherwise the unread notifications (last 20),
+      the unread count and the new cursor.
+    - POST: mark everything up to now as read for the current user
     """
 
+    idle_poll_seconds = 60
+
     def get(self, request):
-        notifications = BudgetNotification.objects.select_related('budget').filter(is_read=False).order_by('-created_at')[:20]
+        from django.http import HttpResponse
+        from . import notifications
+
+        since = request.GET.get('cursor', '')
+        current = notifications.cursor(request.user)
+        if since and current == since:
+            try:
+                wait = min(max(int(request.GET.get('wait', 0)), 0), notifications.long_poll_limit())
+            except ValueError:
+                wait = 0
+            if wait:
+                current = notifications.wait_for_change(request.user, since, wait)
+            if current == since:
+                response = HttpResponse(status=204)
+                response['X-Poll-After'] = '0' if wait else str(self.idle_poll_seconds)
+                return response
+
         data = [
             {
                 'id': n.id,
@@ -1108,14 +1555,21 @@ class NotificationsView(LoginRequiredMixin, View):
                 'budget_url': n.budget.get_approval_url(),
                 'budget_detail_url': str(reverse_lazy('budgets:detail', kwargs={'pk': n.budget.pk})),
             }
-            for n in notifications
+            for n in notifications.unread(request.user)
         ]
-        unread_count = BudgetNotification.objects.filter(is_read=False).count()
-        return JsonResponse({'notifications': data, 'unread_count': unread_count})
+        response = JsonResponse({
+            'notifications': data,
+            'unread_count': notifications.unread_count(request.user),
+            'cursor': current,
+        })
+        response['X-Poll-After'] = '0' if notifications.long_poll_limit() else str(self.idle_poll_seconds)
+        return response
 
     def post(self, request):
-        BudgetNotification.objects.filter(is_read=False).update(is_read=True)
-        return JsonResponse({'ok': True})
+        from . import notifications
+
+        notifications.mark_read(request.user)
+        return JsonResponse({'ok': True, 'cursor': notifications.cursor(request.user)})
 
 
 # ── Budget Version History ───────────────────────────────────────────────────
@@ -1123,14 +1577,41 @@ class NotificationsView(LoginRequiredMixin, View):
 class BudgetVersionListView(LoginRequiredMixin, View):
     """
     GET  /budgets/<pk>/versions/   → JSON list of versions for a budget
+
+    Newest first, paginated by cursor: ``?before=<version_number>&limit=<n>``.
+    Only the summary columns are read, never the snapshots themselves.
     """
 
+    page_size = 20
+    max_page_size = 100
+
     def get(self, request, pk):
         budget = get_object_or_404(Budget, pk=pk)
-        versions = budget.versions.select_related('created_by').all()
+        try:
+            limit = min(int(request.GET.get('limit', self.page_size)), self.max_page_size)
+        except ValueError:
+            limit = self.page_size
+        limit = max(limit, 1)
+
+        versions = (
+            budget.versions.select_related('created_by')
+            .only(
+                'id', 'version_number', 'label', 'created_at',
+                'total_with_freight', 'status', 'items_count', 'sections_count',
+                'created_by__first_name', 'created_by__last_name', 'created_by__email',
+            )
+            .order_by('-version_number')
+        )
+        before = request.GET.get('before', '')
+        if before.isdigit():
+            versions = versions.filter(version_number__lt=int(before))
+
+        page = list(versions[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
         data = []
-        for v in versions:
-            snapshot = v.snapshot or {}
+        for v in page:
             data.append({
                 'id': v.pk,
                 'version_number': v.version_number,
@@ -1140,10 +1621,15 @@ class BudgetVersionListView(LoginRequiredMixin, View):
                     v.created_by.get_full_name() or v.created_by.email
                     if v.created_by else '—'
                 ),
-                'total': snapshot.get('total_with_freight', '—'),
-                'status': snapshot.get('status', '—'),
+                'total': str(v.total_with_freight) if v.total_with_freight is not None else '—',
+                'status': v.status or '—',
+                'items_count': v.items_count,
+                'sections_count': v.sections_count,
             })
-        return JsonResponse({'versions': data})
+        return JsonResponse({
+            'versions': data,
+            'next_cursor': page[-1].version_number if has_more else None,
+        })
 
 
 class BudgetVersionDetailView(LoginRequiredMixin, View):
@@ -1159,7 +1645,7 @@ class BudgetVersionDetailView(LoginRequiredMixin, View):
             'version_number': version.version_number,
             'label': version.label,
             'created_at': version.created_at.strftime('%d/%m/%Y %H:%M'),
-            'snapshot': version.snapshot,
+            'snapshot': version.get_snapshot(),
         })
 
 
@@ -1175,7 +1661,7 @@ class BudgetVersionRestoreView(LoginRequiredMixin, View):
 
         budget = get_object_or_404(Budget, pk=pk)
         version = get_object_or_404(BudgetVersion, pk=version_id, budget=budget)
-        snap = version.snapshot
+        snap = version.get_snapshot()
 
         # 1. Snapshot the current state before restoring
         _create_budget_version(
@@ -1200,6 +1686,7 @@ class BudgetVersionRestoreView(LoginRequiredMixin, View):
         budget.discount_type = snap.get('discount_type', budget.discount_type)
         budget.discount_value = _dec(snap.get('discount_value'), budget.discount_value)
         budget.freight_cost = _dec(snap.get('freight_cost'))
+        budget.freight_calculated = bool(snap.get('freight_calculated'))
         budget.freight_distance_km = _dec(snap.get('freight_distance_km'))
         budget.payment_info = snap.get('payment_info', budget.payment_info)
         if snap.get('freight_urgency_id'):
@@ -1218,7 +1705,7 @@ class BudgetVersionRestoreView(LoginRequiredMixin, View):
         # Wipe existing sections/items and rebuild from snapshot
         budget.sections.all().delete()  # cascades to section_items
         budget.items.filter(section__isnull=True).delete()
-        _save_sections_from_json(budget, _json.dumps(sections_data))
+        save_budget_sections(budget, _json.dumps(sections_data))
 
         # Restore unsectioned items (legacy)
         for item_data in snap.get('unsectioned_items', []):
@@ -1233,6 +1720,8 @@ class BudgetVersionRestoreView(LoginRequiredMixin, View):
                 include_fiscal=bool(item_data.get('include_fiscal', False)),
                 is_approved=bool(item_data.get('is_approved', True)),
             )
+        # Outdates open autosave sessions; the Service Order catches up on flush
+        autosave.claim_revision(budget)
 
         messages.success(
             request,
@@ -1252,50 +1741,42 @@ class BudgetVersionPublicPreviewView(LoginRequiredMixin, View):
     """
 
     def get(self, request, pk, version_id):
-        from decimal import Decimal, InvalidOperation
-
         budget  = get_object_or_404(Budget, pk=pk)
         version = get_object_or_404(BudgetVersion, pk=version_id, budget=budget)
-        snap    = version.snapshot or {}
-
-        def _dec(v, default=Decimal('0')):
-            if v is None or str(v).strip() == '':
-                return default
-            try:
-                return Decimal(str(v))
-            except (InvalidOperation, ValueError):
-                return default
+        snap    = version.get_snapshot()
 
         # Build lightweight context from snapshot — no live DB queries for items
         sections = snap.get('sections', [])
         unsectioned = snap.get('unsectioned_items', [])
 
-        # Calculate totals from snapshot
-        items_total = Decimal('0')
-        has_fiscal  = False
-        for sec in sections:
-            for it in sec.get('items', []):
-                items_total += _dec(it.get('total_price'))
-                if it.get('include_fiscal'):
-                    has_fiscal = True
-        for it in unsectioned:
-            items_total += _dec(it.get('total_price'))
-            if it.get('include_fiscal'):
-                has_fiscal = True
-
-        # Extra charges
+        # Price the snapshot with the same kernel as the live budget
+        def _lines(items):
+            for it in items:
+                yield pricing.ItemLine(
+                    pricing.to_decimal(it.get('total_price')),
+                    int(it.get('quantity') or 0),
+                    pricing.to_decimal(it.get('weight'), None),
+                    pricing.to_decimal(it.get('measurement'), None),
+                    it.get('measurement_unit') or '',
+                    bool(it.get('include_fiscal')),
+                    bool(it.get('is_approved', True)),
+                )
+
+        all_items = [it for sec in sections for it in sec.get('items', [])] + unsectioned
         extra_charges = snap.get('extra_charges') or {}
-        extra_total = Decimal('0')
-        for rows in extra_charges.values():
-            if isinstance(rows, list):
-                for row in rows:
-                    try:
-                        extra_total += Decimal(str(row.get('value') or 0))
-                    except Exception:
-                        pass
-
-        freight_cost = _dec(snap.get('freight_cost'))
-        total_with_freight = _dec(snap.get('total_with_freight')) or (items_total + freight_cost + extra_total)
+        totals = pricing.price_budget(
+            _lines(all_items),
+            extra_charges,
+            snap.get('discount_type') or 'none',
+            pricing.to_decimal(snap.get('discount_value')),
+            pricing.to_decimal(snap.get('freight_cost')),
+        )
+        items_total = totals.items.items_total
+        has_fiscal = totals.items.fiscal_items_count > 0
+        extra_total = totals.extra_charges_base
+        freight_cost = pricing.to_decimal(snap.get('freight_cost'))
+        # Keep the figure recorded at snapshot time when there is one
+        total_with_freight = pricing.to_decimal(snap.get('total_with_freight')) or totals.total_with_freight
 
         status_labels = {
             'draft':     'Em andamento',
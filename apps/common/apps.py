@@ -5,3 +5,7 @@ class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.common'
     verbose_name = 'Common'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.common.signals
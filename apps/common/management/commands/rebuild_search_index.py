@@ -0,0 +1,30 @@
+"""
+Reconstrói os documentos da busca textual (apps/common/search.py).
+
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --kind budget
+
+Normalmente os documentos são atualizados por sinais; use este comando após
+importações feitas direto no banco ou para reparar o índice.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.common import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual de propostas, projetos e eventos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=search.KINDS,
+            action='append',
+            help='Tipo de documento a reconstruir (padrão: todos); pode ser repetido',
+        )
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or search.KINDS:
+            count = search.rebuild_all(kind)
+            self.stdout.write(f'{kind}: {count} documentos')
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:05
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='Tipo')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Objeto')),
+                ('title', models.TextField(blank=True, default='', verbose_name='Título')),
+                ('body', models.TextField(blank=True, default='', verbose_name='Conteúdo')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Documento de Busca',
+                'verbose_name_plural': 'Documentos de Busca',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='common_searchdocument_kind_object'),
+        ),
+    ]
@@ -0,0 +1,137 @@
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+
+# Max item names folded into a budget document
+MAX_ITEM_NAMES = 500
+
+CHUNK_SIZE = 2000
+
+
+def create_search_support(apps, schema_editor):
+    """
+    Accent-insensitive Portuguese text search configuration, the trigger
+    that keeps SearchDocument.vector in step with title/body, and its GIN
+    index (PostgreSQL only).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION public.portuguese_unaccent (COPY = pg_catalog.portuguese);
+                ALTER TEXT SEARCH CONFIGURATION public.portuguese_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+            END IF;
+        END
+        $$
+    """)
+    schema_editor.execute("""
+        CREATE OR REPLACE FUNCTION common_searchdocument_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.vector :=
+                setweight(to_tsvector('public.portuguese_unaccent', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('public.portuguese_unaccent', coalesce(NEW.body, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER common_searchdocument_vector
+        BEFORE INSERT OR UPDATE OF title, body ON common_searchdocument
+        FOR EACH ROW EXECUTE FUNCTION common_searchdocument_vector()
+    """)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS common_searchdocument_vector_gin '
+        'ON common_searchdocument USING gin (vector)'
+    )
+
+
+def drop_search_support(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS common_searchdocument_vector_gin')
+    schema_editor.execute('DROP TRIGGER IF EXISTS common_searchdocument_vector ON common_searchdocument')
+    schema_editor.execute('DROP FUNCTION IF EXISTS common_searchdocument_vector()')
+
+
+# Frozen copy of apps.common.search.normalize(): the migration must not
+# depend on code that can change after it is written.
+def _join(*parts):
+    text = unicodedata.normalize('NFKD', ' '.join(str(part) for part in parts if part).lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _budget_documents(apps, ids):
+    Budget = apps.get_model('budgets', 'Budget')
+    BudgetItem = apps.get_model('budgets', 'BudgetItem')
+
+    item_names = defaultdict(list)
+    names = (
+        BudgetItem.objects.filter(budget_id__in=ids)
+        .values_list('budget_id', 'name').distinct().order_by('budget_id', 'name')
+    )
+    for budget_id, name in names:
+        if len(item_names[budget_id]) < MAX_ITEM_NAMES:
+            item_names[budget_id].append(name)
+
+    rows = Budget.objects.filter(pk__in=ids).values_list(
+        'pk', 'name', 'proposal__title', 'proposal__event__name', 'proposal__event__client__name',
+    )
+    for pk, name, project, event, client in rows:
+        yield pk, _join(name), _join(project, event, client, *item_names[pk])
+
+
+def _project_documents(apps, ids):
+    Project = apps.get_model('projects', 'Project')
+    rows = Project.objects.filter(pk__in=ids).values_list(
+        'pk', 'title', 'description', 'event__name', 'event__client__name',
+    )
+    for pk, title, description, event, client in rows:
+        yield pk, _join(title), _join(description, event, client)
+
+
+def _event_documents(apps, ids):
+    Event = apps.get_model('events', 'Event')
+    rows = Event.objects.filter(pk__in=ids).values_list('pk', 'name', 'location', 'client__name')
+    for pk, name, location, client in rows:
+        yield pk, _join(name), _join(location, client)
+
+
+def build_documents(apps, schema_editor):
+    """
+    Index the existing budgets, projects and events with the historical
+    models (the same documents as apps.common.search at the time of this
+    migration; ``rebuild_search_index`` repairs them later on).
+    """
+    SearchDocument = apps.get_model('common', 'SearchDocument')
+    sources = (
+        ('budget', apps.get_model('budgets', 'Budget'), _budget_documents),
+        ('project', apps.get_model('projects', 'Project'), _project_documents),
+        ('event', apps.get_model('events', 'Event'), _event_documents),
+    )
+    for kind, model, documents in sources:
+        ids = list(model.objects.filter(deleted__isnull=True).values_list('pk', flat=True).order_by('pk'))
+        for start in range(0, len(ids), CHUNK_SIZE):
+            SearchDocument.objects.bulk_create([
+                SearchDocument(kind=kind, object_id=pk, title=title, body=body)
+                for pk, title, body in documents(apps, ids[start:start + CHUNK_SIZE])
+            ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_search_document'),
+        ('budgets', '0033_budget_template'),
+        ('projects', '0005_add_image_file_type'),
+        ('events', '0003_event_event_date_end_event_setup_date_end_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_support, drop_search_support),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ Base models for the Event Management System.
 Provides audit trail and soft delete functionality for all domain models.
 """
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
 from safedelete.models import SafeDeleteModel
@@ -59,3 +60,31 @@ class BaseModel(SafeDeleteModel):
         """Override save to handle user tracking."""
         # The user will be set via view mixins
         super().save(*args, **kwargs)
+
+
+class SearchDocument(models.Model):
+    """
+    Full-text search side table (see apps.common.search).
+
+    One row per indexed object (*kind* + *object_id*) with its searchable
+    text already lowercased and unaccented.  On PostgreSQL a trigger keeps
+    ``vector`` (weighted tsvector, ``portuguese_unaccent`` configuration)
+    in step with title/body and a GIN index serves the searches.
+    """
+
+    kind = models.CharField('Tipo', max_length=20)
+    object_id = models.PositiveBigIntegerField('Objeto')
+    title = models.TextField('Título', blank=True, default='')
+    body = models.TextField('Conteúdo', blank=True, default='')
+    vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Documento de Busca'
+        verbose_name_plural = 'Documentos de Busca'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='common_searchdocument_kind_object'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id}'
@@ -0,0 +1,219 @@
+"""
+Full-text search over budgets, projects and events.
+
+The list views used to search with ``icontains`` ORs across joins, which
+PostgreSQL cannot index.  Each searchable object now has one SearchDocument
+row holding its text, flattened from the related rows:
+
+    budget   name | project title, event name, client name, item names
+    project  title | description, event name, client name
+    event    name | location, client name
+
+(title is weighted A, the rest B).  Documents are rebuilt set-based when
+the transaction commits, from the signals in apps.common.signals; renaming
+a client or an event also refreshes the projects and budgets that show it.
+
+On PostgreSQL the trigger and GIN index from migration common 0002 maintain
+and index a tsvector in the accent-insensitive ``portuguese_unaccent``
+configuration; search() matches every word of the query as a prefix and
+ranks with SearchRank.  Other databases match the stored, already
+unaccented text with LIKE, which keeps tests and local SQLite setups
+working.
+
+    search(Budget.objects.all(), 'budget', 'estande sao paulo')
+"""
+
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+
+from .models import SearchDocument
+
+CONFIG = 'portuguese_unaccent'
+
+KINDS = ('budget', 'project', 'event')
+
+# Max item names folded into a budget document
+MAX_ITEM_NAMES = 500
+
+_WORD = re.compile(r'\w+')
+
+_local = threading.local()
+
+
+def normalize(text):
+    """Lowercase *text* and strip its accents."""
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _join(*parts):
+    return normalize(' '.join(str(part) for part in parts if part))
+
+
+# ── Documents ───────────────────────────────────────────────────────────────
+
+def _budget_documents(ids):
+    from apps.budgets.models import Budget, BudgetItem
+
+    item_names = defaultdict(list)
+    names = (
+        BudgetItem.objects.filter(budget_id__in=ids)
+        .values_list('budget_id', 'name').distinct().order_by('budget_id', 'name')
+    )
+    for budget_id, name in names.iterator(chunk_size=2000):
+        if len(item_names[budget_id]) < MAX_ITEM_NAMES:
+            item_names[budget_id].append(name)
+
+    rows = Budget.objects.filter(pk__in=ids).values_list(
+        'pk', 'name', 'proposal__title', 'proposal__event__name', 'proposal__event__client__name',
+    )
+    for pk, name, project, event, client in rows:
+        yield pk, _join(name), _join(project, event, client, *item_names[pk])
+
+
+def _project_documents(ids):
+    from apps.projects.models import Project
+
+    rows = Project.objects.filter(pk__in=ids).values_list(
+        'pk', 'title', 'description', 'event__name', 'event__client__name',
+    )
+    for pk, title, description, event, client in rows:
+        yield pk, _join(title), _join(description, event, client)
+
+
+def _event_documents(ids):
+    from apps.events.models import Event
+
+    rows = Event.objects.filter(pk__in=ids).values_list('pk', 'name', 'location', 'client__name')
+    for pk, name, location, client in rows:
+        yield pk, _join(name), _join(location, client)
+
+
+BUILDERS = {
+    'budget': _budget_documents,
+    'project': _project_documents,
+    'event': _event_documents,
+}
+
+
+def rebuild(kind, ids):
+    """Rewrite the documents of *kind* for *ids*; objects that no longer exist lose theirs."""
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return
+    existing = {
+        document.object_id: document
+        for document in SearchDocument.objects.filter(kind=kind, object_id__in=ids)
+    }
+    to_create, to_update = [], []
+    for pk, title, body in BUILDERS[kind](ids):
+        document = existing.pop(pk, None)
+        if document is None:
+            to_create.append(SearchDocument(kind=kind, object_id=pk, title=title, body=body))
+        elif (document.title, document.body) != (title, body):
+            document.title, document.body = title, body
+            to_update.append(document)
+    SearchDocument.objects.bulk_create(to_create, batch_size=500)
+    SearchDocument.objects.bulk_update(to_update, ['title', 'body', 'updated_at'], batch_size=500)
+    if existing:
+        SearchDocument.objects.filter(pk__in=[document.pk for document in existing.values()]).delete()
+
+
+def rebuild_all(kind, chunk_size=2000):
+    """Rebuild every document of *kind* (backfill / repair)."""
+    from django.apps import apps
+
+    model = {
+        'budget': apps.get_model('budgets', 'Budget'),
+        'project': apps.get_model('projects', 'Project'),
+        'event': apps.get_model('events', 'Event'),
+    }[kind]
+    ids = list(model.objects.values_list('pk', flat=True).order_by('pk'))
+    for start in range(0, len(ids), chunk_size):
+        rebuild(kind, ids[start:start + chunk_size])
+    # Documents of objects that are gone
+    SearchDocument.objects.filter(kind=kind).exclude(object_id__in=model.objects.values('pk')).delete()
+    return len(ids)
+
+
+# ── Deferred refresh ────────────────────────────────────────────────────────
+
+def schedule(kind, ids):
+    """
+    Refresh the documents of *kind* ('budget', 'project', 'event' or
+    'client', which cascades) for *ids* once the transaction commits.
+    Repeated calls in one transaction are merged into a single rebuild.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = defaultdict(set)
+    pending[kind].update(pk for pk in ids if pk is not None)
+    transaction.on_commit(flush)
+
+
+def flush():
+    """Rebuild everything scheduled so far (no-op when nothing is pending)."""
+    from apps.budgets.models import Budget
+    from apps.events.models import Event
+    from apps.projects.models import Project
+
+    pending = getattr(_local, 'pending', None)
+    _local.pending = None
+    if not pending:
+        return
+    # Names shown by dependent documents
+    if pending.get('client'):
+        pending['event'].update(
+            Event.objects.filter(client_id__in=pending['client']).values_list('pk', flat=True)
+        )
+    if pending.get('event'):
+        pending['project'].update(
+            Project.objects.filter(event_id__in=pending['event']).values_list('pk', flat=True)
+        )
+    if pending.get('project'):
+        pending['budget'].update(
+            Budget.objects.filter(proposal_id__in=pending['project']).values_list('pk', flat=True)
+        )
+    for kind in KINDS:
+        if pending.get(kind):
+            rebuild(kind, pending[kind])
+
+
+# ── Querying ────────────────────────────────────────────────────────────────
+
+def query_words(query):
+    return _WORD.findall(normalize(query))
+
+
+def search(queryset, kind, query):
+    """
+    Restrict *queryset* to the objects of *kind* whose document matches
+    every word of *query* (as a prefix), annotated with ``search_rank``
+    (higher is better; 0 outside PostgreSQL).
+    """
+    words = query_words(query)
+    if not words:
+        return queryset
+    documents = SearchDocument.objects.filter(kind=kind)
+
+    if connection.vendor == 'postgresql':
+        tsquery = SearchQuery(' & '.join(f'{word}:*' for word in words), config=CONFIG, search_type='raw')
+        matches = documents.filter(vector=tsquery)
+        rank = matches.filter(object_id=OuterRef('pk')).annotate(
+            rank=SearchRank(F('vector'), tsquery),
+        ).values('rank')[:1]
+        return queryset.filter(pk__in=matches.values('object_id')).annotate(
+            search_rank=Subquery(rank, output_field=FloatField()),
+        )
+
+    for word in words:
+        documents = documents.filter(Q(title__contains=word) | Q(body__contains=word))
+    return queryset.filter(pk__in=documents.values('object_id')).annotate(
+        search_rank=Value(0.0, output_field=FloatField()),
+    )
@@ -0,0 +1,52 @@
+"""
+Keep the full-text search documents (apps.common.search) up to date.
+
+Every write only schedules a rebuild; search.flush() runs once per
+transaction, after commit, so saving a budget with hundreds of items costs
+one set-based rebuild.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.budgets.models import Budget, BudgetItem, items_changed
+from apps.clients.models import Client
+from apps.events.models import Event
+from apps.projects.models import Project
+
+from . import search
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def index_budget(sender, instance, **kwargs):
+    search.schedule('budget', [instance.pk])
+
+
+@receiver(post_save, sender=BudgetItem)
+@receiver(post_delete, sender=BudgetItem)
+def index_budget_item(sender, instance, **kwargs):
+    search.schedule('budget', [instance.budget_id])
+
+
+@receiver(items_changed)
+def index_budget_items(sender, budget_ids, **kwargs):
+    search.schedule('budget', budget_ids)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def index_project(sender, instance, **kwargs):
+    search.schedule('project', [instance.pk])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def index_event(sender, instance, **kwargs):
+    search.schedule('event', [instance.pk])
+
+
+@receiver(post_save, sender=Client)
+def index_client(sender, instance, created, **kwargs):
+    if not created:
+        search.schedule('client', [instance.pk])
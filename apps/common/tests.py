@@ -0,0 +1,65 @@
+"""Common app tests."""
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.budgets.models import Budget
+from apps.budgets.persistence import save_budget_sections
+from apps.budgets.tests import _item_payload
+
+
+class FullTextSearchTestCase(TestCase):
+    """Testes para a busca textual de propostas, projetos e eventos."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        from datetime import date
+
+        from apps.clients.models import Client as CustomerClient
+        from apps.events.models import Event
+        from apps.projects.models import Project
+
+        user = get_user_model().objects.create_user(email='busca@example.com', password='x')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = CustomerClient.objects.create(name='Indústria Açúcar')
+            self.event = Event.objects.create(
+                client=self.customer, name='Feira Construção', event_date=date(2026, 5, 1), location='São Paulo',
+            )
+            self.project = Project.objects.create(title='Estande Principal', event=self.event)
+            self.budget = Budget.objects.create(name='Proposta A', proposal=self.project)
+            save_budget_sections(self.budget, json.dumps([
+                {'id': None, 'title': 'S', 'items': [_item_payload(1, name='Painel Iluminação')]},
+            ]))
+            self.other = Budget.objects.create(name='Outra proposta')
+
+    def _listed(self, url_name, query):
+        response = self.client.get(reverse(url_name), {'search': query})
+        return list(response.context['object_list'])
+
+    def test_budget_documents_cover_related_names_and_items(self):
+        """A busca encontra a proposta pelo projeto, evento, cliente e itens, sem acentos."""
+        for query in ('estande', 'construcao', 'acucar', 'iluminacao', 'Proposta estande'):
+            self.assertEqual(self._listed('budgets:list', query), [self.budget], query)
+        self.assertEqual(self._listed('budgets:list', 'inexistente'), [])
+
+    def test_projects_and_events_are_searchable(self):
+        """Projetos e eventos usam o mesmo índice."""
+        self.assertEqual(self._listed('projects:list', 'feira estande'), [self.project])
+        self.assertEqual(self._listed('events:list', 'sao paulo'), [self.event])
+
+    def test_renames_refresh_dependent_documents(self):
+        """Renomear cliente ou evento atualiza os documentos que exibem o nome."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.name = 'Metalúrgica Boreal'
+            self.customer.save()
+        self.assertEqual(self._listed('budgets:list', 'boreal'), [self.budget])
+        self.assertEqual(self._listed('projects:list', 'boreal'), [self.project])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.budget.items.update(name='Tapete')
+        self.assertEqual(self._listed('budgets:list', 'tapete'), [self.budget])
+        self.assertEqual(self._listed('budgets:list', 'iluminacao'), [])
@@ -6,11 +6,27 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
 from django.views import View
 from django.http import JsonResponse
-from django.db.models import Sum
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
 from django.utils import timezone
 from datetime import timedelta
 
 
+def _with_project_totals(projects):
+    """
+    Annotate Project.total_value in SQL (sum of the budgets' stored item totals)
+    so financial listings don't run one aggregate per project.
+    """
+    from apps.budgets.models import Budget
+    totals = Budget.objects.filter(
+        proposal=OuterRef('pk')
+    ).order_by().values('proposal').annotate(
+        total=Sum('items_total')
+    ).values('total')
+    return projects.annotate(
+        annotated_total_value=Subquery(totals, output_field=DecimalField(max_digits=18, decimal_places=2))
+    )
+
+
 class DashboardView(LoginRequiredMixin, TemplateView):
     """
     Single dashboard view. Superusers see the operations dashboard;
@@ -87,7 +103,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             status=status,
             created_at__year=year,
             created_at__month=month,
-        ).aggregate(total=Sum('items__total_price'))['total']
+        ).aggregate(total=Sum('items_total'))['total']
         return float(result or 0)
 
     # ------------------------------------------------------------------
@@ -97,7 +113,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         from apps.projects.models import Project
         from apps.budgets.models import Budget
         from decimal import Decimal
-        from django.db.models import Q
+        from apps.common.search import search as full_text_search
 
         today = timezone.now().date()
 
@@ -112,14 +128,14 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         search = self.request.GET.get('search', '').strip()
 
-        projects = Project.objects.select_related(
+        projects = _with_project_totals(Project.objects.select_related(
             'event', 'contractor'
-        ).prefetch_related('budgets__items').filter(
+        ).filter(
             budgets__status='confirmed'
-        ).distinct()
+        ).distinct())
 
         if search:
-            projects = projects.filter(title__icontains=search)
+            projects = full_text_search(projects, 'project', search)
         
         if month:
             projects = projects.filter(created_at__month=month)
@@ -202,7 +218,7 @@ class FinancialExportView(LoginRequiredMixin, TemplateView):
         from apps.projects.models import Project
         from apps.budgets.models import Budget
         from decimal import Decimal
-        from django.db.models import Q
+        from apps.common.search import search as full_text_search
 
         today = timezone.now().date()
 
@@ -217,14 +233,14 @@ class FinancialExportView(LoginRequiredMixin, TemplateView):
         
         search = self.request.GET.get('search', '').strip()
 
-        projects = Project.objects.select_related(
+        projects = _with_project_totals(Project.objects.select_related(
             'event', 'contractor'
-        ).prefetch_related('budgets__items').filter(
+        ).filter(
             budgets__status='confirmed'
-        ).distinct()
+        ).distinct())
 
         if search:
-            projects = projects.filter(title__icontains=search)
+            projects = full_text_search(projects, 'project', search)
         
         if month:
             projects = projects.filter(created_at__month=month)
@@ -261,11 +277,7 @@ class FinancialExportView(LoginRequiredMixin, TemplateView):
         ).select_related('proposal__event').order_by('-created_at')
         
         if search:
-            budgets = budgets.filter(
-                Q(name__icontains=search) | 
-                Q(proposal__title__icontains=search) |
-                Q(proposal__event__name__icontains=search)
-            )
+            budgets = full_text_search(budgets, 'budget', search)
         
         if month:
             budgets = budgets.filter(created_at__month=month)
@@ -323,7 +335,7 @@ class ProjectTotalsView(LoginRequiredMixin, View):
                 status=status,
                 created_at__year=year,
                 created_at__month=month,
-            ).aggregate(total=Sum('items__total_price'))['total']
+            ).aggregate(total=Sum('items_total'))['total']
             return float(result or 0)
 
         return JsonResponse({
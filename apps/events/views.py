@@ -7,12 +7,12 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views import View
-from django.db.models import Q
 from django.http import HttpResponseRedirect, JsonResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.core.exceptions import ValidationError
 
 from apps.common.mixins import AuditMixin
+from apps.common.search import search as full_text_search
 from .models import Event
 from .forms import EventForm, EventSearchForm
 from apps.contractors.models import Contractor, ContractorMember, EventContractor, EventContractorMember
@@ -33,17 +33,15 @@ class EventListView(LoginRequiredMixin, ListView):
         # Search functionality
         search = self.request.GET.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(location__icontains=search) |
-                Q(client__name__icontains=search)
-            )
+            queryset = full_text_search(queryset, 'event', search)
         
         # Filter by client
         client = self.request.GET.get('client', '').strip()
         if client:
             queryset = queryset.filter(client_id=client)
         
+        if search:
+            return queryset.order_by('-search_rank', '-event_date')
         return queryset.order_by('-event_date')
     
     def get_context_data(self, **kwargs):
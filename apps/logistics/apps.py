@@ -9,3 +9,7 @@ class LogisticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.logistics'
     verbose_name = 'Logística e Frete'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.logistics.signals
@@ -22,6 +22,8 @@ class FreightSettingsForm(forms.ModelForm):
             'calculation_mode',
             'distance_rate_enabled',
             'distance_rate_per_km',
+            'depot_location',
+            'road_factor',
         ]
         widgets = {
             'fixed_delivery_fee': forms.NumberInput(attrs={
@@ -35,6 +37,12 @@ class FreightSettingsForm(forms.ModelForm):
             'distance_rate_per_km': forms.NumberInput(attrs={
                 'class': _field_class, 'step': '0.01', 'min': '0',
             }),
+            'depot_location': forms.TextInput(attrs={
+                'class': _field_class, 'placeholder': 'Ex: São Paulo - SP',
+            }),
+            'road_factor': forms.NumberInput(attrs={
+                'class': _field_class, 'step': '0.01', 'min': '1',
+            }),
         }
 
 
@@ -0,0 +1,176 @@
+"""
+Offline delivery distance estimate.
+
+The distance component of the freight needs Budget.freight_distance_km,
+which is rarely typed in.  estimate_distance_km() derives it without any
+external service:
+
+    1. the depot (FreightSettings.depot_location) and the destination (the
+       free-text location of the budget's event) are resolved to
+       coordinates against the municipality gazetteer bundled in
+       data/municipios.csv (``municipio;uf;latitude;longitude``, largest
+       first; any IBGE-derived list with these columns can replace it);
+    2. the great-circle (haversine) distance between them is multiplied by
+       FreightSettings.road_factor to approximate the road distance.
+
+Free text is matched on its words, accent-insensitive: the longest
+municipality name found wins, preferring one whose state follows it
+("Expo Center Norte, São Paulo - SP").  A location may also be given as
+plain ``lat, lon`` coordinates.
+
+Resolutions are cached in-process (LRU) and in the Django cache, keyed by
+the normalized text and the gazetteer digest, so pages showing an estimate
+don't parse the same location on every request.
+"""
+
+import csv
+import hashlib
+import math
+import re
+import zlib
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from apps.common.search import normalize
+
+from .tariff import get_tariff
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'municipios.csv'
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Locations kept by resolve() in each process
+RESOLVE_CACHE_SIZE = 2048
+# Seconds a resolution is kept in the shared cache (None = forever)
+CACHE_TIMEOUT = None
+
+CENT = Decimal('0.01')
+
+UFS = frozenset((
+    'ac', 'al', 'am', 'ap', 'ba', 'ce', 'df', 'es', 'go', 'ma', 'mg', 'ms', 'mt', 'pa',
+    'pb', 'pe', 'pi', 'pr', 'rj', 'rn', 'ro', 'rr', 'rs', 'sc', 'se', 'sp', 'to',
+))
+
+_WORD = re.compile(r'\w+')
+_COORDINATES = re.compile(r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,;]\s*(-?\d{1,3}(?:\.\d+)?)\s*$')
+
+
+class Place(NamedTuple):
+    name: str
+    uf: str
+    latitude: float
+    longitude: float
+
+
+class Gazetteer(NamedTuple):
+    digest: str
+    # space-joined normalized name -> places in file order
+    names: dict
+    longest: int
+
+
+def _words(text):
+    return _WORD.findall(normalize(text))
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """The bundled municipality list, loaded once per process."""
+    raw = GAZETTEER_PATH.read_bytes()
+    names = {}
+    reader = csv.DictReader(raw.decode('utf-8-sig').splitlines(), delimiter=';')
+    for row in reader:
+        place = Place(row['municipio'], row['uf'].upper(), float(row['latitude']), float(row['longitude']))
+        names.setdefault(' '.join(_words(place.name)), []).append(place)
+    longest = max((key.count(' ') + 1 for key in names), default=0)
+    return Gazetteer(f'{zlib.crc32(raw):08x}', names, longest)
+
+
+def _match(words):
+    """The Place named in *words*, or None (see module docstring)."""
+    names = gazetteer()
+    best, best_rank = None, None
+    for start in range(len(words)):
+        for length in range(min(names.longest, len(words) - start), 0, -1):
+            places = names.names.get(' '.join(words[start:start + length]))
+            if not places:
+                continue
+            end = start + length
+            # A state given right after the name (or last in the text) picks among homonyms
+            ufs = {words[end]} if end < len(words) and words[end] in UFS else set()
+            if words[-1] in UFS:
+                ufs.add(words[-1])
+            place = next((p for p in places if p.uf.lower() in ufs), None)
+            rank = (place is not None, length, start)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = place or places[0], rank
+            break
+    return best
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def _resolve(key, digest):
+    cache_key = 'logistics:geo:' + hashlib.sha1(f'{digest}:{key}'.encode()).hexdigest()
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Place(*cached) if cached else None
+    place = _match(key.split(' '))
+    cache.set(cache_key, tuple(place) if place else (), CACHE_TIMEOUT)
+    return place
+
+
+def resolve(location):
+    """The Place of the free-text *location* ("lat, lon" or a municipality), or None."""
+    text = str(location or '').strip()
+    coordinates = _COORDINATES.match(text)
+    if coordinates:
+        latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return Place(text, '', latitude, longitude)
+        return None
+    words = _words(text)
+    if not words:
+        return None
+    return _resolve(' '.join(words), gazetteer().digest)
+
+
+def haversine_km(origin, destination):
+    """Great-circle distance in km between two Places."""
+    lat1, lon1 = math.radians(origin.latitude), math.radians(origin.longitude)
+    lat2, lon2 = math.radians(destination.latitude), math.radians(destination.longitude)
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def estimate_distance_km(destination, origin=None):
+    """
+    Estimated road distance in km (Decimal) from *origin* (the configured
+    depot by default) to *destination*, or None when either can't be resolved.
+    """
+    terms = get_tariff().terms
+    start = resolve(terms.depot_location if origin is None else origin)
+    end = resolve(destination)
+    if start is None or end is None:
+        return None
+    distance = Decimal(str(haversine_km(start, end))) * terms.road_factor
+    return distance.quantize(CENT)
+
+
+def budget_destination(budget):
+    """The delivery location of *budget*: the location of its event."""
+    project = budget.proposal if budget.proposal_id else None
+    event = project.event if project is not None and project.event_id else None
+    return event.location if event is not None else ''
+
+
+def estimate_budget_distance(budget):
+    """estimate_distance_km() from the depot to the event of *budget*."""
+    destination = budget_destination(budget)
+    return estimate_distance_km(destination) if destination else None
@@ -0,0 +1,63 @@
+"""
+Recalcula o frete salvo nas propostas pendentes com a tabela de frete atual.
+
+    python manage.py reprice_freight                   # dry-run
+    python manage.py reprice_freight --commit          # aplica
+    python manage.py reprice_freight --chunk-size 200 --commit
+
+Só entram propostas com aprovação pendente que já têm um frete calculado;
+aprovadas e rejeitadas nunca são alteradas.  Cada proposta é recalculada a
+partir dos totais armazenados (peso, volume e valor dos itens), da urgência
+e da distância salvas, e os valores alterados são gravados em lote (ver
+apps/logistics/repricing.py).
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.logistics.repricing import CHUNK_SIZE, reprice_pending
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o frete das propostas pendentes com a tabela de frete atual'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--commit',
+            action='store_true',
+            help='Persiste as alterações no banco (sem esta flag roda em dry-run)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Propostas processadas por lote (padrão: {CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--quiet-diff',
+            action='store_true',
+            help='Não lista as propostas alteradas, só o resumo',
+        )
+
+    def handle(self, *args, **options):
+        commit = options['commit']
+
+        def progress(done, total, changed):
+            self.stdout.write(f'  {done}/{total} proposta(s) processada(s), {changed} alterada(s)')
+
+        report = reprice_pending(commit=commit, chunk_size=options['chunk_size'], progress=progress)
+
+        if not options['quiet_diff']:
+            for change in report.changes:
+                self.stdout.write(
+                    f'  Proposta #{change.budget_id} ({change.name}): '
+                    f'R$ {change.old:.2f} → R$ {change.new:.2f} ({change.delta:+.2f})'
+                )
+
+        summary = (
+            f'{report.scanned} proposta(s) pendente(s) verificada(s), '
+            f'{len(report.changes)} com frete alterado (diferença total R$ {report.delta:+.2f}).'
+        )
+        if commit:
+            self.stdout.write(self.style.SUCCESS(f'✔ {summary}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Dry-run: {summary} Use --commit para aplicar.'))
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:26
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='freightsettings',
+            name='depot_location',
+            field=models.CharField(blank=True, default='', help_text='Cidade de saída das entregas (ex: São Paulo - SP) ou coordenadas "lat, lon"', max_length=255, verbose_name='Local do Depósito'),
+        ),
+        migrations.AddField(
+            model_name='freightsettings',
+            name='road_factor',
+            field=models.DecimalField(decimal_places=2, default=Decimal('1.30'), help_text='Multiplica a distância em linha reta para estimar a distância por estrada', max_digits=4, verbose_name='Fator Rodoviário'),
+        ),
+    ]
@@ -5,6 +5,8 @@ Provides configurable weight/volume range pricing tables,
 urgency multipliers, and global freight settings.
 """
 
+from decimal import Decimal
+
 from django.core.exceptions import ValidationError
 from django.db import models
 
@@ -48,6 +50,22 @@ class FreightSettings(models.Model):
         help_text='Custo por quilômetro rodado (requer que o orçamento informe a distância)'
     )
 
+    # Origin of the estimated distances (apps.logistics.geo)
+    depot_location = models.CharField(
+        'Local do Depósito',
+        max_length=255,
+        blank=True,
+        default='',
+        help_text='Cidade de saída das entregas (ex: São Paulo - SP) ou coordenadas "lat, lon"'
+    )
+    road_factor = models.DecimalField(
+        'Fator Rodoviário',
+        max_digits=4,
+        decimal_places=2,
+        default=Decimal('1.30'),
+        help_text='Multiplica a distância em linha reta para estimar a distância por estrada'
+    )
+
     # Calculation rule when both weight AND volume apply
     CALC_MODE_CHOICES = [
         ('max', 'Usar o maior valor (peso ou volume)'),
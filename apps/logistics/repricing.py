@@ -0,0 +1,131 @@
+"""
+Re-pricing the stored freight of pending proposals.
+
+Budget.freight_cost is written when someone clicks "calcular frete", so an
+edit to the tariff (weight/volume tables, FreightSettings, urgency levels)
+leaves it stale on every proposal already priced.  reprice_pending() walks
+the pending budgets with a calculated freight in chunks of pks, prices each one
+with the current compiled tariff from its stored aggregates (items_weight,
+items_volume, items_total), its urgency level and its distance — no item is
+loaded — and writes the changed values with one bulk UPDATE per chunk.
+
+Only freights that came from the calculator (Budget.freight_calculated,
+set by "calcular frete" and cleared when someone types a freight in the
+budget form) are re-priced: manual values, blank ones and approved or
+rejected budgets are left alone.  The writes go through
+bulk_update_with_history, so each changed budget still gets its audit
+record.  Without ``commit`` nothing is written and the report only lists
+what would change:
+
+    report = reprice_pending(commit=False)
+    for change in report.changes:
+        print(change.budget_id, change.old, '→', change.new)
+"""
+
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from .tariff import get_tariff
+from .utils import quote_freight
+
+CHUNK_SIZE = 500
+
+CENT = Decimal('0.01')
+
+CHANGE_REASON = 'Recálculo de frete'
+
+
+class FreightChange(NamedTuple):
+    """One budget whose stored freight differs from the current tariff."""
+
+    budget_id: int
+    name: str
+    old: Decimal
+    new: Decimal
+
+    @property
+    def delta(self):
+        return self.new - self.old
+
+
+class RepricingReport(NamedTuple):
+    scanned: int
+    changes: list
+    committed: bool
+
+    @property
+    def delta(self):
+        return sum((change.delta for change in self.changes), Decimal('0'))
+
+    def as_dict(self):
+        return {
+            'scanned': self.scanned,
+            'changed': len(self.changes),
+            'committed': self.committed,
+            'delta': float(self.delta),
+            'changes': [
+                {
+                    'budget_id': change.budget_id,
+                    'name': change.name,
+                    'old': float(change.old),
+                    'new': float(change.new),
+                }
+                for change in self.changes
+            ],
+        }
+
+
+def pending_budgets():
+    """Pending budgets whose freight was priced by the calculator."""
+    from apps.budgets.models import Budget
+
+    return Budget.objects.filter(approval_status='pending', freight_calculated=True, freight_cost__isnull=False)
+
+
+def reprice_pending(commit=False, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Re-price the freight of every pending budget (see module docstring) and
+    return a RepricingReport.  *progress*, when given, is called as
+    ``progress(done, total, changes)`` after each chunk.
+    """
+    from apps.budgets.models import Budget
+
+    chunk_size = max(int(chunk_size or CHUNK_SIZE), 1)
+    ids = list(pending_budgets().order_by('pk').values_list('pk', flat=True))
+    tariff = get_tariff()
+    changes = []
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        with transaction.atomic():
+            # Whole rows: the history records copy every field
+            budgets = pending_budgets().filter(pk__in=chunk)
+            if commit:
+                budgets = budgets.select_for_update()
+            changed = []
+            for budget in budgets:
+                new = quote_freight(
+                    budget.items_weight,
+                    budget.items_volume,
+                    budget.items_total,
+                    urgency=tariff.urgency(budget.freight_urgency_id),
+                    distance_km=budget.freight_distance_km,
+                ).freight_total.quantize(CENT)
+                if new != budget.freight_cost:
+                    changes.append(FreightChange(budget.pk, budget.name, budget.freight_cost, new))
+                    budget.freight_cost = new
+                    changed.append(budget)
+            if commit and changed:
+                now = timezone.now()
+                for budget in changed:
+                    budget.updated_at = now
+                bulk_update_with_history(
+                    changed, Budget, ['freight_cost', 'updated_at'], batch_size=chunk_size,
+                    default_change_reason=CHANGE_REASON, default_date=now, manager=Budget.objects,
+                )
+        if progress is not None:
+            progress(min(start + chunk_size, len(ids)), len(ids), len(changes))
+    return RepricingReport(len(ids), changes, commit)
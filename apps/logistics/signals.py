@@ -0,0 +1,23 @@
+"""
+Invalidate the compiled freight tariff (apps.logistics.tariff) whenever a
+table it is compiled from changes, from the config views or the admin.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import tariff
+from .models import FreightSettings, UrgencyMultiplier, VolumeRange, WeightRange
+
+
+@receiver(post_save, sender=FreightSettings)
+@receiver(post_delete, sender=FreightSettings)
+@receiver(post_save, sender=WeightRange)
+@receiver(post_delete, sender=WeightRange)
+@receiver(post_save, sender=VolumeRange)
+@receiver(post_delete, sender=VolumeRange)
+@receiver(post_save, sender=UrgencyMultiplier)
+@receiver(post_delete, sender=UrgencyMultiplier)
+def tariff_changed(sender, **kwargs):
+    transaction.on_commit(tariff.bump_version)
@@ -0,0 +1,201 @@
+"""
+Compiled freight tariff.
+
+The weight and volume tables, the FreightSettings singleton and the urgency
+levels change rarely but are read by every freight quote.  get_tariff()
+loads them once per process into a Tariff:
+
+    weight / volume   BandTable: the bands compiled into sorted breakpoints,
+                      so a lookup is one bisect instead of a scan of the table
+    terms             the FreightSettings values (fees, distance rate, depot)
+    urgencies         UrgencyMultiplier by pk, plus the default one
+
+A warm quote issues no queries.  Any write to those models bumps a version
+counter kept in the cache (apps.logistics.signals, after commit); every
+process compares it with the version of its compiled tariff and recompiles
+on a mismatch.  The counter is only shared between workers when the cache
+backend is (Redis, Memcached...), so a compiled tariff is also reloaded once
+it is LOGISTICS_TARIFF_MAX_AGE seconds old.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'logistics:tariff:version'
+MAX_AGE = 300
+
+ZERO = Decimal('0')
+ONE = Decimal('1')
+TONNE = Decimal('1000')
+
+_lock = threading.Lock()
+_compiled = None
+
+
+class Band(NamedTuple):
+    """One WeightRange / VolumeRange row."""
+
+    label: str
+    minimum: Decimal
+    maximum: Decimal = None
+    rate: Decimal = ZERO
+    # Per-unit rates charge rate × (value − minimum) / divisor; fixed ones just rate
+    divisor: Decimal = None
+
+    def contains(self, value):
+        return value >= self.minimum and (self.maximum is None or value <= self.maximum)
+
+    def cost(self, value):
+        if self.divisor is None:
+            return self.rate
+        excess = value - self.minimum
+        return self.rate * (excess / self.divisor if self.divisor != ONE else excess)
+
+
+class BandTable:
+    """
+    A pricing table compiled for bisect lookups.
+
+    *bands* are given in table order (``order``, then minimum); a value is
+    priced by the first band containing it, or by the last band when none
+    does, as the table has always been read.  Band edges split the axis into
+    breakpoints and the open gaps between them; the winning band of each is
+    resolved once, here.
+    """
+
+    def __init__(self, bands):
+        self.bands = tuple(bands)
+        edges = {band.minimum for band in self.bands}
+        edges.update(band.maximum for band in self.bands if band.maximum is not None)
+        self.points = sorted(edges)
+        self.fallback = self.bands[-1] if self.bands else None
+        self.point_bands = [self._first_containing(point) for point in self.points]
+        # gap i lies below points[i] (gap 0 below them all, the last one above)
+        samples = (
+            [self.points[0] - ONE] if self.points else []
+        ) + [
+            (low + high) / 2 for low, high in zip(self.points, self.points[1:])
+        ] + (
+            [self.points[-1] + ONE] if self.points else []
+        )
+        self.gap_bands = [self._first_containing(sample) for sample in samples]
+
+    def _first_containing(self, value):
+        for band in self.bands:
+            if band.contains(value):
+                return band
+        return self.fallback
+
+    def band(self, value):
+        """The band pricing *value* (None for an empty table)."""
+        if not self.bands:
+            return None
+        index = bisect_left(self.points, value)
+        if index < len(self.points) and self.points[index] == value:
+            return self.point_bands[index]
+        return self.gap_bands[index]
+
+    def cost(self, value):
+        band = self.band(value)
+        return band.cost(value) if band else ZERO
+
+
+class FreightTerms(NamedTuple):
+    """The FreightSettings values used by a quote and by the distance estimate."""
+
+    fixed_delivery_fee: Decimal = ZERO
+    percentage_on_total: Decimal = ZERO
+    distance_rate_enabled: bool = False
+    distance_rate_per_km: Decimal = ZERO
+    calculation_mode: str = 'max'
+    depot_location: str = ''
+    road_factor: Decimal = ONE
+
+
+class Urgency(NamedTuple):
+    pk: int
+    label: str
+    multiplier: Decimal
+
+
+class Tariff(NamedTuple):
+    version: int
+    loaded_at: float
+    weight: BandTable
+    volume: BandTable
+    terms: FreightTerms
+    urgencies: dict
+    default_urgency: Urgency = None
+
+    def urgency(self, pk=None):
+        """The urgency level *pk*, or the default one when it is absent or unknown."""
+        return self.urgencies.get(pk) or self.default_urgency
+
+
+def max_age():
+    return max(int(getattr(settings, 'LOGISTICS_TARIFF_MAX_AGE', MAX_AGE) or 0), 1)
+
+
+def current_version():
+    """The shared tariff version (seeded with a timestamp when the cache has none)."""
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_version():
+    """Invalidate every compiled tariff (call after the transaction commits)."""
+    global _compiled
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+    _compiled = None
+
+
+def compile_tariff(version=None):
+    """Load the tariff tables into a Tariff (a handful of queries)."""
+    from .models import FreightSettings, UrgencyMultiplier, VolumeRange, WeightRange
+
+    version = current_version() if version is None else version
+    weight = BandTable(
+        Band(row.label, row.min_weight, row.max_weight, row.rate, TONNE if row.rate_type == 'per_ton' else None)
+        for row in WeightRange.objects.order_by('order', 'min_weight')
+    )
+    volume = BandTable(
+        Band(row.label, row.min_volume, row.max_volume, row.rate, ONE if row.rate_type == 'per_m3' else None)
+        for row in VolumeRange.objects.order_by('order', 'min_volume')
+    )
+    freight_settings = FreightSettings.get_settings()
+    terms = FreightTerms(
+        freight_settings.fixed_delivery_fee or ZERO,
+        freight_settings.percentage_on_total or ZERO,
+        freight_settings.distance_rate_enabled,
+        freight_settings.distance_rate_per_km or ZERO,
+        freight_settings.calculation_mode,
+        freight_settings.depot_location,
+        freight_settings.road_factor or ONE,
+    )
+    urgencies, default = {}, None
+    for row in UrgencyMultiplier.objects.order_by('multiplier', 'pk'):
+        urgencies[row.pk] = Urgency(row.pk, row.label, row.multiplier)
+        if row.is_default and default is None:
+            default = urgencies[row.pk]
+    return Tariff(version, time.monotonic(), weight, volume, terms, urgencies, default)
+
+
+def get_tariff():
+    """The compiled tariff of this process, recompiled when its version is outdated."""
+    global _compiled
+    version = current_version()
+    tariff = _compiled
+    if tariff is None or tariff.version != version or time.monotonic() - tariff.loaded_at > max_age():
+        with _lock:
+            tariff = _compiled
+            if tariff is None or tariff.version != version or time.monotonic() - tariff.loaded_at > max_age():
+                tariff = _compiled = compile_tariff(version)
+    return tariff
@@ -0,0 +1,31 @@
+"""
+Background jobs for the logistics app.
+
+Celery is optional: without it the functions below are plain callables and
+callers fall back to running them inline.
+"""
+
+import logging
+
+try:
+    from celery import shared_task
+except ImportError:  # pragma: no cover - depends on the deployment
+    shared_task = None
+
+logger = logging.getLogger(__name__)
+
+
+def reprice_freight_task(commit=True):
+    """Re-price the stored freight of the pending budgets (see apps.logistics.repricing)."""
+    from .repricing import reprice_pending
+
+    report = reprice_pending(commit=commit)
+    logger.info(
+        'Freight re-pricing: %s budget(s) scanned, %s changed (commit=%s)',
+        report.scanned, len(report.changes), commit,
+    )
+    return {key: value for key, value in report.as_dict().items() if key != 'changes'}
+
+
+if shared_task is not None:
+    reprice_freight_task = shared_task(reprice_freight_task)
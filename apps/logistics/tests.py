@@ -0,0 +1,314 @@
+"""Logistics app tests."""
+
+import json
+import random
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.budgets.models import Budget
+from apps.budgets.persistence import save_budget_sections
+from apps.budgets.tests import _item_payload
+from apps.budgets.views import _sections_to_json
+
+
+class FreightTariffTestCase(TestCase):
+    """Testes para a tabela de frete compilada (apps.logistics.tariff)."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        from apps.logistics.models import UrgencyMultiplier, VolumeRange, WeightRange
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WeightRange.objects.create(label='Até 50', min_weight=0, max_weight=50, rate=Decimal('80'), order=1)
+            WeightRange.objects.create(label='51 a 500', min_weight=Decimal('50.01'), max_weight=500, rate=Decimal('200'), order=2)
+            WeightRange.objects.create(
+                label='Acima', min_weight=500, rate=Decimal('120'), rate_type='per_ton', order=3,
+            )
+            VolumeRange.objects.create(label='Até 1', min_volume=0, max_volume=1, rate=Decimal('60'), order=1)
+            VolumeRange.objects.create(
+                label='Acima', min_volume=1, rate=Decimal('40'), rate_type='per_m3', order=2,
+            )
+            self.urgent = UrgencyMultiplier.objects.create(label='Urgente', multiplier=Decimal('1.5'))
+            UrgencyMultiplier.objects.create(label='Normal', multiplier=Decimal('1'), is_default=True)
+
+    @staticmethod
+    def _scan(bands, value):
+        """Leitura original da tabela: primeira faixa que contém o valor, senão a última."""
+        match = next((band for band in bands if band.contains(value)), bands[-1] if bands else None)
+        return match.cost(value) if match else Decimal('0')
+
+    def test_bisect_lookup_matches_table_scan(self):
+        """A busca binária escolhe a mesma faixa que a varredura em ordem."""
+        from apps.logistics.tariff import Band, BandTable
+
+        rng = random.Random(21)
+        for _ in range(50):
+            bands = []
+            for _ in range(rng.randint(0, 6)):
+                low = Decimal(rng.randint(0, 40)) / 2
+                high = None if rng.random() < 0.2 else low + Decimal(rng.randint(0, 20)) / 2
+                bands.append(Band('faixa', low, high, Decimal(rng.randint(1, 500)),
+                                  rng.choice([None, Decimal('1'), Decimal('1000')])))
+            table = BandTable(bands)
+            for value in [Decimal(n) / 4 for n in range(-4, 140)]:
+                self.assertEqual(table.cost(value), self._scan(bands, value), (bands, value))
+
+    def test_warm_quotes_issue_no_queries(self):
+        """Com a tabela compilada, calcular o frete não consulta as tabelas."""
+        from apps.logistics.tariff import get_tariff
+
+        tariff = get_tariff()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tariff().weight.cost(Decimal('50')), Decimal('80'))
+            self.assertEqual(get_tariff().weight.cost(Decimal('120')), Decimal('200'))
+            self.assertEqual(get_tariff().weight.cost(Decimal('2500')), Decimal('240'))
+            self.assertEqual(get_tariff().volume.cost(Decimal('0.5')), Decimal('60'))
+            self.assertEqual(get_tariff().urgency().label, 'Normal')
+            self.assertEqual(get_tariff().urgency(self.urgent.pk).multiplier, Decimal('1.5'))
+        self.assertIs(get_tariff(), tariff)
+
+    def test_writes_bump_the_version(self):
+        """Alterar uma faixa invalida a tabela compilada após o commit."""
+        from apps.logistics.models import VolumeRange
+        from apps.logistics.tariff import get_tariff
+
+        version = get_tariff().version
+        with self.captureOnCommitCallbacks(execute=True):
+            VolumeRange.objects.filter(label='Até 1').get().delete()
+        self.assertNotEqual(get_tariff().version, version)
+        self.assertEqual(get_tariff().volume.cost(Decimal('3.5')), Decimal('100'))
+
+
+class FreightQuoteTestCase(TestCase):
+    """Testes para o cálculo unificado de frete (proposta salva e prévia)."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        from apps.logistics.models import FreightSettings, UrgencyMultiplier, VolumeRange, WeightRange
+
+        user = get_user_model().objects.create_user(email='frete@example.com', password='x')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            FreightSettings.objects.create(
+                pk=1, fixed_delivery_fee=Decimal('50'), percentage_on_total=Decimal('2'),
+                distance_rate_enabled=True, distance_rate_per_km=Decimal('1.5'), calculation_mode='sum',
+            )
+            WeightRange.objects.create(label='Até 100', min_weight=0, max_weight=100, rate=Decimal('80'))
+            VolumeRange.objects.create(label='Por m³', min_volume=0, rate=Decimal('30'), rate_type='per_m3')
+            self.urgent = UrgencyMultiplier.objects.create(label='Urgente', multiplier=Decimal('2'))
+        self.budget = Budget.objects.create(name='Frete')
+        save_budget_sections(self.budget, json.dumps([
+            {'id': None, 'title': 'S', 'items': [_item_payload(1), _item_payload(2)]},
+        ]))
+        self.budget = Budget.objects.get(pk=self.budget.pk)
+
+    def test_saved_budget_quote_uses_stored_totals(self):
+        """O frete da proposta salva vem dos totais guardados, sem carregar itens."""
+        from apps.logistics.tariff import get_tariff
+        from apps.logistics.utils import calculate_freight
+
+        get_tariff()
+        with self.assertNumQueries(0):
+            quote = calculate_freight(self.budget, urgency=get_tariff().urgency(self.urgent.pk), distance_km=Decimal('10'))
+        # 6 kg, 4 m³, items R$ 40: (80 + 120 + 50 + 0.8 + 15) × 2
+        self.assertEqual((quote.weight_total, quote.volume_total), (Decimal('6'), Decimal('4')))
+        self.assertEqual(quote.freight_total, Decimal('531.6'))
+        self.assertEqual(quote.urgency_label, 'Urgente')
+
+    def test_saved_and_preview_answers_match(self):
+        """As duas rotas de frete respondem com o mesmo formato e valores."""
+        params = {'urgency_id': str(self.urgent.pk), 'distance_km': '10'}
+        saved = self.client.post(
+            reverse('budgets:calculate-freight', args=[self.budget.pk]), {**params, 'save': '1'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+        items = [
+            {'weight': '1.5', 'volume': '1', 'quantity': 2, 'measurement_unit': 'm3'},
+            {'weight': '1.5', 'volume': '1', 'quantity': 2, 'measurement_unit': 'm3'},
+            'malformado',
+        ]
+        preview = self.client.post(reverse('budgets:freight-preview'), {
+            **params, 'items_json': json.dumps(items), 'budget_total': '40',
+        }).json()
+        self.assertTrue(saved.pop('success'))
+        self.assertEqual(saved, preview)
+        self.assertEqual(preview['freight_total'], 531.6)
+
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.freight_cost, Decimal('531.60'))
+        self.assertEqual(self.budget.freight_urgency_id, self.urgent.pk)
+
+    def test_what_if_matrix(self):
+        """A grade de cenários traz urgência × distância × modo em uma chamada."""
+        from apps.logistics import utils
+
+        url = reverse('budgets:freight-matrix', args=[self.budget.pk])
+        response = self.client.get(url, {'distances': '0,10', 'modes': 'sum,weight'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['scenarios']), 1 * 2 * 2)
+        cell = next(
+            scenario for scenario in data['scenarios']
+            if scenario['mode'] == 'sum' and scenario['distance_km'] == 10
+        )
+        self.assertEqual(cell['freight_total'], 531.6)
+        weight_only = next(
+            scenario for scenario in data['scenarios']
+            if scenario['mode'] == 'weight' and scenario['distance_km'] == 0
+        )
+        self.assertEqual(weight_only['freight_total'], (80 + 50 + 0.8) * 2)
+
+        from apps.logistics import tariff as tariff_module
+
+        utils._matrix_memo = (None, None)
+        with self.assertNumQueries(0):
+            utils.freight_matrix(Decimal('6'), Decimal('4'), Decimal('40'), [Decimal('0')])
+            utils.freight_matrix(Decimal('6.000'), Decimal('4'), Decimal('40.00'), [Decimal('0')])
+        self.assertEqual(utils._matrix_pricer(tariff_module.get_tariff()).cache_info().hits, 1)
+
+        preview = self.client.post(reverse('budgets:freight-matrix-preview'), {
+            'items_json': json.dumps([{'weight': '3', 'volume': '2', 'quantity': 2, 'measurement_unit': 'm3'}]),
+            'budget_total': '40', 'distances': '10', 'modes': 'sum',
+        }).json()
+        self.assertEqual(preview['scenarios'][0]['freight_total'], 531.6)
+
+        self.assertEqual(self.client.get(url, {'modes': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'distances': 'nan'}).status_code, 400)
+
+        # A recompiled tariff (e.g. reloaded after max age, same version) is not served old grids
+        from apps.logistics.models import WeightRange
+        WeightRange.objects.update(rate=Decimal('100'))  # no signal: this process keeps its version
+        before = utils.freight_matrix(Decimal('6'), Decimal('4'), Decimal('40'), [Decimal('0')], ['weight'])
+        with mock.patch.object(tariff_module.time, 'monotonic', return_value=time.monotonic() + 3600):
+            after = utils.freight_matrix(Decimal('6'), Decimal('4'), Decimal('40'), [Decimal('0')], ['weight'])
+            quote = utils.quote_freight(
+                Decimal('6'), Decimal('4'), Decimal('40'),
+                urgency=tariff_module.get_tariff().urgency(self.urgent.pk), distance_km=0, mode='weight',
+            )
+        self.assertEqual(before[0].quote.weight_cost, Decimal('80'))
+        self.assertEqual(after[0].quote.weight_cost, Decimal('100'))
+        self.assertEqual(after[0].quote.freight_total, quote.freight_total)
+
+    def test_reprice_pending_budgets(self):
+        """Após mudar a tabela, o frete das propostas pendentes é recalculado em lote."""
+        from apps.logistics.models import WeightRange
+        from apps.logistics.repricing import reprice_pending
+
+        self.client.post(reverse('budgets:calculate-freight', args=[self.budget.pk]), {
+            'urgency_id': str(self.urgent.pk), 'distance_km': '10', 'save': '1',
+        })
+        self.budget.refresh_from_db()
+        self.assertTrue(self.budget.freight_calculated)
+        approved = Budget.objects.create(
+            name='Aprovada', freight_cost=Decimal('100'), freight_calculated=True, approval_status='approved',
+        )
+        unpriced = Budget.objects.create(name='Sem frete')
+        blank = Budget.objects.create(name='Frete em branco', freight_cost=Decimal('0'))
+        manual = Budget.objects.create(name='Frete manual', freight_cost=Decimal('42'))
+        self.assertEqual(reprice_pending().changes, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            band = WeightRange.objects.get()
+            band.rate = Decimal('100')
+            band.save()
+
+        out = StringIO()
+        call_command('reprice_freight', '--chunk-size', '1', stdout=out)
+        self.assertIn('R$ 531.60 → R$ 571.60 (+40.00)', out.getvalue())
+        self.assertIn('Dry-run', out.getvalue())
+        self.assertEqual(Budget.objects.get(pk=self.budget.pk).freight_cost, Decimal('531.60'))
+
+        response = self.client.post(reverse('logistics:reprice'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['repricing']['changed'], 1)
+
+        response = self.client.post(reverse('logistics:reprice'), {'commit': '1'})
+        self.assertRedirects(response, reverse('logistics:config'))
+        self.assertEqual(Budget.objects.get(pk=self.budget.pk).freight_cost, Decimal('571.60'))
+        self.assertEqual(Budget.objects.get(pk=approved.pk).freight_cost, Decimal('100'))
+        self.assertIsNone(Budget.objects.get(pk=unpriced.pk).freight_cost)
+        self.assertEqual(Budget.objects.get(pk=blank.pk).freight_cost, Decimal('0'))
+        self.assertEqual(Budget.objects.get(pk=manual.pk).freight_cost, Decimal('42'))
+        self.assertEqual(reprice_pending(commit=True).changes, [])
+        record = self.budget.history.latest('history_date')
+        self.assertEqual((record.freight_cost, record.history_change_reason), (Decimal('571.60'), 'Recálculo de frete'))
+
+        # Typing a freight in the budget form makes it manual: no longer re-priced
+        self.client.post(reverse('budgets:edit', args=[self.budget.pk]), {
+            'name': 'Frete', 'status': 'sent', 'discount_type': 'none', 'discount_value': '0',
+            'freight_cost': '600.00', 'extra_charges_data': '{}',
+            'sections_data': _sections_to_json(self.budget),
+        })
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.freight_cost, Decimal('600.00'))
+        self.assertFalse(self.budget.freight_calculated)
+        self.assertEqual(reprice_pending().scanned, 0)
+
+
+class DistanceEstimateTestCase(TestCase):
+    """Testes para a estimativa offline da distância de entrega."""
+
+    def setUp(self):
+        """Configuração inicial dos testes."""
+        from datetime import date
+
+        from apps.clients.models import Client as CustomerClient
+        from apps.events.models import Event
+        from apps.logistics.models import FreightSettings
+        from apps.projects.models import Project
+
+        user = get_user_model().objects.create_user(email='distancia@example.com', password='x')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            FreightSettings.objects.create(
+                pk=1, distance_rate_enabled=True, distance_rate_per_km=Decimal('2'),
+                depot_location='São Paulo - SP', road_factor=Decimal('1.30'),
+            )
+        event = Event.objects.create(
+            client=CustomerClient.objects.create(name='Cliente'), name='Feira',
+            event_date=date(2026, 5, 1), location='Riocentro, Av. Salvador Allende - Rio de Janeiro/RJ',
+        )
+        self.budget = Budget.objects.create(
+            name='Entrega', proposal=Project.objects.create(title='Estande', event=event),
+        )
+
+    def test_resolve_free_text(self):
+        """Locais em texto livre são resolvidos pelo município, preferindo a UF informada."""
+        from apps.logistics.geo import resolve
+
+        self.assertEqual(resolve('Expo Center Norte, SAO PAULO - sp').name, 'São Paulo')
+        self.assertEqual(resolve('Centro de Convenções, São José - SC').name, 'São José')
+        self.assertEqual(resolve('Parque Tecnológico, São José dos Campos').name, 'São José dos Campos')
+        self.assertEqual(resolve('Praça Central, Vitória da Conquista').uf, 'BA')
+        self.assertEqual(resolve('-22.9, -43.17')[2:], (-22.9, -43.17))
+        self.assertIsNone(resolve('Pavilhão sem cidade'))
+        self.assertIsNone(resolve(''))
+
+    def test_estimated_distance_fills_freight(self):
+        """Sem distância informada, o frete usa a estimada do depósito até o local do evento."""
+        from apps.logistics.geo import estimate_budget_distance, estimate_distance_km, haversine_km, resolve
+
+        straight = haversine_km(resolve('São Paulo'), resolve('Rio de Janeiro'))
+        self.assertAlmostEqual(straight, 361, delta=5)
+        expected = (Decimal(str(straight)) * Decimal('1.30')).quantize(Decimal('0.01'))
+        self.assertEqual(estimate_budget_distance(self.budget), expected)
+        self.assertIsNone(estimate_distance_km('Lugar desconhecido'))
+
+        response = self.client.get(reverse('budgets:detail', args=[self.budget.pk]))
+        self.assertEqual(response.context['estimated_distance_km'], expected)
+        self.assertContains(response, f'value="{expected}"')
+
+        data = self.client.post(
+            reverse('budgets:calculate-freight', args=[self.budget.pk]), {'save': '1'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+        self.assertEqual(data['distance_cost'], float(expected * 2))
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.freight_distance_km, expected)
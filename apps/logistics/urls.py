@@ -10,6 +10,7 @@ app_name = 'logistics'
 urlpatterns = [
     # Main configuration panel
     path('config/', views.FreightSettingsView.as_view(), name='config'),
+    path('reprice/', views.FreightRepriceView.as_view(), name='reprice'),
 
     # Weight range CRUD
     path('weight-ranges/add/', views.WeightRangeCreateView.as_view(), name='weight-range-add'),
@@ -1,10 +1,13 @@
 """
 Freight calculation utilities.
 
-calculate_freight(budget, urgency=None, distance_km=None)
-    Returns a dict with:
-        weight_total      – total kg from budget items
-        volume_total      – total m³ from budget items (m3 unit only)
+One engine prices every freight quote, saved or previewed:
+
+quote_freight(weight_total, volume_total, budget_total, urgency=None, distance_km=None)
+    Prices already aggregated figures against the compiled tariff
+    (apps.logistics.tariff) and returns a FreightQuote:
+        weight_total      – total kg
+        volume_total      – total m³ (m3 unit only)
         weight_cost       – cost from weight table
         volume_cost       – cost from volume table
         base_freight      – combined cost according to calculation_mode
@@ -12,141 +15,221 @@ calculate_freight(budget, urgency=None, distance_km=None)
         percentage_cost   – percentage over budget total
         distance_cost     – optional distance cost
         urgency_multiplier– multiplier applied
+        urgency_label     – name of the urgency level
         freight_total     – final freight cost
+
+calculate_freight(budget, urgency=None, distance_km=None)
+    A saved budget: the totals are its stored, SQL-maintained aggregates
+    (items_weight, items_volume, items_total), so no item is loaded.
+
+payload_totals(items)
+    ``(weight_total, volume_total)`` of unsaved items from the budget form.
+
+freight_matrix(weight_total, volume_total, budget_total, distances, modes)
+    The what-if grid: every urgency level × distance × calculation mode.
+
+FreightQuote.as_json() is the single JSON shape of the freight endpoints.
 """
 
-from decimal import Decimal
-from .models import FreightSettings, UrgencyMultiplier, VolumeRange, WeightRange
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache, partial
+from typing import NamedTuple
 
+from .models import FreightSettings
+from .tariff import get_tariff
 
-def _weight_cost(weight_kg: Decimal) -> Decimal:
-    """Return shipping cost for the given weight in kg."""
-    ranges = WeightRange.objects.order_by('order', 'min_weight')
-    if not ranges.exists():
-        return Decimal('0')
+ZERO = Decimal('0')
+HUNDRED = Decimal('100')
 
-    for r in ranges:
-        in_range = weight_kg >= r.min_weight and (
-            r.max_weight is None or weight_kg <= r.max_weight
-        )
-        if in_range:
-            if r.rate_type == 'per_ton':
-                excess_kg = weight_kg - r.min_weight
-                return r.rate * (excess_kg / Decimal('1000'))
-            return r.rate
-
-    # Fallback: use last range
-    last = ranges.last()
-    if last:
-        if last.rate_type == 'per_ton':
-            excess_kg = weight_kg - last.min_weight
-            return last.rate * (excess_kg / Decimal('1000'))
-        return last.rate
-    return Decimal('0')
-
-
-def _volume_cost(volume_m3: Decimal) -> Decimal:
-    """Return shipping cost for the given volume in m³."""
-    ranges = VolumeRange.objects.order_by('order', 'min_volume')
-    if not ranges.exists():
-        return Decimal('0')
-
-    for r in ranges:
-        in_range = volume_m3 >= r.min_volume and (
-            r.max_volume is None or volume_m3 <= r.max_volume
-        )
-        if in_range:
-            if r.rate_type == 'per_m3':
-                excess = volume_m3 - r.min_volume
-                return r.rate * excess
-            return r.rate
-
-    # Fallback: use last range
-    last = ranges.last()
-    if last:
-        if last.rate_type == 'per_m3':
-            excess = volume_m3 - last.min_volume
-            return last.rate * excess
-        return last.rate
-    return Decimal('0')
+CALCULATION_MODES = tuple(value for value, _label in FreightSettings.CALC_MODE_CHOICES)
 
+# What-if grids kept by freight_matrix()
+MATRIX_CACHE_SIZE = 256
 
-def calculate_freight(budget, urgency=None, distance_km=None):
-    """
-    Calculate freight cost for a Budget instance.
 
-    Parameters
-    ----------
-    budget      : Budget model instance
-    urgency     : UrgencyMultiplier instance or None
-    distance_km : Decimal/float – distance in km (optional)
+class FreightQuote(NamedTuple):
+    """Breakdown of one freight quote."""
 
-    Returns
-    -------
-    dict with all breakdown fields and freight_total
-    """
-    settings = FreightSettings.get_settings()
+    weight_total: Decimal
+    volume_total: Decimal
+    weight_cost: Decimal
+    volume_cost: Decimal
+    base_freight: Decimal
+    fixed_fee: Decimal
+    percentage_cost: Decimal
+    distance_cost: Decimal
+    urgency_multiplier: Decimal
+    urgency_label: str
+    freight_total: Decimal
 
-    # ── Aggregate weight and volume from budget items ──────────────────────
-    weight_total = Decimal('0')
-    volume_total = Decimal('0')
+    def as_json(self):
+        """The quote for JsonResponse (numbers as floats)."""
+        return {
+            name: value if isinstance(value, str) else float(value)
+            for name, value in self._asdict().items()
+        }
 
-    for item in budget.items.all():
-        quantity = Decimal(str(item.quantity or 1))
 
-        if item.weight:
-            weight_total += item.weight * quantity
+class FreightScenario(NamedTuple):
+    """One cell of freight_matrix()."""
 
-        # Volume: only items with measurement_unit == 'm3'
-        if item.measurement and item.measurement_unit == 'm3':
-            volume_total += item.measurement * quantity
+    urgency_id: int
+    distance_km: Decimal
+    mode: str
+    quote: FreightQuote
 
-    # ── Cost per table ─────────────────────────────────────────────────────
-    w_cost = _weight_cost(weight_total)
-    v_cost = _volume_cost(volume_total)
+    def as_json(self):
+        return {
+            'urgency_id': self.urgency_id,
+            'distance_km': None if self.distance_km is None else float(self.distance_km),
+            'mode': self.mode,
+            **self.quote.as_json(),
+        }
 
-    mode = settings.calculation_mode
+
+def combine_costs(weight_cost, volume_cost, mode):
+    """Base freight from the two table costs according to FreightSettings.calculation_mode."""
     if mode == 'max':
-        base_freight = max(w_cost, v_cost)
-    elif mode == 'sum':
-        base_freight = w_cost + v_cost
-    elif mode == 'weight':
-        base_freight = w_cost
-    else:  # 'volume'
-        base_freight = v_cost
-
-    # ── Fixed fee ──────────────────────────────────────────────────────────
-    fixed_fee = settings.fixed_delivery_fee or Decimal('0')
-
-    # ── Percentage over budget total ───────────────────────────────────────
-    budget_total = Decimal(str(budget.total_value))
-    pct = settings.percentage_on_total or Decimal('0')
-    percentage_cost = budget_total * (pct / Decimal('100'))
-
-    # ── Distance cost ──────────────────────────────────────────────────────
-    distance_cost = Decimal('0')
-    if settings.distance_rate_enabled and distance_km is not None:
-        distance_cost = settings.distance_rate_per_km * Decimal(str(distance_km))
-
-    # ── Urgency multiplier ─────────────────────────────────────────────────
-    if urgency is None:
-        urgency = UrgencyMultiplier.objects.filter(is_default=True).first()
+        return max(weight_cost, volume_cost)
+    if mode == 'sum':
+        return weight_cost + volume_cost
+    if mode == 'weight':
+        return weight_cost
+    return volume_cost  # 'volume'
+
+
+def quote_freight(weight_total, volume_total, budget_total, urgency=None, distance_km=None, mode=None):
+    """
+    Price a shipment from its aggregated figures.
+
+    Parameters
+    ----------
+    weight_total : Decimal – total kg
+    volume_total : Decimal – total m³
+    budget_total : Decimal – items total, base of the percentage fee
+    urgency      : UrgencyMultiplier / tariff.Urgency, or None for the default level
+    distance_km  : Decimal/float – distance in km (optional)
+    mode         : calculation mode overriding FreightSettings.calculation_mode
+    """
+    tariff = get_tariff()
+    return _price(
+        tariff,
+        weight_total,
+        volume_total,
+        tariff.weight.cost(weight_total),
+        tariff.volume.cost(volume_total),
+        budget_total,
+        urgency if urgency is not None else tariff.default_urgency,
+        distance_km,
+        mode or tariff.terms.calculation_mode,
+    )
+
+
+def _price(tariff, weight_total, volume_total, weight_cost, volume_cost, budget_total, urgency, distance_km, mode):
+    """FreightQuote from the band costs, already looked up."""
+    terms = tariff.terms
+    base_freight = combine_costs(weight_cost, volume_cost, mode)
+    percentage_cost = Decimal(str(budget_total or 0)) * (terms.percentage_on_total / HUNDRED)
+
+    distance_cost = ZERO
+    if terms.distance_rate_enabled and distance_km is not None:
+        distance_cost = terms.distance_rate_per_km * Decimal(str(distance_km))
 
     urgency_multiplier = urgency.multiplier if urgency else Decimal('1')
+    freight_sub = base_freight + terms.fixed_delivery_fee + percentage_cost + distance_cost
+    return FreightQuote(
+        weight_total=weight_total,
+        volume_total=volume_total,
+        weight_cost=weight_cost,
+        volume_cost=volume_cost,
+        base_freight=base_freight,
+        fixed_fee=terms.fixed_delivery_fee,
+        percentage_cost=percentage_cost,
+        distance_cost=distance_cost,
+        urgency_multiplier=urgency_multiplier,
+        urgency_label=urgency.label if urgency else 'Normal',
+        freight_total=freight_sub * urgency_multiplier,
+    )
+
+
+def freight_matrix(weight_total, volume_total, budget_total, distances=(None,), modes=CALCULATION_MODES):
+    """
+    Every scenario of a shipment side by side: each urgency level × each
+    of *distances* × each of *modes*, as a tuple of FreightScenario.
+
+    The band costs are looked up once for the whole grid, and grids are
+    memoized per (weight, volume, total, distances, modes) for the compiled
+    tariff they were priced with, so repeated what-ifs on the same figures
+    are free until the tariff is recompiled (bumped version or max age).
+    """
+    return _matrix_pricer(get_tariff())(
+        Decimal(str(weight_total or 0)),
+        Decimal(str(volume_total or 0)),
+        Decimal(str(budget_total or 0)),
+        tuple(None if distance is None else Decimal(str(distance)) for distance in distances),
+        tuple(modes),
+    )
+
+
+# (compiled tariff, its memoized _freight_matrix)
+_matrix_memo = (None, None)
+
+
+def _matrix_pricer(tariff):
+    """The memoized grid pricer of *tariff*; a new compilation starts an empty memo."""
+    global _matrix_memo
+    memo_tariff, pricer = _matrix_memo
+    if memo_tariff is not tariff:
+        pricer = lru_cache(maxsize=MATRIX_CACHE_SIZE)(partial(_freight_matrix, tariff))
+        _matrix_memo = (tariff, pricer)
+    return pricer
+
+
+def _freight_matrix(tariff, weight_total, volume_total, budget_total, distances, modes):
+    weight_cost = tariff.weight.cost(weight_total)
+    volume_cost = tariff.volume.cost(volume_total)
+    urgencies = list(tariff.urgencies.values()) or [None]
+    return tuple(
+        FreightScenario(
+            urgency.pk if urgency else None,
+            distance,
+            mode,
+            _price(tariff, weight_total, volume_total, weight_cost, volume_cost,
+                   budget_total, urgency, distance, mode),
+        )
+        for urgency in urgencies
+        for distance in distances
+        for mode in modes
+    )
+
+
+def calculate_freight(budget, urgency=None, distance_km=None):
+    """Calculate freight cost for a saved Budget (see module docstring)."""
+    return quote_freight(
+        budget.items_weight,
+        budget.items_volume,
+        budget.items_total,
+        urgency=urgency,
+        distance_km=distance_km,
+    )
+
 
-    freight_sub = (base_freight + fixed_fee + percentage_cost + distance_cost)
-    freight_total = freight_sub * urgency_multiplier
-
-    return {
-        'weight_total': weight_total,
-        'volume_total': volume_total,
-        'weight_cost': w_cost,
-        'volume_cost': v_cost,
-        'base_freight': base_freight,
-        'fixed_fee': fixed_fee,
-        'percentage_cost': percentage_cost,
-        'distance_cost': distance_cost,
-        'urgency_multiplier': urgency_multiplier,
-        'urgency_label': urgency.label if urgency else 'Normal',
-        'freight_total': freight_total,
-    }
+def payload_totals(items):
+    """
+    ``(weight_total, volume_total)`` of the form's item list
+    ``[{weight, volume, quantity, measurement_unit}, ...]``; malformed
+    entries are skipped.
+    """
+    weight_total = volume_total = ZERO
+    for item in items if isinstance(items, list) else []:
+        try:
+            quantity = Decimal(str(item.get('quantity', 1) or 1))
+            weight = item.get('weight') or 0
+            volume = item.get('volume') or 0
+            if weight:
+                weight_total += Decimal(str(weight)) * quantity
+            if volume and (item.get('measurement_unit') or '') == 'm3':
+                volume_total += Decimal(str(volume)) * quantity
+        except (AttributeError, InvalidOperation, TypeError, ValueError):
+            continue
+    return weight_total, volume_total
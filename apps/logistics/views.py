@@ -4,6 +4,7 @@ Views for the Logistics / Freight configuration panel.
 URL namespace: logistics
 """
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
@@ -19,6 +20,10 @@ from .forms import (
     WeightRangeForm,
 )
 from .models import FreightSettings, UrgencyMultiplier, VolumeRange, WeightRange
+from .repricing import pending_budgets, reprice_pending
+
+# Changed budgets listed by a simulated re-pricing
+REPRICE_PREVIEW_LIMIT = 100
 
 
 # ── Freight Settings (singleton) ────────────────────────────────────────────
@@ -50,6 +55,7 @@ class FreightSettingsView(LoginRequiredMixin, View):
             'weight_ranges': WeightRange.objects.all(),
             'volume_ranges': VolumeRange.objects.all(),
             'urgency_multipliers': UrgencyMultiplier.objects.all(),
+            'pending_freight_count': pending_budgets().count(),
             'breadcrumbs': [
                 {'name': 'Configurações', 'url': None},
                 {'name': 'Logística e Frete', 'url': None},
@@ -57,6 +63,46 @@ class FreightSettingsView(LoginRequiredMixin, View):
         }
 
 
+class FreightRepriceView(FreightSettingsView):
+    """
+    Re-price the stored freight of the pending budgets with the current tariff.
+
+    Without ``commit`` the change list is simulated and shown on the panel;
+    with it the new values are saved, in a worker when
+    LOGISTICS_REPRICE_ASYNC is enabled and Celery is available.
+    """
+
+    def get(self, request):
+        return redirect('logistics:config')
+
+    def post(self, request):
+        if request.POST.get('commit') != '1':
+            report = reprice_pending(commit=False)
+            context = self._base_context(FreightSettingsForm(instance=FreightSettings.get_settings()))
+            context['repricing'] = {
+                'scanned': report.scanned,
+                'changed': len(report.changes),
+                'delta': report.delta,
+                'changes': report.changes[:REPRICE_PREVIEW_LIMIT],
+            }
+            return render(request, self.template_name, context)
+
+        from .tasks import reprice_freight_task
+
+        if getattr(settings, 'LOGISTICS_REPRICE_ASYNC', False) and hasattr(reprice_freight_task, 'delay'):
+            reprice_freight_task.delay(commit=True)
+            messages.success(request, 'Recálculo de fretes agendado; os valores serão atualizados em instantes.')
+            return redirect('logistics:config')
+
+        report = reprice_pending(commit=True)
+        messages.success(
+            request,
+            f'Fretes recalculados: {len(report.changes)} de {report.scanned} proposta(s) pendente(s) '
+            f'alterada(s) (diferença total R$ {report.delta:+.2f}).',
+        )
+        return redirect('logistics:config')
+
+
 # ── Weight Ranges ────────────────────────────────────────────────────────────
 
 class WeightRangeCreateView(LoginRequiredMixin, CreateView):
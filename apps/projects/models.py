@@ -99,8 +99,11 @@ class Project(BaseModel):
     @property
     def total_value(self):
         """Calculate total value from all related budgets."""
+        # Listings annotate this in SQL (see dashboard views) to avoid a query per row
+        if 'annotated_total_value' in self.__dict__:
+            return self.annotated_total_value or 0
         return self.budgets.aggregate(
-            total=Sum('items__total_price')
+            total=Sum('items_total')
         )['total'] or 0
 
     @property
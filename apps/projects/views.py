@@ -8,10 +8,10 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
-from django.db.models import Q
 from django.http import HttpResponseRedirect, JsonResponse
 
 from apps.common.mixins import AuditMixin
+from apps.common.search import search as full_text_search
 from .models import Project, ProjectFile
 from .forms import ProjectForm, ProjectSearchForm, ProjectFileForm
 from apps.art.models import ART
@@ -32,11 +32,7 @@ class ProjectListView(LoginRequiredMixin, ListView):
         # Search functionality
         search = self.request.GET.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(event__name__icontains=search)
-            )
+            queryset = full_text_search(queryset, 'project', search)
         
         # Filter by status
         status = self.request.GET.get('status', '').strip()
@@ -50,6 +46,8 @@ class ProjectListView(LoginRequiredMixin, ListView):
         elif event:
             queryset = queryset.filter(event_id=event)
         
+        if search:
+            return queryset.order_by('-search_rank', '-created_at')
         return queryset.order_by('-created_at')
     
     def get_context_data(self, **kwargs):
@@ -164,6 +164,25 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background tasks (optional, requires Celery + a broker)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+# Render public proposal PDFs in a worker instead of inside the request
+BUDGET_PDF_ASYNC = os.getenv('BUDGET_PDF_ASYNC', 'False') == 'True'
+# Max seconds a notification poll may wait for news (0 = plain polling).
+# Each waiting request holds a worker: only raise it with async/threaded workers.
+BUDGET_NOTIFICATIONS_LONG_POLL = int(os.getenv('BUDGET_NOTIFICATIONS_LONG_POLL', '0'))
+# Budget form autosave: idle seconds that close an editing session (one
+# version per session) and the debounce window of the Service Order sync.
+BUDGET_AUTOSAVE_SESSION_IDLE = int(os.getenv('BUDGET_AUTOSAVE_SESSION_IDLE', '900'))
+BUDGET_SERVICE_ORDER_SYNC_DELAY = int(os.getenv('BUDGET_SERVICE_ORDER_SYNC_DELAY', '30'))
+# Debounced Service Order syncs run in a worker (requires Celery)
+BUDGET_SERVICE_ORDER_SYNC_ASYNC = os.getenv('BUDGET_SERVICE_ORDER_SYNC_ASYNC', 'False') == 'True'
+# Compiled freight tariff: seconds before a process reloads it even without a
+# version bump (bumps only reach other workers through a shared cache)
+LOGISTICS_TARIFF_MAX_AGE = int(os.getenv('LOGISTICS_TARIFF_MAX_AGE', '300'))
+# Freight re-pricing started from the logistics panel runs in a worker (requires Celery)
+LOGISTICS_REPRICE_ASYNC = os.getenv('LOGISTICS_REPRICE_ASYNC', 'False') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 